@@ -7,5 +7,22 @@ __email__ = "maxwell.b.joseph@colorado.edu"
 __version__ = "0.1.0"
 
 
-from .finnemit import get_emissions  # noqa
+from .finnemit import get_emissions, EmissionModel  # noqa
 from .speciate import speciate  # noqa
+from .pipeline import run_pipeline  # noqa
+from .batch import run_batch  # noqa
+from .regions import region_totals  # noqa
+from .grid import (  # noqa
+    grid_emissions,
+    LatLonGrid,
+    LambertConformalGrid,
+    PolarStereographicGrid,
+)
+from .temporal import hourly_emissions, write_hourly_emissions  # noqa
+from .incremental import update_emissions  # noqa
+from .archive import write_archive, EmissionArchive  # noqa
+from .query import build_index, EmissionIndex  # noqa
+from .ensemble import run_ensemble  # noqa
+from .sweep import run_sweep  # noqa
+from .classified import write_classified, emit_classified  # noqa
+from .totals import group_totals  # noqa
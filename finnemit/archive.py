@@ -0,0 +1,331 @@
+""" Fixed-record binary archives of per-fire emissions.
+
+An archive holds the per-fire emissions of any number of days, e.g. years
+of get_emissions() output, as fixed-width records sorted by date. Days and
+fires are read through a memory map, so only the records asked for are
+read from disk.
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from .io import derived_path, read_table
+
+
+# Record dtypes of output columns that are not stored as they are read.
+# Dates are stored as days, and small codes as 16 bit integers.
+RECORD_DTYPES = {
+    "polyid": "int64",
+    "fireid": "int64",
+    "date": "datetime64[D]",
+    "jd": "int16",
+    "lct": "int16",
+    "genLC": "int16",
+}
+
+
+def write_archive(fires, path, append=False):
+    """Write per-fire emissions to an archive.
+
+    Three files are written: the records at path, an index of the records
+    of each day in a .json file alongside it, and an index of the records
+    of each fire in a '_fires.npy' file.
+
+    Args:
+        fires (DataFrame, str or list) - per-fire emissions as returned by
+            get_emissions(), a path to a get_emissions() output file, or a
+            list of them. They must be in date order: each DataFrame or
+            file can start no earlier than the last day of the one before.
+        path (str) - path to the archive records, e.g. 'emissions.bin'
+        append (bool) - if True, the records are added to the end of an
+            existing archive, and must start no earlier than its last day.
+            Otherwise, any existing archive is replaced.
+
+    Returns:
+        An EmissionArchive for reading the archive.
+    """
+    if isinstance(fires, (pd.DataFrame, str)):
+        fires = [fires]
+
+    if append and os.path.isfile(_index_path(path)):
+        archive = EmissionArchive(path)
+        dtype = archive.dtype
+        days = list(archive.days)
+        counts = list(np.diff(archive.offsets))
+        nrecords = len(archive)
+        fire_index = [np.array(archive.fire_index)]
+        del archive
+    else:
+        # a failed write should not leave the old index over new records
+        if os.path.isfile(_index_path(path)):
+            os.remove(_index_path(path))
+        dtype = None
+        days = []
+        counts = []
+        nrecords = 0
+        fire_index = []
+
+    mode = "r+b" if nrecords else "wb"
+    with open(path, mode) as f:
+        # drop any records left by an interrupted write
+        f.truncate(nrecords * (0 if dtype is None else dtype.itemsize))
+        f.seek(0, os.SEEK_END)
+        for fire in fires:
+            if isinstance(fire, str):
+                fire = read_output(fire)
+            if dtype is None:
+                for column in ["date", "fireid"]:
+                    if column not in fire:
+                        raise ValueError(
+                            "archive records need a {!r} column".format(
+                                column
+                            )
+                        )
+                dtype = record_dtype(fire)
+            records = to_records(fire, dtype)
+            # emissions are sorted by day of year, which differs from date
+            # order only when a file spans more than one year
+            records = records[np.argsort(records["date"], kind="mergesort")]
+            if len(records) == 0:
+                continue
+            if days and records["date"][0] < days[-1]:
+                raise ValueError(
+                    "archive records must be in date order, but {} comes "
+                    "after {}".format(records["date"][0], days[-1])
+                )
+            f.write(records.tobytes())
+
+            new_days, new_counts = np.unique(
+                records["date"], return_counts=True
+            )
+            if days and new_days[0] == days[-1]:
+                counts[-1] += new_counts[0]
+                new_days, new_counts = new_days[1:], new_counts[1:]
+            days.extend(new_days)
+            counts.extend(new_counts)
+            fire_index.append(
+                np.array(
+                    [
+                        records["fireid"],
+                        np.arange(nrecords, nrecords + len(records)),
+                    ]
+                )
+            )
+            nrecords += len(records)
+
+    if dtype is None:
+        raise ValueError("cannot write an archive without any columns")
+    fire_index = np.concatenate(
+        fire_index or [np.zeros((2, 0), dtype="int64")], axis=1
+    )
+    fire_index = fire_index[:, np.argsort(fire_index[0], kind="mergesort")]
+    _replace(derived_path(path, "_fires", ".npy"), fire_index, _write_npy)
+
+    index = {
+        "dtype": dtype.descr,
+        "records": int(nrecords),
+        "days": [str(day) for day in np.array(days, dtype="datetime64[D]")],
+        "offsets": [int(offset) for offset in np.cumsum([0] + counts)],
+    }
+    # the day index is written last, so an interrupted write leaves the
+    # archive as it was. Readers skip the fire index entries of records
+    # beyond those in the day index.
+    _replace(_index_path(path), index, _write_json)
+    return EmissionArchive(path)
+
+
+class EmissionArchive(object):
+    """Read per-fire emissions from an archive written by write_archive().
+
+    Records are returned as numpy structured arrays. The records of a day,
+    or a range of days, are views of the memory map, so reading them does
+    not copy the archive or load the other days.
+
+    Args:
+        path (str) - path to the archive records
+
+    Attributes:
+        records (ndarray) - memory map of every record, sorted by date
+        days (ndarray) - dates with records, in order
+        offsets (ndarray) - position of the first record of each day in
+            records, with the number of records at the end
+        dtype (dtype) - the record dtype
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(_index_path(path)) as f:
+            index = json.load(f)
+        self.dtype = np.dtype([tuple(field) for field in index["dtype"]])
+        self.days = np.array(index["days"], dtype="datetime64[D]")
+        self.offsets = np.array(index["offsets"], dtype="int64")
+        if index["records"]:
+            self.records = np.memmap(
+                path, dtype=self.dtype, mode="r", shape=(index["records"],)
+            )
+        else:
+            # an empty file cannot be memory mapped
+            self.records = np.zeros(0, dtype=self.dtype)
+        self._fire_index = None
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def fire_index(self):
+        """Fire ids in sorted order, above the position of each record."""
+        if self._fire_index is None:
+            fire_index = np.load(
+                derived_path(self.path, "_fires", ".npy"), mmap_mode="r"
+            )
+            # an append interrupted before the day index was replaced leaves
+            # a fire index that also covers the records it did not finish
+            if fire_index.shape[1] > len(self.records):
+                fire_index = np.asarray(fire_index)
+                fire_index = fire_index[:, fire_index[1] < len(self.records)]
+            self._fire_index = fire_index
+        return self._fire_index
+
+    def day(self, date):
+        """Get the records of one day.
+
+        Args:
+            date (str or datetime64) - the date, e.g. '2016-05-31'
+
+        Returns:
+            A structured array view of the day's records, which is empty if
+            the day has no records.
+        """
+        return self.between(date, date)
+
+    def between(self, start, end):
+        """Get the records of a range of days.
+
+        Args:
+            start, end (str or datetime64) - the first and last dates
+
+        Returns:
+            A structured array view of the records from start to end,
+            inclusive.
+        """
+        first = np.searchsorted(self.days, np.datetime64(start, "D"))
+        last = np.searchsorted(
+            self.days, np.datetime64(end, "D"), side="right"
+        )
+        return self.records[self.offsets[first]:self.offsets[last]]
+
+    def fire(self, fireid):
+        """Get the records of one fire, on every day it burned.
+
+        Args:
+            fireid (int) - the fire id
+
+        Returns:
+            A structured array of the fire's records, in date order. Only
+            these records are read from the archive.
+        """
+        ids = self.fire_index[0]
+        first, last = np.searchsorted(ids, [fireid, fireid + 1])
+        return self.records[np.asarray(self.fire_index[1, first:last])]
+
+    def to_frame(self, records=None):
+        """Convert records to a DataFrame like that of get_emissions().
+
+        Args:
+            records (ndarray) - optional records, e.g. from day(). If None,
+                every record in the archive is converted.
+
+        Returns:
+            A DataFrame with a column for each record field, and dates as
+            'YYYY-MM-DD' strings.
+        """
+        if records is None:
+            records = self.records
+        return records_to_frame(records)
+
+
+def read_output(path):
+    """Read a per-fire emissions file, leaving out any row labels.
+
+    Args:
+        path (str) - path to a file written by get_emissions() or
+            speciate(), in any format read by read_table()
+    """
+    fire = read_table(path)
+    return fire[[c for c in fire if not str(c).startswith("Unnamed:")]]
+
+
+def record_dtype(fire):
+    """Build the record dtype for per-fire emissions.
+
+    Args:
+        fire (DataFrame) - per-fire emissions
+
+    Returns:
+        A numpy structured dtype with a field for each column of fire, in
+        order. Columns in RECORD_DTYPES use those dtypes, and the rest keep
+        their own.
+    """
+    return np.dtype(
+        [
+            (str(column), RECORD_DTYPES.get(column, fire[column].dtype))
+            for column in fire.columns
+        ]
+    )
+
+
+def to_records(fire, dtype):
+    """Convert per-fire emissions to records.
+
+    Args:
+        fire (DataFrame) - per-fire emissions
+        dtype (dtype) - the record dtype, see record_dtype()
+
+    Returns:
+        A structured array of records.
+    """
+    missing = [name for name in dtype.names if name not in fire]
+    if missing:
+        raise ValueError(
+            "archive records need the columns {}".format(missing)
+        )
+    records = np.empty(len(fire), dtype=dtype)
+    for name in dtype.names:
+        records[name] = fire[name].values.astype(dtype[name])
+    return records
+
+
+def records_to_frame(records):
+    """Convert records to a DataFrame, with dates as 'YYYY-MM-DD' strings.
+    """
+    frame = pd.DataFrame(np.asarray(records))
+    if "date" in frame:
+        frame["date"] = np.datetime_as_string(
+            records["date"], unit="D"
+        ).astype(object)
+    return frame
+
+
+def _index_path(path):
+    return derived_path(path, "", ".json")
+
+
+def _write_json(path, index):
+    with open(path, "w") as f:
+        json.dump(index, f, indent=1)
+
+
+def _write_npy(path, array):
+    # np.save() would add .npy to a path without it
+    with open(path, "wb") as f:
+        np.save(f, array)
+
+
+def _replace(path, value, write):
+    """Write a file under a temporary name, then move it into place."""
+    tmp_path = path + ".tmp"
+    write(tmp_path, value)
+    os.replace(tmp_path, path)
@@ -0,0 +1,291 @@
+""" Batch processing of many preprocessor files on a process pool. """
+
+import argparse
+import concurrent.futures
+import glob
+import json
+import numbers
+import os
+import shutil
+import sys
+import tempfile
+import traceback
+
+from .finnemit import EmissionModel
+from .io import derived_path, write_table
+from .pipeline import run_pipeline
+from .speciate import _speciation_file
+from .timing import _clear_metrics_hooks
+
+
+def run_batch(
+    inputs,
+    outdir=None,
+    processes=None,
+    fuelin=None,
+    emisin=None,
+    sfile=None,
+    speciate=True,
+    method="vectorized",
+    ext=None,
+    float_dtype=None,
+):
+    """Estimate emissions for many preprocessor files in parallel.
+
+    The fuel loading and emission factor tables are read once, and shared
+    with every worker process. A file that fails, or whose worker process
+    dies, is recorded in the summary, and does not stop the rest of the
+    batch.
+
+    Args:
+        inputs (str or list) - a glob pattern such as 'fires/*.csv', or a
+            list of paths to files created with the FINN preprocessor
+        outdir (str) - optional directory for the output files. If None,
+            outputs are written next to each input file.
+        processes (int) - number of worker processes. If None, one per CPU.
+            With 1, files are processed one after another in this process.
+        fuelin (str) - optional path to a fuel loading file, see
+            get_emissions()
+        emisin (str) - optional path to an emissions file, see
+            get_emissions()
+        sfile (str) - optional path to a speciation file, see speciate()
+        speciate (bool) - if True (default), also write speciated emissions
+            for each file, named by appending '_species'
+        method (str) - 'vectorized' (default) or 'loop', see get_emissions()
+        ext (str) - optional extension for the output files, e.g.
+            '.parquet'. If None, each output has the same extension as its
+            input.
+        float_dtype (str) - optional dtype for the floating point columns
+            of the output files, e.g. 'float32'
+
+    Returns:
+        A dictionary summarizing the batch. Numeric entries of the per-file
+        summaries are summed over the files that succeeded. 'file_summaries'
+        holds each file's summary, and 'failed_files' maps each failed input
+        to its error.
+    """
+    if isinstance(inputs, str):
+        infiles = sorted(glob.glob(inputs))
+    else:
+        infiles = list(inputs)
+    if outdir is not None and not os.path.isdir(outdir):
+        os.makedirs(outdir)
+
+    model = EmissionModel(fuelin=fuelin, emisin=emisin)
+    sfile = _speciation_file(sfile) if speciate else None
+    jobs = [
+        (i, infile, _output_path(infile, outdir, ext), method, float_dtype)
+        for i, infile in enumerate(infiles)
+    ]
+
+    if processes == 1:
+        _worker.update(model=model, sfile=sfile, started_dir=None)
+        results = [_process_file(job) for job in jobs]
+    else:
+        results = _run_pools(jobs, processes, model, sfile)
+
+    failed_files = {}
+    for job, (summary, error) in zip(jobs, results):
+        if error is not None:
+            failed_files[job[1]] = error
+    return merge_summaries([summary for summary, _ in results], failed_files)
+
+
+def merge_summaries(summaries, failed_files=None):
+    """Combine the summaries of several runs into one.
+
+    Args:
+        summaries (list) - summary dictionaries, as returned by
+            get_emissions(). None entries are skipped.
+        failed_files (dict) - optional errors, keyed by input file
+
+    Returns:
+        A dictionary with the numeric entries of the summaries summed, the
+        text entries of the first summary, 'num_files' and
+        'num_files_failed' counts, and the 'file_summaries' and
+        'failed_files' they were built from.
+    """
+    summaries = [summary for summary in summaries if summary is not None]
+    failed_files = failed_files or {}
+    merged = {
+        "num_files": len(summaries) + len(failed_files),
+        "num_files_failed": len(failed_files),
+    }
+    for summary in summaries:
+        for key, value in summary.items():
+            if key in ["input_file", "output_file", "species_file"]:
+                continue
+            if isinstance(value, numbers.Number):
+                merged[key] = merged.get(key, 0) + value
+            else:
+                merged.setdefault(key, value)
+    merged["file_summaries"] = summaries
+    merged["failed_files"] = failed_files
+    return merged
+
+
+def _output_path(infile, outdir, ext):
+    """Path of the emissions output file for one input."""
+    outfile = derived_path(infile, "_out", ext)
+    if outdir is not None:
+        outfile = os.path.join(outdir, os.path.basename(outfile))
+    return outfile
+
+
+def _run_pools(jobs, processes, model, sfile):
+    """Process jobs on a process pool, rebuilding it if a worker dies.
+
+    A worker that dies breaks the pool, and every job still on it. Jobs
+    that had not started are run again on a new pool. Jobs that had started
+    are run again one at a time, so that only the job that killed its
+    worker fails.
+
+    Returns:
+        A list of the (summary, error) tuple of each job.
+    """
+    results = [None] * len(jobs)
+    # each worker marks the jobs it starts with an empty file here
+    started_dir = tempfile.mkdtemp()
+    try:
+        initargs = (model, sfile, started_dir)
+        waiting = list(range(len(jobs)))
+        while waiting:
+            broken = _run_pool(jobs, waiting, processes, initargs, results)
+            started = set(int(name) for name in os.listdir(started_dir))
+            if broken and not started.intersection(broken):
+                # the pool broke before running anything, e.g. in
+                # _init_worker(), so it would break again
+                for i, error in broken.items():
+                    results[i] = (None, error)
+                break
+            waiting = [i for i in broken if i not in started]
+            for i in broken:
+                if i in started:
+                    error = _run_pool(jobs, [i], 1, initargs, results)
+                    if error:
+                        results[i] = (None, error[i])
+    finally:
+        shutil.rmtree(started_dir)
+    return results
+
+
+def _run_pool(jobs, indices, processes, initargs, results):
+    """Run some of jobs on a new process pool, storing their results.
+
+    Returns:
+        A dictionary of the traceback of each job that was lost when the
+        pool broke, keyed by its index.
+    """
+    broken = {}
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=processes, initializer=_init_worker, initargs=initargs
+    ) as pool:
+        futures = [(i, pool.submit(_process_file, jobs[i])) for i in indices]
+        for i, future in futures:
+            try:
+                results[i] = future.result()
+            except concurrent.futures.process.BrokenProcessPool:
+                broken[i] = traceback.format_exc()
+    return broken
+
+
+# Model and speciation file of a worker process, set by _init_worker()
+_worker = {}
+
+
+def _init_worker(model, sfile, started_dir=None):
+    """Store the shared model in a worker process."""
+    _clear_metrics_hooks()
+    _worker["model"] = model
+    _worker["sfile"] = sfile
+    _worker["started_dir"] = started_dir
+
+
+def _process_file(job):
+    """Process one input file, returning a (summary, error) tuple."""
+    i, infile, outfile, method, float_dtype = job
+    model = _worker["model"]
+    if _worker["started_dir"] is not None:
+        open(os.path.join(_worker["started_dir"], str(i)), "w").close()
+    try:
+        if _worker["sfile"] is None:
+            out_df, summary = model.run(infile, method=method)
+            write_table(out_df, outfile, float_dtype=float_dtype)
+            summary = dict(input_file=infile, output_file=outfile, **summary)
+        else:
+            summary, _ = run_pipeline(
+                infile,
+                emissions_outfile=outfile,
+                species_outfile=derived_path(outfile, "_species"),
+                sfile=_worker["sfile"],
+                method=method,
+                model=model,
+                float_dtype=float_dtype,
+            )
+        return summary, None
+    except Exception:
+        return None, traceback.format_exc()
+
+
+def main(argv=None):
+    """Command line driver for run_batch()."""
+    parser = argparse.ArgumentParser(
+        prog="python -m finnemit.batch",
+        description="Estimate FINN emissions for many preprocessor files.",
+    )
+    parser.add_argument(
+        "inputs", nargs="+", help="input files, or a quoted glob pattern"
+    )
+    parser.add_argument("--outdir", help="directory for output files")
+    parser.add_argument(
+        "--processes", type=int, help="number of worker processes"
+    )
+    parser.add_argument("--fuelin", help="fuel loading file")
+    parser.add_argument("--emisin", help="emission factor file")
+    parser.add_argument("--sfile", help="speciation file")
+    parser.add_argument(
+        "--no-speciate",
+        dest="speciate",
+        action="store_false",
+        help="only write emissions, not speciated emissions",
+    )
+    parser.add_argument("--ext", help="output file extension, e.g. .parquet")
+    parser.add_argument(
+        "--float-dtype", help="dtype for float output columns, e.g. float32"
+    )
+    parser.add_argument("--summary", help="path to write a json summary to")
+    args = parser.parse_args(argv)
+
+    inputs = args.inputs[0] if len(args.inputs) == 1 else args.inputs
+    summary = run_batch(
+        inputs,
+        outdir=args.outdir,
+        processes=args.processes,
+        fuelin=args.fuelin,
+        emisin=args.emisin,
+        sfile=args.sfile,
+        speciate=args.speciate,
+        ext=args.ext,
+        float_dtype=args.float_dtype,
+    )
+    if args.summary is not None:
+        with open(args.summary, "w") as f:
+            json.dump(summary, f, indent=1, default=_to_json)
+    for infile, error in summary["failed_files"].items():
+        print("Failed:", infile, file=sys.stderr)
+        print(error, file=sys.stderr)
+    print(
+        "Processed {} files, {} failed".format(
+            summary["num_files"], summary["num_files_failed"]
+        )
+    )
+    return 1 if summary["num_files_failed"] else 0
+
+
+def _to_json(value):
+    """Convert numpy scalars for json.dump()."""
+    return value.item()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
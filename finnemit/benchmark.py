@@ -0,0 +1,230 @@
+""" Scalability benchmarks on synthetic fires.
+
+Run from the command line with ``python -m finnemit.benchmark``. Results
+are saved as json, and can be compared with the results of another commit.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from . import __version__
+from .finnemit import EmissionModel, read_fires
+from .io import write_table
+from .speciate import speciate_emissions, _speciation_file
+from .synthetic import write_synthetic_fires
+
+# Stages timed by run_benchmarks(), in order
+STAGES = ["ingest", "emissions", "speciate", "write"]
+
+DEFAULT_SIZES = [10 ** 3, 10 ** 4, 10 ** 5]
+
+
+def run_benchmarks(
+    sizes=None,
+    repeat=3,
+    ext=".csv",
+    method="vectorized",
+    engine=None,
+    seed=0,
+    workdir=None,
+):
+    """Time each stage of the FINN workflow on synthetic inputs.
+
+    For each size, a synthetic preprocessor file is written once, and then
+    the ingest, emissions, speciation and output writing stages are each
+    timed separately. The best of several repeats is kept, which is the
+    least noisy estimate of each stage's cost.
+
+    Args:
+        sizes (list) - numbers of fires to benchmark, e.g. [1000, 10 ** 7].
+            If None, DEFAULT_SIZES are used. The largest inputs need several
+            GB of memory.
+        repeat (int) - number of times to run each stage
+        ext (str) - file extension of the input and output files, e.g.
+            '.parquet'
+        method (str) - 'vectorized' (default) or 'loop', see get_emissions()
+        engine (str) - optional csv parser, see read_fires()
+        seed (int) - seed for the synthetic fires
+        workdir (str) - optional directory for the input and output files.
+            If None, a temporary directory is used and removed afterwards.
+
+    Returns:
+        A dictionary with 'environment', describing the machine and code
+        that were benchmarked, and 'results', a list with one dictionary of
+        'fires', 'stage', 'seconds' and 'fires_per_second' for each size
+        and stage.
+    """
+    if sizes is None:
+        sizes = DEFAULT_SIZES
+    tmpdir = tempfile.mkdtemp(prefix="finnemit-bench-", dir=workdir)
+    model = EmissionModel()
+    sfile = _speciation_file(None)
+    results = []
+    try:
+        for n in sizes:
+            infile = os.path.join(tmpdir, "fires-{}{}".format(n, ext))
+            write_synthetic_fires(infile, n, seed=seed)
+            outfile = os.path.join(tmpdir, "out-{}{}".format(n, ext))
+            species_outfile = os.path.join(
+                tmpdir, "species-{}{}".format(n, ext)
+            )
+
+            timings = dict((stage, []) for stage in STAGES)
+            for _ in range(repeat):
+                start = time.perf_counter()
+                fires = read_fires(infile, engine=engine)
+                timings["ingest"].append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                out_df, _ = model.run(fires, method=method)
+                timings["emissions"].append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                species_df = speciate_emissions(
+                    out_df.reset_index(drop=True), sfile
+                )
+                timings["speciate"].append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                write_table(out_df, outfile)
+                write_table(species_df, species_outfile)
+                timings["write"].append(time.perf_counter() - start)
+                del fires, out_df, species_df
+
+            for stage in STAGES:
+                seconds = min(timings[stage])
+                results.append(
+                    {
+                        "fires": n,
+                        "stage": stage,
+                        "seconds": seconds,
+                        "fires_per_second": n / seconds if seconds else None,
+                    }
+                )
+            os.remove(infile)
+    finally:
+        shutil.rmtree(tmpdir)
+
+    environment = _environment()
+    environment.update(
+        {"repeat": repeat, "ext": ext, "method": method, "engine": engine}
+    )
+    return {"environment": environment, "results": results}
+
+
+def compare_benchmarks(baseline, current):
+    """Compare two sets of benchmark results.
+
+    Args:
+        baseline, current (dict) - results of run_benchmarks(), e.g. from
+            two commits
+
+    Returns:
+        A DataFrame with the baseline and current seconds for each number
+        of fires and stage found in both, and the speedup of current over
+        baseline (above 1 means current is faster).
+    """
+    keys = ["fires", "stage"]
+    old = pd.DataFrame(baseline["results"]).set_index(keys)["seconds"]
+    new = pd.DataFrame(current["results"]).set_index(keys)["seconds"]
+    table = pd.concat(
+        [old.rename("baseline_seconds"), new.rename("current_seconds")],
+        axis=1,
+        join="inner",
+    )
+    table["speedup"] = table["baseline_seconds"] / table["current_seconds"]
+    return table
+
+
+def _environment():
+    """Describe the code and machine being benchmarked."""
+    return {
+        "finnemit_version": __version__,
+        "git_commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def _git_commit():
+    """Get the git commit of the package source, if it is in a git repo."""
+    try:
+        return (
+            subprocess.check_output(
+                ["git", "rev-parse", "HEAD"],
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+                stderr=subprocess.DEVNULL,
+            )
+            .decode()
+            .strip()
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    """Command line driver for run_benchmarks()."""
+    parser = argparse.ArgumentParser(
+        prog="python -m finnemit.benchmark",
+        description="Time FINN emissions on synthetic fires.",
+    )
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=DEFAULT_SIZES,
+        help="numbers of fires, e.g. 1000 10000000",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="number of runs of each stage"
+    )
+    parser.add_argument(
+        "--ext", default=".csv", help="file extension, e.g. .parquet"
+    )
+    parser.add_argument("--method", default="vectorized")
+    parser.add_argument("--engine", help="csv parser, e.g. pyarrow")
+    parser.add_argument("--workdir", help="directory for temporary files")
+    parser.add_argument("--output", help="path to write json results to")
+    parser.add_argument(
+        "--compare", help="json results of an earlier run to compare with"
+    )
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(
+        sizes=args.sizes,
+        repeat=args.repeat,
+        ext=args.ext,
+        method=args.method,
+        engine=args.engine,
+        workdir=args.workdir,
+    )
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=1)
+
+    table = pd.DataFrame(results["results"]).set_index(["fires", "stage"])
+    print(table.to_string())
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(compare_benchmarks(baseline, results).to_string())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,223 @@
+""" On-disk cache of results, keyed by the contents of their inputs.
+
+Run from the command line with ``python -m finnemit.cache DIRECTORY`` to
+list the cached results, or with ``--clear`` to remove them.
+"""
+
+import argparse
+import hashlib
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+
+import pandas as pd
+
+from . import __version__
+
+# Default size limit of a cache directory, in bytes
+DEFAULT_MAX_BYTES = 2 ** 30
+
+# Name of the file holding an entry's data, whose modification time records
+# when the entry was last used
+DATA_FILE = "data.pkl"
+
+BLOCK_SIZE = 2 ** 20
+
+
+class ResultCache(object):
+    """A directory of cached results, evicting the least recently used.
+
+    Each entry is a subdirectory named by its key, holding copies of the
+    output files of a run and a pickle of its summary. When the entries
+    grow past max_bytes, those used least recently are removed.
+
+    Args:
+        directory (str) - path to the cache directory. It is created if it
+            does not exist.
+        max_bytes (int) - size limit of the cache, in bytes
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def key(self, *parts):
+        """Hash the parts of a key, along with the package version.
+
+        Args:
+            parts - strings, or None, identifying a result. Paths to files
+                should be given with file_digest(), so that the key depends
+                on the contents of the file rather than its name.
+
+        Returns:
+            A hexadecimal key.
+        """
+        digest = hashlib.sha256(__version__.encode())
+        for part in parts:
+            digest.update(b"\0" + repr(part).encode())
+        return digest.hexdigest()
+
+    def lookup(self, key):
+        """Find a cached result, and mark it as used.
+
+        Returns:
+            A tuple of (entry directory, cached data), or None if there is
+            no entry for key.
+        """
+        entry = os.path.join(self.directory, key)
+        data_file = os.path.join(entry, DATA_FILE)
+        try:
+            with open(data_file, "rb") as f:
+                data = pickle.load(f)
+            os.utime(data_file, None)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        return entry, data
+
+    def store(self, key, files, data):
+        """Add a result to the cache, and evict old entries if needed.
+
+        Args:
+            key (str) - key of the result, from key()
+            files (dict) - paths of the files to copy into the entry, keyed
+                by the names they are stored under
+            data - any picklable data, e.g. a summary dictionary
+        """
+        entry = os.path.join(self.directory, key)
+        # build the entry under a temporary name, so that it appears whole
+        tmp_entry = tempfile.mkdtemp(prefix=".tmp-", dir=self.directory)
+        try:
+            for name, path in files.items():
+                shutil.copyfile(path, os.path.join(tmp_entry, name))
+            with open(os.path.join(tmp_entry, DATA_FILE), "wb") as f:
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+            if os.path.isdir(entry):
+                shutil.rmtree(entry, ignore_errors=True)
+            os.rename(tmp_entry, entry)
+        except OSError:
+            # another process stored the same key first
+            shutil.rmtree(tmp_entry, ignore_errors=True)
+        self.evict()
+
+    def entries(self):
+        """List the cached entries.
+
+        Returns:
+            A DataFrame with the 'key', size in 'bytes' and 'last_used' time
+            of each entry, most recently used first.
+        """
+        rows = []
+        for key in os.listdir(self.directory):
+            entry = os.path.join(self.directory, key)
+            data_file = os.path.join(entry, DATA_FILE)
+            if key.startswith(".") or not os.path.isfile(data_file):
+                continue
+            try:
+                nbytes = sum(
+                    os.path.getsize(os.path.join(entry, name))
+                    for name in os.listdir(entry)
+                )
+                last_used = os.path.getmtime(data_file)
+            except OSError:
+                continue
+            rows.append((key, nbytes, pd.Timestamp(last_used, unit="s")))
+        table = pd.DataFrame(rows, columns=["key", "bytes", "last_used"])
+        table = table.sort_values(
+            by=["last_used", "key"], ascending=False, kind="mergesort"
+        )
+        return table.reset_index(drop=True)
+
+    def size(self):
+        """Total size of the cached entries, in bytes."""
+        return int(self.entries()["bytes"].sum())
+
+    def evict(self, max_bytes=None):
+        """Remove the least recently used entries, until the cache fits.
+
+        Args:
+            max_bytes (int) - optional size to shrink the cache to. If None,
+                the cache's max_bytes is used.
+
+        Returns:
+            A list of the keys removed.
+        """
+        if max_bytes is None:
+            max_bytes = self.max_bytes
+        table = self.entries()
+        keep = table["bytes"].cumsum() <= max_bytes
+        removed = list(table["key"][~keep.values])
+        for key in removed:
+            entry = os.path.join(self.directory, key)
+            shutil.rmtree(entry, ignore_errors=True)
+        return removed
+
+    def clear(self):
+        """Remove every entry from the cache.
+
+        Returns:
+            A list of the keys removed.
+        """
+        return self.evict(max_bytes=0)
+
+
+def open_cache(cache):
+    """Get a ResultCache from a cache argument.
+
+    Args:
+        cache (str or ResultCache) - a cache, the path to a cache
+            directory, or None
+
+    Returns:
+        A ResultCache, or None if cache is None.
+    """
+    if cache is None or isinstance(cache, ResultCache):
+        return cache
+    return ResultCache(cache)
+
+
+def file_digest(path):
+    """Hash the contents of a file.
+
+    Returns:
+        A hexadecimal SHA-256 digest.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def main(argv=None):
+    """Command line tool to inspect or clear a cache directory."""
+    parser = argparse.ArgumentParser(
+        prog="python -m finnemit.cache",
+        description="List or clear cached FINN results.",
+    )
+    parser.add_argument("directory", help="path to the cache directory")
+    parser.add_argument(
+        "--clear", action="store_true", help="remove every cached result"
+    )
+    args = parser.parse_args(argv)
+
+    cache = ResultCache(args.directory)
+    if args.clear:
+        removed = cache.clear()
+        print("Removed {} cached results".format(len(removed)))
+        return 0
+    table = cache.entries()
+    print(table.to_string(index=False))
+    print(
+        "{} cached results, {} bytes".format(
+            len(table), int(table["bytes"].sum())
+        )
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,185 @@
+""" Classified fires saved to disk, to rerun with other emission factors.
+
+Everything get_emissions() works out for a fire before applying emission
+factors (the corrected land cover, generic land cover, burned area and
+biomass and emission factor row) depends only on the input file and the
+fuel loading tables. write_classified() saves it in a columnar file, and
+emit_classified() applies emission factors to it without reading or
+checking the input file again.
+"""
+
+import json
+import os
+
+from . import __version__
+from .archive import _replace, _write_json
+from .finnemit import EmissionModel, read_fires, _cast_floats, _read_fires
+from .io import (
+    TableWriter,
+    derived_path,
+    file_format,
+    read_table,
+    write_table,
+)
+from .timing import StageTimer
+
+# Dtypes classified columns are stored in, which hold every code exactly.
+# Columns are cast back to their own dtypes when read.
+STORED_DTYPES = {
+    "jd": "int16",
+    "lct": "int8",
+    "globreg": "int16",
+    "genLC": "int8",
+    "ef_index": "int8",
+}
+
+
+def write_classified(infile, path, fuelin=None, engine=None):
+    """Classify the fires of a preprocessor file, and save them.
+
+    Two files are written: the classified fires at path, and a .json file
+    alongside it with the quality assurance counters and column dtypes.
+
+    Args:
+        infile (str) - path to a file created with the FINN preprocessor,
+            in any format read by read_table()
+        path (str) - path to the classified fires, a Parquet (.parquet) or
+            Arrow (.feather) file. csv files are not supported, as they do
+            not read back every floating point value exactly.
+        fuelin (str) - optional path to a fuel loading file, see
+            get_emissions()
+        engine (str) - optional csv parser, see read_fires()
+
+    Returns:
+        A dictionary with the 'input_file', 'classified_file',
+        'num_fires_total' and 'num_fires_classified', and stage timings.
+    """
+    if file_format(path) == "csv":
+        raise ValueError(
+            "classified fires must be saved to a Parquet or Arrow file, got "
+            "{}".format(path)
+        )
+    timer = StageTimer()
+    with timer.stage("table_load"):
+        model = EmissionModel(fuelin=fuelin)
+    with timer.stage("ingest") as stage:
+        fires = _read_fires(read_fires(infile, engine=engine))
+        numorig = len(fires["jd"])
+        stage.rows = numorig
+    classified, counts = model.classify(fires, timer)
+
+    with timer.stage("write", rows=len(classified)):
+        metadata = {
+            "version": __version__,
+            "input_file": infile,
+            "fuel_load_file": model.fuelin,
+            "num_fires_total": numorig,
+            "counts": dict(
+                (name, int(count)) for name, count in counts.items()
+            ),
+            "dtypes": dict(
+                (column, str(dtype))
+                for column, dtype in classified.dtypes.items()
+            ),
+        }
+        # a failed write should not leave the old metadata over new fires
+        if os.path.isfile(_metadata_path(path)):
+            os.remove(_metadata_path(path))
+        with TableWriter(path, index=False) as writer:
+            writer.write(classified.astype(STORED_DTYPES))
+        _replace(_metadata_path(path), metadata, _write_json)
+
+    summary = {
+        "input_file": infile,
+        "classified_file": path,
+        "num_fires_total": numorig,
+        "num_fires_classified": len(classified),
+    }
+    summary.update(timer.summary())
+    return summary
+
+
+def emit_classified(
+    path,
+    outfile,
+    emisin=None,
+    return_df=False,
+    columns=None,
+    float_dtype=None,
+    precision="float64",
+    species=None,
+):
+    """Estimate emissions for fires saved by write_classified().
+
+    The output file and summary are those of get_emissions() on the
+    original input file, with the fuel loading table the fires were
+    classified with and the emission factors of emisin.
+
+    Args:
+        path (str) - path to classified fires written by write_classified()
+        outfile (str) - path to the output file
+        emisin (str) - optional path to an emissions file, see
+            get_emissions()
+        return_df (bool) - if True, also return the per-fire emissions as a
+            DataFrame
+        columns (list) - optional names of the columns to write to outfile
+        float_dtype (str) - optional dtype for the floating point columns
+            of outfile
+        precision (str) - 'float64' (default) or 'float32', see
+            EmissionModel
+        species (list or str) - optional names of the species to emit, see
+            get_emissions()
+
+    Returns:
+        A dictionary summarizing emission totals, as returned by
+        get_emissions(). If return_df is True, a tuple of (summary
+        dictionary, DataFrame).
+    """
+    timer = StageTimer()
+    with timer.stage("table_load"):
+        metadata = read_metadata(path)
+        model = EmissionModel(
+            emisin=emisin, precision=precision, species=species
+        )
+    with timer.stage("ingest") as stage:
+        classified = read_table(path).astype(metadata["dtypes"])
+        classified = _cast_floats(classified, precision)
+        stage.rows = len(classified)
+    with timer.stage("emissions", rows=len(classified)):
+        out_df, totals = model.emit(classified)
+    with timer.stage("sort", rows=len(out_df)):
+        out_df = out_df.sort_values(by=["jd"], kind="mergesort")
+    with timer.stage("write", rows=len(out_df)):
+        write_table(out_df, outfile, columns=columns, float_dtype=float_dtype)
+
+    summary_dict = {
+        "input_file": metadata["input_file"],
+        "output_file": outfile,
+    }
+    summary_dict.update(
+        model._summary(metadata["num_fires_total"], metadata["counts"], totals)
+    )
+    summary_dict["fuel_load_file"] = metadata["fuel_load_file"]
+    summary_dict.update(timer.summary())
+    if return_df:
+        return summary_dict, out_df
+    return summary_dict
+
+
+def read_metadata(path):
+    """Read the metadata of classified fires written by write_classified().
+    """
+    with open(_metadata_path(path)) as f:
+        metadata = json.load(f)
+    if metadata["version"] != __version__:
+        raise ValueError(
+            "classified fires {} were written by finnemit {}, and must be "
+            "written again for finnemit {}".format(
+                path, metadata["version"], __version__
+            )
+        )
+    return metadata
+
+
+def _metadata_path(path):
+    return derived_path(path, "", ".json")
@@ -0,0 +1,161 @@
+""" Monte Carlo uncertainty ensembles of emission totals.
+
+Each member of an ensemble scales the emission factors, fuel loads and
+combustion factors of the model by random factors. Fires are classified
+once, and every member is evaluated together as a (fires, members) array of
+burned biomass, which is summed by emission factor row before the emission
+factors are applied.
+"""
+
+import concurrent.futures
+
+import numpy as np
+import pandas as pd
+
+from .finnemit import CF1, EmissionModel, _read_fires
+
+# Default memory budget of a chunk of fires, in bytes
+DEFAULT_MEMORY_BYTES = 2 ** 28
+
+DEFAULT_PERCENTILES = (2.5, 50.0, 97.5)
+
+
+def run_ensemble(
+    fires,
+    members=100,
+    ef_sigma=0.3,
+    fuel_sigma=0.5,
+    cf_sigma=0.2,
+    seed=None,
+    percentiles=DEFAULT_PERCENTILES,
+    memory_bytes=DEFAULT_MEMORY_BYTES,
+    processes=1,
+    model=None,
+    fuelin=None,
+    emisin=None,
+):
+    """Estimate the uncertainty of emission totals with a Monte Carlo
+    ensemble.
+
+    Each member multiplies the model's inputs by log-normal factors with a
+    median of 1: one for each emission factor (each row and species of the
+    emission factor table), one for the fuel loads of each generic land
+    cover, and one each for the combustion factors of coarse (CF1) and
+    herbaceous (CF3) fuels. Scaled combustion factors are capped at 1.
+    Herbaceous fuels come from the grassland fuel loads, so are scaled by
+    the grassland factor, and coarse fuels by the factor of each fire's
+    generic land cover.
+
+    Args:
+        fires (str or DataFrame) - path to a file created with the FINN
+            preprocessor, in any format read by read_table(), or a
+            DataFrame with the same columns
+        members (int) - number of ensemble members
+        ef_sigma, fuel_sigma, cf_sigma (float) - standard deviations of
+            the natural log of the emission factor, fuel load and
+            combustion factor scalings. With 0, that input is not perturbed.
+        seed (int) - optional seed, for a reproducible ensemble
+        percentiles (sequence) - percentiles of the member totals to
+            summarize, from 0 to 100
+        memory_bytes (int) - approximate memory budget of the arrays of a
+            chunk of fires. Larger chunks are faster, up to a point.
+        processes (int) - number of worker processes to evaluate chunks
+            on. If None, one per CPU. With 1 (default), chunks are
+            evaluated one after another in this process.
+        model (EmissionModel) - optional model with preloaded tables. If
+            given, fuelin and emisin are ignored.
+        fuelin (str) - optional path to a fuel loading file, see
+            get_emissions()
+        emisin (str) - optional path to an emissions file, see
+            get_emissions()
+
+    Returns:
+        A tuple of (DataFrame of member totals, with a row for each member
+        and columns of biomass burned 'bmass' and each emitted species in
+        Tg, DataFrame of the percentiles of each column, indexed by
+        percentile).
+    """
+    if model is None:
+        model = EmissionModel(fuelin=fuelin, emisin=emisin)
+    if members < 1:
+        raise ValueError("members must be at least 1, got {}".format(members))
+
+    classified, _ = model.classify(_read_fires(fires), components=True)
+    ef = model.ef.astype(float)
+    nrows = len(ef)
+
+    rng = np.random.RandomState(seed)
+    ef_factors = _lognormal(rng, ef_sigma, (members,) + ef.shape)
+    fuel_factors = _lognormal(rng, fuel_sigma, (10, members))
+    cf1 = np.minimum(CF1 * _lognormal(rng, cf_sigma, members), 1.0)
+    cf3_factors = _lognormal(rng, cf_sigma, members)
+
+    # a chunk holds a few (fires, members) arrays and the one-hot matrix of
+    # its emission factor rows
+    chunksize = max(1, int(memory_bytes // (8 * (4 * members + nrows))))
+    arrays = dict(
+        (column, classified[column].values)
+        for column in ["area", "herb_fuel", "coarse_fuel", "cf3", "genLC"]
+    )
+    arrays["ef_index"] = classified["ef_index"].values
+    jobs = [
+        (
+            dict(
+                (name, array[start:start + chunksize])
+                for name, array in arrays.items()
+            ),
+            fuel_factors,
+            cf1,
+            cf3_factors,
+            nrows,
+        )
+        for start in range(0, len(classified), chunksize)
+    ]
+
+    if processes == 1:
+        results = [_burned_by_row(job) for job in jobs]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=processes
+        ) as pool:
+            results = list(pool.map(_burned_by_row, jobs))
+    by_row = np.zeros((nrows, members))
+    for result in results:
+        by_row += result
+
+    # emissions (kg) = burned biomass (kg) * EF (g/kg) / 1000
+    emissions = np.einsum("rm,rs,mrs->ms", by_row, ef, ef_factors) / 1000.0
+    totals = pd.DataFrame(emissions / 1.0e9, columns=model.species)
+    totals.insert(0, "bmass", by_row.sum(axis=0) / 1.0e9)
+    totals.index.name = "member"
+
+    summary = pd.DataFrame(
+        np.percentile(totals.values, list(percentiles), axis=0),
+        index=pd.Index(list(percentiles), name="percentile"),
+        columns=totals.columns,
+    )
+    return totals, summary
+
+
+def _lognormal(rng, sigma, size):
+    """Draw log-normal scaling factors with a median of 1."""
+    return np.exp(sigma * rng.standard_normal(size))
+
+
+def _burned_by_row(job):
+    """Sum the biomass burned by a chunk of fires in each member, by
+    emission factor row.
+
+    Returns:
+        An array of burned biomass in kg, indexed by [emission factor row,
+        member].
+    """
+    fires, fuel_factors, cf1, cf3_factors, nrows = job
+    cf3 = np.minimum(fires["cf3"][:, None] * cf3_factors, 1.0)
+    # herbaceous fuels are the grassland (genLC 1) fuel loads, see _biomass()
+    bmass = fires["herb_fuel"][:, None] * (cf3 * fuel_factors[1])
+    bmass += fires["coarse_fuel"][:, None] * cf1 * fuel_factors[fires["genLC"]]
+    bmass *= fires["area"][:, None]
+    rows = np.zeros((nrows, len(bmass)))
+    rows[fires["ef_index"], np.arange(len(bmass))] = 1.0
+    return rows.dot(bmass)
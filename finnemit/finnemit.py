@@ -6,154 +6,1369 @@ for a variety of compounds.
 
 """
 
-import re
-import datetime
+import os
+import shutil
+import tempfile
+import time
+import logging
+import collections
+import concurrent.futures
 import pandas as pd
 import numpy as np
 import pkg_resources
 
-
-def get_emissions(infile, outfile=None, fuelin=None, emisin=None):
+from .cache import file_digest, open_cache
+from .io import (
+    derived_path,
+    file_format,
+    read_table,
+    iter_tables,
+    write_table,
+    TableWriter,
+)
+from .timing import StageTimer, remove_timings, _clear_metrics_hooks
+
+logger = logging.getLogger(__name__)
+
+
+# Columns read from the preprocessor input file
+INPUT_COLUMNS = [
+    "polyid",
+    "fireid",
+    "cen_lon",
+    "cen_lat",
+    "acq_date_lst",
+    "area_sqkm",
+    "v_lct",
+    "v_tree",
+    "v_herb",
+    "v_bare",
+    "v_regnum",
+]
+
+# dtypes of the input columns. Land cover codes and regions are small
+# integers. Regions are nullable, since fires outside every region have no
+# region number. VCF cover percentages are read in the precision of the
+# model, see input_dtypes().
+INPUT_DTYPES = {
+    "polyid": "int64",
+    "fireid": "int64",
+    "cen_lon": "float64",
+    "cen_lat": "float64",
+    "acq_date_lst": str,
+    "area_sqkm": "float64",
+    "v_lct": "int16",
+    "v_tree": "float64",
+    "v_herb": "float64",
+    "v_bare": "float64",
+    "v_regnum": "Int8",
+}
+
+# Columns of the per-fire output file, in order
+OUTPUT_COLUMNS = [
+    "longi",
+    "lat",
+    "polyid",
+    "fireid",
+    "date",
+    "jd",
+    "lct",
+    "globreg",
+    "genLC",
+    "pcttree",
+    "pctherb",
+    "pctbare",
+    "area",
+    "bmass",
+    "CO",
+    "NOx",
+    "NO",
+    "NO2",
+    "NH3",
+    "SO2",
+    "NMOC",
+    "PM25",
+    "PM10",
+    "OC",
+    "BC",
+]
+
+# Emission factor columns, keyed by the output column they produce
+EF_COLUMNS = {
+    "CO": "CO",
+    "NMOC": "NMOC",
+    "NOx": "NOXasNO",
+    "NO": "NO",
+    "NO2": "NO2",
+    "SO2": "SO2",
+    "PM25": "PM25",
+    "OC": "OC",
+    "BC": "BC",
+    "NH3": "NH3",
+    "PM10": "PM10",
+}
+
+# Species emitted by default, in output column order
+DEFAULT_SPECIES = OUTPUT_COLUMNS[14:]
+
+# Columns of the emission factor file that describe each row, rather than
+# holding emission factors
+EF_LABEL_COLUMNS = ["LCT", "GenVegType", "GenVegDescript"]
+
+# Names of species totals in the summary that differ from their column
+SUMMARY_NAMES = {"PM25": "PM2.5"}
+
+# Fuel loading columns, keyed by the generic land cover (genveg) they apply to
+FUEL_COLUMNS = {
+    1: "Savanna and Grasslands",
+    2: "Woody Savanna",
+    3: "Tropical Forest",
+    4: "Temperate Forest",
+    5: "Boreal Forest",
+    6: "Temperate Forest",  # Added genveg == 6 (06/20/2014)
+}
+
+# Fuel load for croplands (genveg == 9) in g/m2. 02/08/2019 changed from
+# 1200. based on Akagi, van Leewuen and McCarty
+CROP_FUEL_LOAD = 902.0
+
+# Fuel load for sugar cane in Brazil, from Elliott Campbell, 06/14/2010
+SUGARCANE_FUEL_LOAD = 1100.0
+
+# Emission factor row for each LCT code (-1 where LCT has no row)
+EF_INDEX = np.array([-1, 0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, -1, 12, -1, 13])
+
+# Emission factor row for temperate evergreen forests (genveg == 6)
+EF_INDEX_TEMPERATE_EVERGREEN = 14
+
+METHODS = ["vectorized", "loop"]
+
+# Number of input rows each worker process handles at a time, when
+# get_emissions() is run on several processes without a chunksize
+DEFAULT_CHUNKSIZE = 1000000
+
+# Floating point precisions that emissions can be calculated and stored in.
+# Totals are always accumulated in float64.
+PRECISIONS = ["float64", "float32"]
+
+# Combustion factor of live woody (coarse) fuels in forests and woodlands
+CF1 = 0.30
+
+
+def get_emissions(
+    infile,
+    outfile=None,
+    fuelin=None,
+    emisin=None,
+    method="vectorized",
+    chunksize=None,
+    return_df=False,
+    columns=None,
+    float_dtype=None,
+    engine=None,
+    cache=None,
+    precision="float64",
+    species=None,
+    processes=1,
+):
     """Get emissions estimates with FINN
 
     Args:
-        infile (str) - path to input file
+        infile (str) - path to input file. This can be a csv, Parquet
+            (.parquet) or Arrow/Feather (.feather, .arrow) file.
         outfile (str) - optional path to output file. If None, then this is
-            constructed by appending '_output' to the input filename
+            constructed by appending '_out' to the input filename. The
+            format is taken from the extension, as for infile.
         fuelin (str) - optional path to a fuel loading file. This must be
             formatted like the file finnemit/data/fuel-loads.csv
         emisin (str) - optional path to an emissions file. This must be
             formatted like the file finnemit/data/emission-factors.csv
+        method (str) - 'vectorized' (default) processes all fires at once
+            with array operations. 'loop' is the original reference
+            implementation, which visits one fire at a time.
+        chunksize (int) - optional number of input rows to process at a
+            time. If None, the whole input file is read into memory at once.
+            Otherwise memory use is bounded by the chunk size, and the
+            output file is the same.
+        return_df (bool) - if True, also return the per-fire emissions as a
+            DataFrame. This cannot be combined with chunksize.
+        columns (list) - optional names of the columns to write to outfile.
+            All of OUTPUT_COLUMNS are written by default.
+        float_dtype (str) - optional dtype for the floating point columns
+            of outfile, e.g. 'float32'.
+        engine (str) - optional csv parser, e.g. 'pyarrow' for a faster,
+            multithreaded parser, see read_fires(). This cannot be combined
+            with chunksize.
+        cache (str or ResultCache) - optional cache, or path to a cache
+            directory, see finnemit.cache. If the same input file contents
+            have been run before with the same tables and options, the
+            cached output file and summary are used instead of estimating
+            emissions again.
+        precision (str) - 'float64' (default), or 'float32' to calculate
+            and store per-fire emissions in single precision, which halves
+            their memory use and output size. See EmissionModel.
+        species (list or str) - optional names of the species to emit, or
+            'all' for every column of the emission factor file. See
+            EmissionModel. Output columns and summary totals follow this
+            list.
+        processes (int) - number of worker processes to estimate emissions
+            on, each handling chunksize input rows at a time. If None, one
+            per CPU. With more than one process and no chunksize, chunks of
+            DEFAULT_CHUNKSIZE rows are used. The output file and summary do
+            not depend on the number of processes.
 
     Returns:
         A dictionary summarizing emission totals, and writes a file to outfile.
+        The wall time and number of rows of each stage of the run are given
+        by '<stage>_seconds' and '<stage>_rows' entries, see
+        finnemit.timing.STAGES. If return_df is True, a tuple of (summary
+        dictionary, DataFrame).
     """
+    if processes != 1 and chunksize is None:
+        chunksize = DEFAULT_CHUNKSIZE
+    if return_df and chunksize is not None:
+        raise ValueError(
+            "return_df cannot be used with chunksize or processes"
+        )
+    if engine is not None and chunksize is not None:
+        raise ValueError("engine cannot be used with chunksize or processes")
 
-    # USER INPUTS --- EDIT DATE AND SCENARIO HERE - this is for file naming
-    # NOTE: ONLY LCT - Don't really need this
-    scen = 1
-    scename = "scen1"
+    # READIN IN FIRE AND LAND COVER INPUT FILE (CREATED WITH PREPROCESSOR)
+    if outfile is None:
+        outfile = derived_path(infile, "_out")
+
+    timer = StageTimer()
+    cache = open_cache(cache)
+    if cache is not None:
+        fuelin, emisin, lctfuelin = _table_files(fuelin, emisin)
+        key = cache.key(
+            "emissions",
+            file_digest(infile),
+            file_digest(fuelin),
+            file_digest(emisin),
+            file_digest(lctfuelin),
+            method,
+            file_format(outfile),
+            columns,
+            float_dtype,
+            precision,
+            species,
+        )
+        hit = cache.lookup(key)
+        if hit is not None and (not return_df or "out_df" in hit[1]):
+            entry, data = hit
+            with timer.stage("cache"):
+                shutil.copyfile(os.path.join(entry, "output"), outfile)
+            summary_dict = {"input_file": infile, "output_file": outfile}
+            summary_dict.update(data["summary"])
+            summary_dict.update(
+                {"emissions_file": emisin, "fuel_load_file": fuelin}
+            )
+            summary_dict.update(timer.summary())
+            if return_df:
+                return summary_dict, data["out_df"]
+            return summary_dict
+
+    with timer.stage("table_load"):
+        model = EmissionModel(
+            fuelin=fuelin, emisin=emisin, precision=precision, species=species
+        )
+    if chunksize is None:
+        with timer.stage("ingest"):
+            fires = read_fires(infile, engine=engine, precision=precision)
+        out_df, summary = model.run(fires, method=method, timer=timer)
+        with timer.stage("write", rows=len(out_df)):
+            write_table(
+                out_df, outfile, columns=columns, float_dtype=float_dtype
+            )
+    else:
+        summary = model.stream(
+            infile,
+            outfile,
+            chunksize,
+            method=method,
+            columns=columns,
+            float_dtype=float_dtype,
+            timer=timer,
+            processes=processes,
+        )
+    summary.update(timer.summary())
+
+    if cache is not None:
+        # timings of the run that filled the cache are not kept
+        data = {"summary": remove_timings(summary)}
+        if return_df:
+            data["out_df"] = out_df
+        cache.store(key, {"output": outfile}, data)
+
+    summary_dict = {"input_file": infile, "output_file": outfile}
+    summary_dict.update(summary)
+    if return_df:
+        return summary_dict, out_df
+    return summary_dict
 
-    # SETTING UP VARIABLES To CHECK TOTALS AT THE END OF The FILE
 
-    # Calculating the total biomass burned in each genveg for output file
-    TOTTROP = 0.0
-    TOTTEMP = 0.0
-    TOTBOR = 0.0
-    TOTSHRUB = 0.0
-    TOTCROP = 0.0
-    TOTGRAS = 0.0
-    # Calculating total area in each genveg for output log file
-    TOTTROParea = 0.0
-    TOTTEMParea = 0.0
-    TOTBORarea = 0.0
-    TOTSHRUBarea = 0.0
-    TOTCROParea = 0.0
-    TOTGRASarea = 0.0
-    # CALCULATING TOTAL CO and PM2.5 for crops
-    TOTCROPCO = 0.0
-    TOTCROPPM25 = 0.0
+class EmissionModel(object):
+    """FINN emission model for a set of fuel loading and emission factors.
+
+    The fuel loading and emission factor tables are read and checked once,
+    and stored as dense lookup arrays, so that one model can be run on many
+    sets of fires.
+
+    Args:
+        fuelin (str) - optional path to a fuel loading file. This must be
+            formatted like the file finnemit/data/fuel-loads.csv
+        emisin (str) - optional path to an emissions file. This must be
+            formatted like the file finnemit/data/emission-factors.csv
+        species (list or str) - optional names of the species to emit, in
+            order. These are output column names such as 'NOx', or the
+            names of emission factor columns such as 'CO2'. 'all' emits
+            every emission factor column. If None, DEFAULT_SPECIES.
+        precision (str) - 'float64' (default) or 'float32', the precision
+            that per-fire emissions are calculated and returned in. Quality
+            checks and land cover classification are always done in float64,
+            so both precisions keep the same fires, and totals are always
+            accumulated in float64. In float32, per-fire values differ from
+            float64 by a relative error of about 1e-7, and totals by a
+            similar amount.
+
+    Attributes:
+        fuel_load (ndarray) - fuel loads in g/m2, indexed by
+            [genveg, global region - 1]. Rows for generic land covers
+            without a fuel load are NaN, and -1 marks missing fuel loads.
+        lct_tree, lct_herb (ndarray) - coarse and herbaceous fuel loads in
+            g/m2 for North America, indexed by LCT code
+        species (list) - names of the emitted species
+        output_columns (list) - columns of the per-fire output
+        ef (ndarray) - emission factors (g/kg), indexed by
+            [emission factor row, species], in the model's precision
+    """
+
+    def __init__(
+        self, fuelin=None, emisin=None, precision="float64", species=None
+    ):
+        # ASSIGN FUEL LOADS, EMISSION FACTORS FOR GENERIC LAND COVERS AND
+        # REGIONS
+        #  02/04/2019 - removed texas code for this section and pasted in
+        #  old code from v1.5 -- going back to global fuel loadings
+        #  02/08/2019: ALL FUEL INPUTS ARE IN g/m2
+        if precision not in PRECISIONS:
+            raise ValueError(
+                "precision must be one of {}, got {!r}".format(
+                    PRECISIONS, precision
+                )
+            )
+        fuelin, emisin, lctfuelin = _table_files(fuelin, emisin)
+        self.fuelin = fuelin
+        self.emisin = emisin
+        self.precision = precision
+
+        fuel = _read_table(fuelin, FUEL_COLUMNS.values(), "fuel loading")
+        # one row for each genveg code 0-9
+        self.fuel_load = np.full((10, len(fuel)), np.nan)
+        for genveg, column in FUEL_COLUMNS.items():
+            self.fuel_load[genveg] = fuel[column].values
+        self.fuel_load[9] = CROP_FUEL_LOAD
+
+        # 02/08/2019
+        # READ in LCT Fuel loading file from prior Texas FINN study
+        # This is a secondary fuel loading file for use in US ONLY
+        lctfuel = _read_table(
+            lctfuelin, ["final TREE", "final HERB"], "land cover fuel loading"
+        )
+        self.lct_tree = lctfuel["final TREE"].values.astype(float)
+        self.lct_herb = lctfuel["final HERB"].values.astype(float)
+        if len(lctfuel) < len(EF_INDEX):
+            raise ValueError(
+                "land cover fuel loading file {} needs a row for each LCT "
+                "code 0-{}".format(lctfuelin, len(EF_INDEX) - 1)
+            )
+
+        if species is None:
+            species = DEFAULT_SPECIES
+        if species == "all":
+            emis = pd.read_csv(emisin)
+            columns = [
+                column
+                for column in emis.select_dtypes(include="number").columns
+                if column not in EF_LABEL_COLUMNS
+            ]
+        else:
+            columns = [EF_COLUMNS.get(name, name) for name in species]
+            emis = _read_table(emisin, columns, "emission factor")
+        if len(emis) <= EF_INDEX_TEMPERATE_EVERGREEN:
+            raise ValueError(
+                "emission factor file {} has {} rows, expected at least "
+                "{}".format(
+                    emisin, len(emis), EF_INDEX_TEMPERATE_EVERGREEN + 1
+                )
+            )
+        self.species = [_species_name(column) for column in columns]
+        if len(set(self.species)) < len(self.species):
+            raise ValueError(
+                "species are repeated: {}".format(", ".join(self.species))
+            )
+        self.ef = emis[columns].values.astype(precision)
+        self.output_columns = OUTPUT_COLUMNS[:14] + self.species
+
+        logger.info("Finished reading in fuel and emission factor files")
+
+    def run(self, fires, method="vectorized", timer=None):
+        """Estimate emissions for a set of fires.
+
+        Args:
+            fires (str or DataFrame) - path to a file created with the FINN
+                preprocessor, in any format read by read_table(), or a
+                DataFrame with the same columns
+            method (str) - 'vectorized' (default) processes all fires at
+                once with array operations. 'loop' is the original
+                reference implementation, which visits one fire at a time.
+            timer (StageTimer) - optional timer to record the stages of
+                the run in, e.g. to add to the timings of other stages
+
+        Returns:
+            A tuple of (DataFrame of per-fire emissions sorted by day,
+            dictionary summarizing emission totals and stage timings).
+        """
+        if timer is None:
+            timer = StageTimer()
+        out_df, numorig, counts, totals = self._process(fires, method, timer)
+        with timer.stage("sort", rows=len(out_df)):
+            out_df = out_df.sort_values(by=["jd"], kind="mergesort")
+        summary = self._summary(numorig, counts, totals)
+        summary.update(timer.summary())
+        return out_df, summary
+
+    def stream(
+        self,
+        infile,
+        outfile,
+        chunksize,
+        method="vectorized",
+        columns=None,
+        float_dtype=None,
+        timer=None,
+        processes=1,
+    ):
+        """Estimate emissions for a large file in fixed-size chunks.
+
+        Only a few chunks of fires are held in memory at a time. Emissions
+        for each chunk are split by day into temporary files, which are
+        joined in day order at the end, so outfile matches the output of
+        run() written with write_table().
+
+        Chunks can be processed in parallel on a pool of worker processes.
+        Their results are merged in input order, so the output file and
+        summary are the same for any number of processes.
+
+        Args:
+            infile (str) - path to a file created with the FINN
+                preprocessor, in any format read by read_table()
+            outfile (str) - path to the output file
+            chunksize (int) - number of input rows to process at a time
+            method (str) - 'vectorized' (default) or 'loop', see run()
+            columns (list) - optional names of the columns to write
+            float_dtype (str) - optional dtype for floating point columns
+            timer (StageTimer) - optional timer to record the stages of
+                the run in. Stages are added up over the chunks.
+            processes (int) - number of worker processes. If None, one per
+                CPU. With 1 (default), chunks are processed one after
+                another in this process.
+
+        Returns:
+            A dictionary summarizing emission totals and stage timings.
+            Totals are summed chunk by chunk, so can differ from those of
+            run() in the last few digits, but do not depend on processes.
+        """
+        if timer is None:
+            timer = StageTimer()
+        numorig = 0
+        counts = {}
+        totals = {}
+        nrows = []
+        days = collections.defaultdict(list)
+        bucket_dir = tempfile.mkdtemp(
+            prefix=".finnemit-", dir=os.path.dirname(os.path.abspath(outfile))
+        )
+        pool = None
+        try:
+            if processes != 1:
+                pool = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=processes,
+                    initializer=_init_partition_worker,
+                    initargs=(self,),
+                )
+            chunks = iter_tables(
+                infile,
+                chunksize,
+                columns=INPUT_COLUMNS,
+                dtype=input_dtypes(self.precision),
+            )
+            # chunks waiting for a worker, in input order
+            pending = collections.deque()
+            if pool is None:
+                max_pending = 1
+            else:
+                max_pending = 2 * (processes or os.cpu_count() or 1)
+            while True:
+                start = time.perf_counter()
+                chunk = next(chunks, None)
+                timer.add("ingest", time.perf_counter() - start)
+                if chunk is not None:
+                    job = (chunk, len(nrows) + len(pending), method,
+                           bucket_dir)
+                    if pool is None:
+                        pending.append(_run_partition(job, self, timer))
+                    else:
+                        pending.append(pool.submit(_run_partition, job))
+                if not pending:
+                    break
+                if chunk is not None and len(pending) < max_pending:
+                    continue
+
+                result = pending.popleft()
+                if pool is not None:
+                    result = result.result()
+                parts, nout, nchunk, chunk_counts, chunk_totals, stages = (
+                    result
+                )
+                if pool is not None:
+                    for name, seconds in stages.seconds.items():
+                        timer.add(name, seconds, stages.rows.get(name))
+                for jd, path in parts:
+                    days[jd].append((len(nrows), path))
+                nrows.append(nout)
+                numorig += nchunk
+                counts = _add_counts(counts, chunk_counts)
+                totals = _add_counts(totals, chunk_totals)
+
+            # keep the row labels that a single in-memory run would use
+            offsets = np.cumsum([0] + nrows)
+            with timer.stage("write", rows=offsets[-1]), TableWriter(
+                outfile,
+                columns=self.output_columns if columns is None else columns,
+                float_dtype=float_dtype,
+            ) as writer:
+                # days are written in batches of about chunksize rows, as
+                # each write has a fixed cost
+                batch = []
+                nbatch = 0
+                for jd in sorted(days):
+                    for partition, path in days[jd]:
+                        day_df = pd.read_pickle(path)
+                        day_df.index += offsets[partition]
+                        batch.append(day_df)
+                        nbatch += len(day_df)
+                    if nbatch >= chunksize:
+                        writer.write(pd.concat(batch))
+                        batch = []
+                        nbatch = 0
+                if batch:
+                    writer.write(pd.concat(batch))
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+            shutil.rmtree(bucket_dir)
+
+        summary = self._summary(numorig, counts, totals)
+        summary.update(timer.summary())
+        return summary
+
+    def _process(self, fires, method, timer=None):
+        """Read and process fires, returning unsorted output and totals."""
+        if method not in METHODS:
+            raise ValueError(
+                "method must be one of {}, got {!r}".format(METHODS, method)
+            )
+        if timer is None:
+            timer = StageTimer()
+
+        with timer.stage("ingest") as stage:
+            fires = _read_fires(fires, self.precision)
+            # Total Number of fires input in original input file
+            numorig = len(fires["jd"])
+            stage.rows = numorig
+        logger.info("the number of fires = %d", numorig)
+
+        if method == "loop" and self.species != DEFAULT_SPECIES:
+            raise ValueError(
+                "the loop method only emits the default species, use the "
+                "vectorized method for {}".format(", ".join(self.species))
+            )
+
+        if method == "loop":
+            # the reference loop checks, classifies and emits each fire in
+            # turn, so its stages are timed together
+            with timer.stage("emissions", rows=numorig):
+                out_df, counts, totals = _emissions_loop(fires, self)
+                out_df = _cast_floats(out_df, self.precision)
+        else:
+            classified, counts = self.classify(fires, timer)
+            with timer.stage("emissions", rows=len(classified)):
+                out_df, totals = self.emit(classified)
+        return out_df, numorig, counts, totals
+
+    def _summary(self, numorig, counts, totals):
+        """Collect the summary dictionary for a run."""
+        summary = {
+            "scenario": "scen1",
+            "emissions_file": self.emisin,
+            "fuel_load_file": self.fuelin,
+            "num_fires_total": numorig,
+            "num_fires_processed": numorig,
+        }
+        summary.update(_summarize(counts, totals, self.species))
+        return summary
+
+    def classify(self, fires, timer=None, components=False):
+        """Quality check fires, and assign land cover and burned biomass.
+
+        This applies each step of the reference loop in _emissions_loop()
+        to all fires at once, with boolean masks and array lookups. Fires
+        that are removed by the quality checks are dropped.
+
+        Args:
+            fires (dict) - per-fire arrays, as returned by _read_fires()
+            timer (StageTimer) - optional timer to record the 'qa' and
+                'classify' stages in
+            components (bool) - if True, also return the parts of the
+                burned biomass: 'herb_fuel' and 'coarse_fuel' loads in kg/m2
+                and the herbaceous combustion factor 'cf3', so that
+                bmass = herb_fuel * cf3 + coarse_fuel * CF1
+
+        Returns:
+            A tuple of (DataFrame with the land cover, area and biomass
+            output columns and an 'ef_index' column giving each fire's
+            emission factor row, dictionary of quality assurance counters).
+        """
+        if timer is None:
+            timer = StageTimer()
+        start = time.perf_counter()
+        cover, keep, counts = _check_cover(fires)
+        timer.add("qa", time.perf_counter() - start, len(keep))
+        start = time.perf_counter()
+        cover = _land_cover(cover, keep, counts)
+        classified = self._assign_fuel(cover, counts, components)
+        timer.add("classify", time.perf_counter() - start, len(classified))
+        return classified, counts
+
+    def _assign_fuel(self, cover, counts, components=False):
+        """Assign fuel loads and burned biomass to fires with a land cover.
+
+        Fires without a fuel load are dropped, and counted in
+        counts['bmass0'].
+
+        Args:
+            cover (dict) - per-fire arrays, as returned by _land_cover()
+            counts (dict) - quality assurance counters, which are updated
+            components (bool) - see classify()
+
+        Returns:
+            A DataFrame of classified fires, see classify().
+        """
+        # ####################################################
+        # Assign Fuel Loads based on Generic land cover
+        #   and global region location
+        #   units are in g dry mass/m2
+        # ####################################################
+        bmass1 = _fuel_loads(self.fuel_load, cover)
+        nofuel = bmass1 == -1
+        bmass0 = np.count_nonzero(nofuel)
+        if bmass0:
+            logger.warning("Removed %d fires. bmass assigned -1!", bmass0)
+        counts["bmass0"] = bmass0
+        cover = _select(cover, ~nofuel)
+        bmass, herb_fuel, coarse_fuel, CF3 = _biomass(
+            self.fuel_load, bmass1[~nofuel], self.lct_tree, self.lct_herb,
+            cover,
+        )
+
+        # Convert units to consistent units
+        areanow = cover["area"] * 1.0e6  # convert km2 --> m2
+        bmass = bmass / 1000.0  # convert g dm/m2 to kg dm/m2
+        # remove bare area from being burned (04/21/2015)
+        areanow = areanow - (areanow * (cover["bare"] / 100.0))
+
+        classified = pd.DataFrame(
+            {
+                "longi": cover["lon"],
+                "lat": cover["lat"],
+                "polyid": cover["polyid"],
+                "fireid": cover["fireid"],
+                "date": cover["date"],
+                "jd": cover["jd"],
+                "lct": cover["lct"],
+                "globreg": cover["globreg"],
+                "genLC": cover["genveg"],
+                "pcttree": cover["tree"],
+                "pctherb": cover["herb"],
+                "pctbare": cover["bare"],
+                "area": areanow,
+                "bmass": bmass,
+                "ef_index": _ef_index(cover["lct"], cover["genveg"]),
+            },
+            columns=OUTPUT_COLUMNS[:14] + ["ef_index"],
+        )
+        if components:
+            classified["herb_fuel"] = herb_fuel / 1000.0
+            classified["coarse_fuel"] = coarse_fuel / 1000.0
+            classified["cf3"] = CF3
+        return _cast_floats(classified, self.precision)
+
+    def emit(self, classified):
+        """Calculate emissions for classified fires.
+
+        Emissions = area * BE * BMASS * EF, with the emission factors of
+        every species gathered from each fire's emission factor row.
+
+        Args:
+            classified (DataFrame) - classified fires, as returned by
+                classify()
+
+        Returns:
+            A tuple of (unsorted DataFrame of per-fire emissions in kg,
+            dictionary of biomass, area and species totals).
+        """
+        areanow = classified["area"].values
+        bmass = classified["bmass"].values
+        genveg = classified["genLC"].values
+
+        # CALCULATE EMISSIONS kg
+        emissions = (
+            self.ef[classified["ef_index"].values]
+            * areanow[:, None]
+            * bmass[:, None]
+            / 1000.0
+        )
+
+        out_df = classified[OUTPUT_COLUMNS[:14]].copy()
+        for i, name in enumerate(self.species):
+            out_df[name] = emissions[:, i]
+
+        totals = _emission_totals(
+            areanow, bmass, genveg, emissions, self.species
+        )
+        return out_df, totals
+
+
+def _emission_totals(areanow, bmass, genveg, emissions, species):
+    """Calculate the totals for the log file, in float64 whatever the
+    precision.
+
+    Args:
+        areanow (ndarray) - burned area of each fire (m2)
+        bmass (ndarray) - biomass of each fire (kg/m2)
+        genveg (ndarray) - generic land cover of each fire
+        emissions (ndarray) - emissions (kg) of each fire (rows) and species
+            (columns)
+        species (list) - names of the emitted species
+
+    Returns:
+        A dictionary of biomass, area and species totals.
+    """
+    bmassburn = bmass * areanow  # kg burned
+    totals = {
+        "bmass": bmassburn.sum(dtype="float64"),
+        "area": areanow.sum(dtype="float64"),
+    }
+    for name, mask in [
+        ("TOTTROP", genveg == 3),
+        ("TOTTEMP", genveg == 4),
+        ("TOTBOR", genveg == 5),
+        ("TOTSHRUB", genveg == 2),
+        ("TOTCROP", genveg >= 9),
+        ("TOTGRAS", genveg == 1),
+    ]:
+        totals[name] = bmassburn[mask].sum(dtype="float64")
+        totals[name + "area"] = areanow[mask].sum(dtype="float64")
+    crop = genveg >= 9
+    for name in ["CO", "PM25"]:
+        if name in species:
+            totals["TOTCROP" + name] = emissions[
+                crop, species.index(name)
+            ].sum(dtype="float64")
+    totals.update(zip(species, emissions.sum(axis=0, dtype="float64")))
+    return totals
+
+
+# Model of a partition worker process, set by _init_partition_worker()
+_partition_worker = {}
+
+
+def _init_partition_worker(model):
+    """Set the model used by _run_partition() in a worker process."""
+    # the parent calls the hooks when it adds up the chunk timings
+    _clear_metrics_hooks()
+    _partition_worker["model"] = model
+
+
+def _run_partition(job, model=None, timer=None):
+    """Estimate emissions for one chunk of a streamed input.
+
+    The emissions are split by day into files in a bucket directory, named
+    by day and chunk number.
+
+    Args:
+        job (tuple) - the chunk of input rows, its number, the method and
+            the bucket directory
+        model (EmissionModel) - the model, or None in a worker process
+        timer (StageTimer) - optional timer to add the chunk's stages to
+
+    Returns:
+        A tuple of ((day, path) pairs of the day files, number of output
+        rows, number of input fires, counters, totals, StageTimer).
+    """
+    chunk, partition, method, bucket_dir = job
+    if model is None:
+        model = _partition_worker["model"]
+    if timer is None:
+        timer = StageTimer()
+    out_df, nchunk, counts, totals = model._process(chunk, method, timer)
+    parts = []
+    with timer.stage("sort", rows=len(out_df)):
+        for jd, day_df in out_df.groupby("jd", sort=False):
+            path = os.path.join(
+                bucket_dir, "{:03d}-{:06d}.pkl".format(int(jd), partition)
+            )
+            day_df.to_pickle(path)
+            parts.append((int(jd), path))
+    return parts, len(out_df), nchunk, counts, totals, timer
+
 
-    # ASSIGN FUEL LOADS, EMISSION FACTORS FOR GENERIC LAND COVERS AND REGIONS
-    # FUEL LOADING FILES
-    #  02/04/2019 - removed texas code for this section and pasted in old code
-    #  from v1.5 -- going back to global fuel loadings
-    #  READ IN FUEL LOADING FILE
-    #  02/08/2019: ALL FUEL INPUTS ARE IN g/m2
+def _table_files(fuelin=None, emisin=None):
+    """Paths to the fuel loading, emission factor and land cover fuel
+    loading files, defaulting to the packaged ones."""
     if fuelin is None:
-        fuelin = pkg_resources.resource_filename("finnemit",
-                                                 "data/fuel-loads.csv")
-    fuel = pd.read_csv(fuelin)
-
-    #   Set up fuel arrays
-    tffuel = fuel["Tropical Forest"].values  # tropical forest fuels
-    tefuel = fuel["Temperate Forest"].values  # temperate forest fuels
-    bffuel = fuel["Boreal Forest"].values  # boreal forest fuels
-    wsfuel = fuel["Woody Savanna"].values  # woody savanna fuels
-    grfuel = fuel["Savanna and Grasslands"].values  # grassland and savanna
-    # NOTE: Fuels read in have units of g/m2 DM
-
-    # 02/08/2019
-    # READ in LCT Fuel loading file from prior Texas FINN study
-    # This is a secondary fuel loading file for use in US ONLY
+        fuelin = pkg_resources.resource_filename(
+            "finnemit", "data/fuel-loads.csv"
+        )
+    if emisin is None:
+        emisin = pkg_resources.resource_filename(
+            "finnemit", "data/emission-factors.csv"
+        )
     lctfuelin = pkg_resources.resource_filename(
         "finnemit", "data/land-cover-gm2.csv"
     )
-    lctfuel = pd.read_csv(lctfuelin)
-    lcttree = lctfuel["final TREE"].values
-    lctherb = lctfuel["final HERB"].values
+    return fuelin, emisin, lctfuelin
 
-    # EMISSION FACTOR FILE
-    if emisin is None:
-        emisin = pkg_resources.resource_filename(
-            "finnemit", "data/emission-factors.csv"
+
+def _cast_floats(df, precision):
+    """Cast the floating point columns of df to a precision."""
+    if precision == "float64":
+        return df
+    floats = df.select_dtypes(include="floating").columns
+    return df.astype({column: precision for column in floats})
+
+
+def _check_cover(fires, flags=None):
+    """Apply the quality checks and corrections of land cover to fires.
+
+    Args:
+        fires (dict) - per-fire arrays, as returned by _read_fires()
+        flags (dict) - optional dictionary to store, for each quality
+            assurance counter, the boolean array of the fires it counts
+
+    Returns:
+        A tuple of (dictionary of per-fire arrays, with corrected 'tree',
+        'herb' and 'bare' cover, boolean array of the fires that pass the
+        checks, dictionary of quality assurance counters).
+    """
+    cover = {
+        "lat": fires["lat"],
+        "lon": fires["lon"],
+        "tree": fires["tree"].copy(),
+        "herb": fires["herb"].copy(),
+        "bare": fires["bare"].copy(),
+        "lct": fires["lct"].copy(),
+        "globreg": fires["globreg"],
+        "area": fires["area"],
+        "polyid": fires["polyid"],
+        "fireid": fires["fireid"],
+        "date": fires["date"],
+        "jd": fires["jd"],
+    }
+    tree, herb, bare, lct = (
+        cover["tree"], cover["herb"], cover["bare"], cover["lct"]
+    )
+    totcov = tree + herb + bare
+
+    # ##################################################
+    #   QA PROCEDURES FIRST
+    # ##################################################
+    # 1) Correct for VCF product issues
+    #   1a) First, correct for GIS processing errors:
+    #    Scale VCF product to sum to 100.
+    scaled = (totcov > 101.0) & (totcov < 240.0)
+    _rescale_cover(scaled, tree, herb, bare, totcov)
+
+    scale = (totcov < 99.0) & (totcov >= 50.0)
+    _rescale_cover(scale, tree, herb, bare, totcov)
+    scaled |= scale
+    vcfcount = np.count_nonzero(scaled)
+
+    # Second, If no data are assigned to the grid,: scale up, still
+    scale = (totcov < 50.0) & (totcov >= 1.0)
+    vcflt50 = np.count_nonzero(scale)
+    _rescale_cover(scale, tree, herb, bare, totcov)
+
+    #   1b) Fires with 100% bare cover or VCF not identified or total
+    #    cover is 0,-9999: reassign cover values based on LCT assignment
+    nocover = (totcov >= 240.0) | (totcov < 1.0) | (bare == 100)
+    allbare = np.count_nonzero(nocover)
+    # Skip fires that are all bare and have no LCT vegetation
+    keep = ~(nocover & (lct >= 15))
+
+    forest = nocover & (lct <= 5)
+    woody = nocover & (
+        ((lct >= 6) & (lct <= 8)) | (lct == 11) | (lct == 14)
+    )
+    grass = nocover & np.isin(lct, [9, 10, 12, 13, 16])
+    for mask, (pcttree, pctherb) in [
+        (forest, (60.0, 40.0)),
+        (woody, (50.0, 50.0)),
+        (grass, (20.0, 80.0)),
+    ]:
+        tree[mask] = pcttree
+        herb[mask] = pctherb
+        bare[mask] = 0.0
+
+    # 2) Remove fires with no LCT assignment or in water bodies or
+    # snow/ice assigned by LCT
+    badlct = keep & ((lct >= 17) | (lct <= 0) | (lct == 15))
+    lct0 = np.count_nonzero(badlct)
+    keep &= ~badlct
+
+    if flags is not None:
+        flags.update(
+            lct0=badlct, allbare=nocover, vcfcount=scaled, vcflt50=scale
         )
-    emis = pd.read_csv(emisin)
-
-    #   Set up Emission Factor Arrays
-    COEF = emis["CO"].values  # CO emission factor
-    NMOCEF = emis["NMOC"].values  # NMOC emission factor (added 10/20/2009)
-    NOXEF = emis["NOXasNO"].values  # NOx emission factor
-    NOEF = emis["NO"].values  # NO emission factors (added 10/20/2009)
-    NO2EF = emis["NO2"].values  # NO2 emission factors (added 10/20/2009)
-    SO2EF = emis["SO2"].values  # SO2 emission factor
-    PM25EF = emis["PM25"].values  # PM2.5 emission factor
-    OCEF = emis["OC"].values  # OC emission factor
-    BCEF = emis["BC"].values  # BC emission factor
-    NH3EF = emis["NH3"].values  # NH3 emission factor
-    PM10EF = emis["PM10"].values  # PM10 emission factor (added 08/18/2010)
-
-    print("Finished reading in fuel and emission factor files")
+    counts = {
+        "lct0": lct0,
+        "spixct": 0,
+        "antarc": 0,
+        "allbare": allbare,
+        "genveg0": 0,
+        "bmass0": 0,
+        "vcfcount": vcfcount,
+        "vcflt50": vcflt50,
+        "confnum": 0,
+        "overlapct": 0,
+        "urbnum": 0,
+    }
+    return cover, keep, counts
 
-    # READIN IN FIRE AND LAND COVER INPUT FILE (CREATED WITH PREPROCESSOR)
-    if outfile is None:
-        outfile = re.sub("\\.csv$", "_out.csv", infile)
-    map = pd.read_csv(infile)
-    map = map[map["v_regnum"].notnull()]
 
-    nfires = map.shape[0]
+def _land_cover(cover, keep, counts, flags=None):
+    """Assign generic land cover and global region indices to fires.
+
+    Urban fires are reassigned an LCT code, and counted in
+    counts['urbnum']. Fires without a valid global region are dropped.
+
+    Args:
+        cover (dict) - per-fire arrays, as returned by _check_cover()
+        keep (ndarray) - boolean array of the fires to keep
+        counts (dict) - quality assurance counters, which are updated
+        flags (dict) - optional dictionary of per-fire counter flags, see
+            _check_cover(), which is updated
+
+    Returns:
+        A dictionary of the per-fire arrays of the fires kept, with their
+        generic land cover 'genveg' and global region index 'reg'.
+    """
+    lat, tree, lct = cover["lat"], cover["tree"], cover["lct"]
+
+    # Urban fires: reset the lct value (for emission factors) based on
+    # VCF cover in the pixel, and on latitude for forests
+    urban = keep & (lct == 13)
+    counts["urbnum"] = np.count_nonzero(urban)
+    if flags is not None:
+        flags["urbnum"] = urban
+    lct[urban & (tree < 40)] = 10  # set to grassland
+    lct[urban & (tree >= 40) & (tree < 60)] = 8  # set to woody savanna
+    urbforest = urban & (tree >= 60)
+    lct[urbforest & (lat > 50)] = 1  # set to evergreen needleleaf forest
+    lct[urbforest & ~(lat > 50)] = 5  # set to mixed forest
+
+    # Assign generic land cover (genveg) from lct and latitude. See
+    # _emissions_loop() for the genveg codes.
+    tropics = (lat >= -23.5) & (lat <= 23.5)
+    boreal = lat > 50.0
+    genveg = np.select(
+        [
+            np.isin(lct, [9, 10, 11, 14, 16]),
+            (lct >= 6) & (lct <= 8),
+            lct == 12,
+            (lct == 2) | (lct == 5),
+            lct == 4,
+            lct == 1,
+            lct == 3,
+        ],
+        [
+            1,
+            2,
+            9,
+            np.where(tropics, 3, 4),
+            4,
+            np.where(boreal, 5, 6),
+            np.where(boreal, 5, 4),
+        ],
+        default=-9999,
+    )
+
+    reg = cover["globreg"] - 1  # locate global region, get index
+    badreg = keep & ((reg <= -1) | (reg > 100))
+    if badreg.any():
+        logger.warning(
+            "Removed %d fires. Something is WRONG with global regions "
+            "and fuel loads",
+            np.count_nonzero(badreg),
+        )
+    keep = keep & ~badreg
+    cover = _select(cover, keep)
+    cover["genveg"] = genveg[keep]
+    cover["reg"] = reg[keep].astype(int)
+    return cover
+
+
+def _select(cover, mask):
+    """Select fires from a dictionary of per-fire arrays."""
+    return dict((name, values[mask]) for name, values in cover.items())
+
+
+def _fuel_loads(fuel_load, cover):
+    """Look up the fuel load (g/m2) of each fire.
+
+    Args:
+        fuel_load (ndarray) - fuel loads, as EmissionModel.fuel_load, or
+            several stacked along a first axis
+        cover (dict) - per-fire arrays, as returned by _land_cover()
+
+    Returns:
+        An array of fuel loads, with the leading axes of fuel_load and a
+        last axis of fires. -1 marks missing fuel loads.
+    """
+    genveg, reg, lat, lon = (
+        cover["genveg"], cover["reg"], cover["lat"], cover["lon"]
+    )
+    bmass1 = fuel_load[..., genveg, reg]
+    # Assign boreal forests in Southern Asia the biomass density of the
+    # temperate forest for the region (DEC. 09, 2009)
+    southasia = (genveg == 5) & (cover["globreg"] == 11)
+    bmass1[..., southasia] = fuel_load[..., 4, reg[southasia]]
+    sugarcane = (
+        (genveg == 9)
+        & (lon <= -47.323)
+        & (lon >= -49.156)
+        & (lat <= -20.356)
+        & (lat >= -22.708)
+    )
+    bmass1[..., sugarcane] = SUGARCANE_FUEL_LOAD
+    return bmass1
+
+
+def _biomass(fuel_load, bmass1, lct_tree, lct_herb, cover):
+    """Calculate the biomass burned (g dry matter/m2) of fires.
+
+    Args:
+        fuel_load (ndarray) - fuel loads, see _fuel_loads()
+        bmass1 (ndarray) - fuel load of each fire, from _fuel_loads()
+        lct_tree, lct_herb (ndarray) - North American fuel loads, see
+            EmissionModel
+        cover (dict) - per-fire arrays, as returned by _land_cover()
+
+    Returns:
+        A tuple of (biomass burned, herbaceous fuel, coarse fuel,
+        herbaceous combustion factor CF3), such that biomass burned =
+        herbaceous fuel * CF3 + coarse fuel * CF1. Fuels are in g/m2.
+    """
+    tree, herb, lct = cover["tree"], cover["herb"], cover["lct"]
+
+    # Assign Burning Efficiencies (Combustion Factors) from tree cover
+    grassland = tree <= 40
+    woodland = (tree > 40) & (tree <= 60)
+    CF3 = np.select(
+        [tree > 60, woodland, grassland],
+        [0.90, np.exp(-0.013 * tree), 0.98],
+        default=np.nan,
+    )
+
+    # Calculate the Mass burned (g dry matter/m2), using the FCCS fuel
+    # loadings for North America (Global Region 1)
+    pctherb = herb / 100.0
+    pcttree = tree / 100.0
+    northam = cover["globreg"] == 1
+    coarsebm = np.where(northam, lct_tree[lct], bmass1)
+    herbbm = np.where(northam, lct_herb[lct], fuel_load[..., 1, cover["reg"]])
+    bmass = np.where(
+        grassland,
+        (pctherb * herbbm * CF3) + (pcttree * herbbm * CF3),
+        (pctherb * herbbm * CF3)
+        + (pcttree * (herbbm * CF3 + coarsebm * CF1)),
+    )
+    herb_fuel = (pctherb + pcttree) * herbbm
+    coarse_fuel = np.where(grassland, 0.0, pcttree * coarsebm)
+    return bmass, herb_fuel, coarse_fuel, CF3
+
 
-    polyid = map["polyid"].values
-    fireid = map["fireid"].values
+def _ef_index(lct, genveg):
+    """Assign Emission Factors based on LCT code."""
+    index = EF_INDEX[lct]
+    index[genveg == 6] = EF_INDEX_TEMPERATE_EVERGREEN
+    return index
 
-    lat = map["cen_lat"].values
-    lon = map["cen_lon"].values
-    date = map["acq_date_lst"].values
-    area = map["area_sqkm"].values
-    # CW: Added March 05, 2015  -- NEED set the field
 
-    tree = map["v_tree"].values
-    herb = map["v_herb"].values
-    bare = map["v_bare"].values
+def _species_name(column):
+    """Name of the species an emission factor column produces."""
+    for name, ef_column in EF_COLUMNS.items():
+        if ef_column == column:
+            return name
+    return column
 
-    lct = map["v_lct"].values.astype(int)
-    flct = map["f_lct"].values
 
-    globreg = map["v_regnum"].values
+def _add_counts(a, b):
+    """Add two dictionaries of counters or totals, key by key."""
+    return {key: a.get(key, 0) + value for key, value in b.items()}
 
-    # Total Number of fires input in original input file
-    numorig = nfires
+
+def _read_table(path, columns, description):
+    """Read a csv table, checking that it has the required columns."""
+    table = pd.read_csv(path)
+    missing = [c for c in columns if c not in table.columns]
+    if missing:
+        raise ValueError(
+            "{} file {} is missing columns: {}".format(
+                description, path, ", ".join(missing)
+            )
+        )
+    return table
+
+
+def read_fires(fires, engine=None, precision="float64"):
+    """Read the input columns of a preprocessor file with their dtypes.
+
+    Only INPUT_COLUMNS are read, and each is parsed straight into its type
+    from input_dtypes(), which takes far less memory than inferred dtypes.
+
+    Args:
+        fires (str or DataFrame) - path to a file created with the FINN
+            preprocessor, in any format read by read_table(), or a
+            DataFrame with the same columns
+        engine (str) - optional csv parser passed to pandas.read_csv(),
+            e.g. 'pyarrow'
+        precision (str) - 'float64' (default) or 'float32', the precision
+            to read VCF cover percentages in
+
+    Returns:
+        A DataFrame with the columns INPUT_COLUMNS.
+    """
+    dtypes = input_dtypes(precision)
+    if isinstance(fires, pd.DataFrame):
+        return fires[INPUT_COLUMNS].astype(dtypes)
+    return read_table(
+        fires, columns=INPUT_COLUMNS, dtype=dtypes, engine=engine
+    )
+
+
+def input_dtypes(precision="float64"):
+    """Get the dtypes of the input columns for a model precision.
+
+    VCF cover percentages are only read in single precision for float32
+    models, since the burned area of fires with nearly all bare cover is
+    sensitive to their rounding.
+    """
+    dtypes = dict(INPUT_DTYPES)
+    for column in ["v_tree", "v_herb", "v_bare"]:
+        dtypes[column] = precision
+    return dtypes
+
+
+def _read_fires(fires, precision="float64"):
+    """Read preprocessor records into a dictionary of per-fire arrays.
+
+    Fires without a global region are dropped. Every array is a copy, so
+    the emission engines are free to modify them in place.
+
+    Args:
+        fires (str or DataFrame) - path to a file created with the FINN
+            preprocessor, or a DataFrame with the same columns
+        precision (str) - precision to read VCF cover in, see read_fires()
+    """
+    map = read_fires(fires, precision=precision)
+    map = map[map["v_regnum"].notnull()]
+
+    fires = {
+        "polyid": map["polyid"].to_numpy(copy=True),
+        "fireid": map["fireid"].to_numpy(copy=True),
+        "lat": map["cen_lat"].to_numpy(dtype=float, copy=True),
+        "lon": map["cen_lon"].to_numpy(dtype=float, copy=True),
+        "date": map["acq_date_lst"].to_numpy(copy=True),
+        "area": map["area_sqkm"].to_numpy(dtype=float, copy=True),
+        # CW: Added March 05, 2015  -- NEED set the field
+        "tree": map["v_tree"].to_numpy(dtype=float, copy=True),
+        "herb": map["v_herb"].to_numpy(dtype=float, copy=True),
+        "bare": map["v_bare"].to_numpy(dtype=float, copy=True),
+        "lct": map["v_lct"].to_numpy(dtype=int, copy=True),
+        "globreg": map["v_regnum"].to_numpy(dtype=float, copy=True),
+    }
 
     # Added 08/25/08: removed values of -9999 from VCF inputs
-    tree[tree < 0] = 0
-    herb[herb < 0] = 0
-    bare[bare < 0] = 0
+    for cover in ["tree", "herb", "bare"]:
+        fires[cover][fires[cover] < 0] = 0
 
     # Calculate the total cover from the VCF product
     # (CHECK TO MAKE SURE PERCENTAGES ADD TO 100%)
-    totcov = tree + herb + bare
+    totcov = fires["tree"] + fires["herb"] + fires["bare"]
     # number of records where total coverate is less than 100%
-    nummissvcf = sum(totcov < 98)
+    nummissvcf = np.sum(totcov < 98)
     assert nummissvcf == 0
 
-    # parse dates
-    dates = [datetime.datetime.strptime(d, "%Y-%m-%d") for d in date]
+    # julian date and month
+    fires["jd"], fires["mo"] = _day_of_year(fires["date"])
+    return fires
+
+
+def _day_of_year(dates):
+    """Get the day of year and month of 'YYYY-MM-DD' dates.
 
-    jd = np.array([d.timetuple().tm_yday for d in dates])  # julian date
-    mo = np.array([d.month for d in dates])
+    Args:
+        dates (array) - date strings, or date objects
+
+    Returns:
+        A tuple of integer arrays (day of year, month).
+    """
+    days = np.asarray(dates, dtype="datetime64[D]")
+    jd = (days - days.astype("datetime64[Y]")).astype(int) + 1
+    mo = days.astype("datetime64[M]").astype(int) % 12 + 1
+    return jd, mo
+
+
+def _summarize(counts, totals, species=DEFAULT_SPECIES):
+    """Convert fire counters and running totals into summary entries.
+
+    Args:
+        counts (dict) - quality assurance counters from an emission engine
+        totals (dict) - accumulated biomass (kg), area (m2) and species
+            (kg) totals from an emission engine
+        species (list) - names of the emitted species, each of which has a
+            total in Tg
+
+    Returns:
+        A dictionary of summary entries, in the units reported to users.
+    """
+    summary = {
+        "num_urban_fires": counts["urbnum"],
+        "num_removed_for_overlap": counts["overlapct"],
+        "num_lct<=0|lct>17": counts["lct0"],
+        "num_antarctic": counts["antarc"],
+        "num_bare_cover": counts["allbare"],
+        "num_skipped_genveg_problem": counts["genveg0"],
+        "num_skipped_bmass_assignment": counts["bmass0"],
+        "num_scaled_to_100": counts["vcfcount"],
+        "num_vcf<50": counts["vcflt50"],
+        "num_fires_skipped": counts["spixct"]
+        + counts["lct0"]
+        + counts["antarc"]
+        + counts["allbare"]
+        + counts["genveg0"]
+        + counts["bmass0"]
+        + counts["confnum"],
+        "GLOBAL TOTAL (Tg) biomass burned (Tg)": totals["bmass"] / 1.0e9,
+        "Total Temperate Forests (Tg)": totals["TOTTEMP"] / 1.0e9,
+        "Total Tropical Forests (Tg)": totals["TOTTROP"] / 1.0e9,
+        "Total Boreal Forests (Tg)": totals["TOTBOR"] / 1.0e9,
+        "Total Shrublands/Woody Savannah(Tg)": totals["TOTSHRUB"] / 1.0e9,
+        "Total Grasslands/Savannas (Tg)": totals["TOTGRAS"] / 1.0e9,
+        "Total Croplands (Tg)": totals["TOTCROP"] / 1.0e9,
+        "TOTAL AREA BURNED (km2)": totals["area"] / 1000000.0,
+        "Total Temperate Forests (km2)": totals["TOTTEMParea"] / 1000000.0,
+        "Total Tropical Forests (km2)": totals["TOTTROParea"] / 1000000.0,
+        "Total Boreal Forests (km2)": totals["TOTBORarea"] / 1000000.0,
+        "Total Shrublands/Woody Savannah(km2)": totals["TOTSHRUBarea"]
+        / 1000000.0,
+        "Total Grasslands/Savannas (km2)": totals["TOTGRASarea"] / 1000000.0,
+        "Total Croplands (km2)": totals["TOTCROParea"] / 1000000.0,
+    }
+    for name in ["CO", "PM25"]:
+        if name in species:
+            label = SUMMARY_NAMES.get(name, name)
+            summary["TOTAL CROPLANDS {} (kg)".format(label)] = totals[
+                "TOTCROP" + name
+            ]
+    for name in species:
+        summary[SUMMARY_NAMES.get(name, name)] = totals[name] / 1.0e9
+    return summary
+
+
+def _emissions_loop(fires, model):
+    """Reference emission engine that visits one fire at a time.
 
+    This is a direct translation of the original IDL loop, kept to check
+    the vectorized engine against.
+
+    Args:
+        fires (dict) - per-fire arrays, as returned by _read_fires()
+        model (EmissionModel) - fuel loading and emission factor tables
+
+    Returns:
+        A tuple of (unsorted per-fire DataFrame, counters, totals).
+    """
+    scen = 1
+
+    polyid = fires["polyid"]
+    fireid = fires["fireid"]
+    lat = fires["lat"]
+    lon = fires["lon"]
+    date = fires["date"]
+    jd = fires["jd"]
+    area = fires["area"]
+    tree = fires["tree"].copy()
+    herb = fires["herb"].copy()
+    bare = fires["bare"].copy()
+    lct = fires["lct"].copy()
+    globreg = fires["globreg"]
+    totcov = tree + herb + bare
     ngoodfires = len(jd)
-    print("the number of fires = {}".format(ngoodfires))
+
+    grfuel = model.fuel_load[1]  # grassland and savanna fuels
+    wsfuel = model.fuel_load[2]  # woody savanna fuels
+    tffuel = model.fuel_load[3]  # tropical forest fuels
+    tefuel = model.fuel_load[4]  # temperate forest fuels
+    bffuel = model.fuel_load[5]  # boreal forest fuels
+    lcttree = model.lct_tree
+    lctherb = model.lct_herb
+    # the reference loop always calculates in float64
+    ef = dict(zip(model.species, model.ef.T.astype(float)))
+    COEF = ef["CO"]  # CO emission factor
+    NMOCEF = ef["NMOC"]  # NMOC emission factor (added 10/20/2009)
+    NOXEF = ef["NOx"]  # NOx emission factor
+    NOEF = ef["NO"]  # NO emission factors (added 10/20/2009)
+    NO2EF = ef["NO2"]  # NO2 emission factors (added 10/20/2009)
+    SO2EF = ef["SO2"]  # SO2 emission factor
+    PM25EF = ef["PM25"]  # PM2.5 emission factor
+    OCEF = ef["OC"]  # OC emission factor
+    BCEF = ef["BC"]  # BC emission factor
+    NH3EF = ef["NH3"]  # NH3 emission factor
+    PM10EF = ef["PM10"]  # PM10 emission factor (added 08/18/2010)
+
+    # SETTING UP VARIABLES To CHECK TOTALS AT THE END OF The FILE
+
+    # Calculating the total biomass burned in each genveg for output file
+    TOTTROP = 0.0
+    TOTTEMP = 0.0
+    TOTBOR = 0.0
+    TOTSHRUB = 0.0
+    TOTCROP = 0.0
+    TOTGRAS = 0.0
+    # Calculating total area in each genveg for output log file
+    TOTTROParea = 0.0
+    TOTTEMParea = 0.0
+    TOTBORarea = 0.0
+    TOTSHRUBarea = 0.0
+    TOTCROParea = 0.0
+    TOTGRASarea = 0.0
+    # CALCULATING TOTAL CO and PM2.5 for crops
+    TOTCROPCO = 0.0
+    TOTCROPPM25 = 0.0
 
     # Set up Counters
     # These are identifying how many fires are in urban areas,
@@ -170,6 +1385,7 @@ def get_emissions(infile, outfile=None, fuelin=None, emisin=None):
     confnum = 0  # added 08/25/08
     overlapct = 0  # added 02/29/2009
     urbnum = 0  # added 10/20/2009
+    badreg = 0  # fires without a valid global region
 
     # yk: scenuse# actual algorithm being used when falling back to,
     # eg. LCT, for various rasons
@@ -180,6 +1396,8 @@ def get_emissions(infile, outfile=None, fuelin=None, emisin=None):
     COtotal = 0.0
     NMOCtotal = 0.0
     NOXtotal = 0.0
+    NOtotal = 0.0
+    NO2total = 0.0
     SO2total = 0.0
     PM25total = 0.0
     OCtotal = 0.0
@@ -378,13 +1596,7 @@ def get_emissions(infile, outfile=None, fuelin=None, emisin=None):
 
         reg = globreg[j] - 1  # locate global region, get index
         if reg <= -1 or reg > 100:
-            print(
-                "Removed fire number:",
-                j,
-                "Something is WRONG with global regions and fuel loads",
-                "Globreg =",
-                globreg[j],
-            )
+            badreg = badreg + 1
             continue
 
         # bmass now gets calculated as a function of tree cover, too.
@@ -412,11 +1624,6 @@ def get_emissions(infile, outfile=None, fuelin=None, emisin=None):
             bmass1 = bffuel[int(reg)]
 
         if genveg == 0:
-            print(
-                "Removed fire number:",
-                j,
-                "Something is WRONG with generic vegetation. genveg = 0",
-            )
             genveg0 = genveg0 + 1
             continue
 
@@ -427,15 +1634,6 @@ def get_emissions(infile, outfile=None, fuelin=None, emisin=None):
             bmass1 = tefuel[int(reg)]
 
         if bmass1 == -1:
-            print("Fire number:", j, " removed. bmass assigned -1!")
-            print(
-                "    genveg =",
-                genveg,
-                " and globreg = ",
-                globreg[j],
-                " and reg = ",
-                reg,
-            )
             bmass0 = bmass0 + 1
             continue
 
@@ -513,13 +1711,12 @@ def get_emissions(infile, outfile=None, fuelin=None, emisin=None):
         # CHRISTINE EDITING YO'S CODE THAT ISN'T COMPILING
         # # Edited again 02/04/2019
         if genveg == -1 or genveg == 0:
-            print("Fire_emis> ERROR genveg not set correctly: ")
-            print(" scen (orig/used): ", scen, scenuse[j])
-            print(" lc_new (M/G/F/FC/T/TC): ", [lct[j]])
-            print(" tree: ", tree[j])
-            print(" genveg: ", genveg)
-            print("Fire_emis> ERROR stopping...")
-            raise ValueError
+            raise ValueError(
+                "Fire_emis> ERROR genveg not set correctly: scen (orig/used) "
+                "{} {}, lc_new {}, tree {}, genveg {}".format(
+                    scen, scenuse[j], lct[j], tree[j], genveg
+                )
+            )
 
         # Reassigned emission factors based on LCT,
         # not genveg for new emission factor table
@@ -654,6 +1851,8 @@ def get_emissions(infile, outfile=None, fuelin=None, emisin=None):
         COtotal = CO + COtotal
         NMOCtotal = NMOC + NMOCtotal
         NOXtotal = NOXtotal + NOX
+        NOtotal = NOtotal + NO
+        NO2total = NO2total + NO2
         SO2total = SO2total + SO2
         PM25total = PM25total + PM25
         OCtotal = OCtotal + OC
@@ -662,87 +1861,71 @@ def get_emissions(infile, outfile=None, fuelin=None, emisin=None):
         PM10total = PM10total + PM10
         AREAtotal = AREAtotal + areanow  # m2
 
-    # Write output to csv
-    index = [
-        "longi",
-        "lat",
-        "polyid",
-        "fireid",
-        "date",
-        "jd",
-        "lct",
-        "globreg",
-        "genLC",
-        "pcttree",
-        "pctherb",
-        "pctbare",
-        "area",
-        "bmass",
-        "CO",
-        "NOx",
-        "NO",
-        "NO2",
-        "NH3",
-        "SO2",
-        "NMOC",
-        "PM25",
-        "PM10",
-        "OC",
-        "BC",
-    ]
-    out_df = pd.DataFrame(df_rows, columns=index)
-    out_df = out_df.sort_values(by=["jd"])
-    out_df.to_csv(outfile)
-
-    # collect summary json
-    summary_dict = {
-        "input_file": infile,
-        "output_file": outfile,
-        "scenario": scename,
-        "emissions_file": emisin,
-        "fuel_load_file": fuelin,
-        "num_fires_total": numorig,
-        "num_fires_processed": ngoodfires,
-        "num_urban_fires": urbnum,
-        "num_removed_for_overlap": overlapct,
-        "num_lct<=0|lct>17": lct0,
-        "num_antarctic": antarc,
-        "num_bare_cover": allbare,
-        "num_skipped_genveg_problem": genveg0,
-        "num_skipped_bmass_assignment": bmass0,
-        "num_scaled_to_100": vcfcount,
-        "num_vcf<50": vcflt50,
-        "num_fires_skipped": spixct
-        + lct0
-        + antarc
-        + allbare
-        + genveg0
-        + bmass0
-        + confnum,
-        "GLOBAL TOTAL (Tg) biomass burned (Tg)": bmasstotal / 1.0e9,
-        "Total Temperate Forests (Tg)": TOTTEMP / 1.0e9,
-        "Total Tropical Forests (Tg)": TOTTROP / 1.0e9,
-        "Total Boreal Forests (Tg)": TOTBOR / 1.0e9,
-        "Total Shrublands/Woody Savannah(Tg)": TOTSHRUB / 1.0e9,
-        "Total Grasslands/Savannas (Tg)": TOTGRAS / 1.0e9,
-        "Total Croplands (Tg)": TOTCROP / 1.0e9,
-        "TOTAL AREA BURNED (km2)": AREAtotal / 1000000.0,
-        "Total Temperate Forests (km2)": TOTTEMParea / 1000000.0,
-        "Total Tropical Forests (km2)": TOTTROParea / 1000000.0,
-        "Total Boreal Forests (km2)": TOTBORarea / 1000000.0,
-        "Total Shrublands/Woody Savannah(km2)": TOTSHRUBarea / 1000000.0,
-        "Total Grasslands/Savannas (km2)": TOTGRASarea / 1000000.0,
-        "Total Croplands (km2)": TOTCROParea / 1000000.0,
-        "TOTAL CROPLANDS CO (kg)": TOTCROPCO,
-        "TOTAL CROPLANDS PM2.5 (kg)": TOTCROPPM25,
-        "CO": COtotal / 1.0e9,
-        "NMOC": NMOCtotal / 1.0e9,
-        "NOx": NOXtotal / 1.0e9,
-        "SO2": SO2total / 1.0e9,
-        "PM2.5": PM25total / 1.0e9,
-        "OC": OCtotal / 1.0e9,
-        "BC": BCtotal / 1.0e9,
-        "NH3": NH3total / 1.0e9,
-        "PM10": PM10total / 1.0e9,
+    # problems with single fires are reported once, for all fires
+    if badreg:
+        logger.warning(
+            "Removed %d fires. Something is WRONG with global regions and "
+            "fuel loads",
+            badreg,
+        )
+    if genveg0:
+        logger.warning(
+            "Removed %d fires. Something is WRONG with generic vegetation. "
+            "genveg = 0",
+            genveg0,
+        )
+    if bmass0:
+        logger.warning("Removed %d fires. bmass assigned -1!", bmass0)
+
+    out_df = pd.DataFrame(df_rows, columns=OUTPUT_COLUMNS)
+    counts = {
+        "lct0": lct0,
+        "spixct": spixct,
+        "antarc": antarc,
+        "allbare": allbare,
+        "genveg0": genveg0,
+        "bmass0": bmass0,
+        "vcfcount": vcfcount,
+        "vcflt50": vcflt50,
+        "confnum": confnum,
+        "overlapct": overlapct,
+        "urbnum": urbnum,
     }
-    return summary_dict
+    totals = {
+        "bmass": bmasstotal,
+        "area": AREAtotal,
+        "TOTTROP": TOTTROP,
+        "TOTTEMP": TOTTEMP,
+        "TOTBOR": TOTBOR,
+        "TOTSHRUB": TOTSHRUB,
+        "TOTCROP": TOTCROP,
+        "TOTGRAS": TOTGRAS,
+        "TOTTROParea": TOTTROParea,
+        "TOTTEMParea": TOTTEMParea,
+        "TOTBORarea": TOTBORarea,
+        "TOTSHRUBarea": TOTSHRUBarea,
+        "TOTCROParea": TOTCROParea,
+        "TOTGRASarea": TOTGRASarea,
+        "TOTCROPCO": TOTCROPCO,
+        "TOTCROPPM25": TOTCROPPM25,
+        "CO": COtotal,
+        "NMOC": NMOCtotal,
+        "NOx": NOXtotal,
+        "NO": NOtotal,
+        "NO2": NO2total,
+        "SO2": SO2total,
+        "PM25": PM25total,
+        "OC": OCtotal,
+        "BC": BCtotal,
+        "NH3": NH3total,
+        "PM10": PM10total,
+    }
+    return out_df, counts, totals
+
+
+def _rescale_cover(mask, tree, herb, bare, totcov):
+    """Scale VCF cover in place so that it sums to 100 where mask is set."""
+    tree[mask] = tree[mask] * 100.0 / totcov[mask]
+    herb[mask] = herb[mask] * 100.0 / totcov[mask]
+    bare[mask] = bare[mask] * 100.0 / totcov[mask]
+    totcov[mask] = bare[mask] + herb[mask] + tree[mask]
@@ -0,0 +1,579 @@
+""" Gridded emissions for chemical transport models. """
+
+import collections
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from .io import derived_path
+
+
+# Per-fire columns that are not emitted species, so are never gridded
+NON_SPECIES_COLUMNS = [
+    "longi",
+    "lat",
+    "lati",
+    "polyid",
+    "fireid",
+    "date",
+    "jd",
+    "day",
+    "lct",
+    "globreg",
+    "genLC",
+    "genveg",
+    "pcttree",
+    "pctherb",
+    "pctbare",
+    "area",
+    "bmass",
+]
+
+# Mean radius of the Earth in m
+EARTH_RADIUS = 6371000.0
+
+# Radius of the spherical Earth assumed by WRF and CMAQ map projections, in m
+WRF_EARTH_RADIUS = 6370000.0
+
+# Number of fire-to-cell mappings kept in memory by cell_index()
+CELL_CACHE_SIZE = 8
+
+
+class LatLonGrid(object):
+    """Regular latitude/longitude grid.
+
+    Rows run from south to north, and columns from west to east. Fires on
+    the northern or eastern edge of the grid fall in the last row or column.
+
+    Args:
+        resolution (float) - size of a grid cell in degrees
+        south, north (float) - latitude bounds of the grid in degrees
+        west, east (float) - longitude bounds of the grid in degrees
+
+    Attributes:
+        shape (tuple) - number of (rows, columns)
+    """
+
+    # finding cells is cheaper than hashing the fire locations
+    cache_cells = False
+
+    def __init__(self, resolution, south=-90.0, north=90.0, west=-180.0,
+                 east=180.0):
+        if resolution <= 0 or south >= north or west >= east:
+            raise ValueError(
+                "grid needs a positive resolution, south < north and "
+                "west < east"
+            )
+        self.resolution = float(resolution)
+        self.south = float(south)
+        self.north = float(north)
+        self.west = float(west)
+        self.east = float(east)
+        self.shape = (
+            int(round((self.north - self.south) / self.resolution)),
+            int(round((self.east - self.west) / self.resolution)),
+        )
+
+    @property
+    def size(self):
+        """Number of grid cells."""
+        return self.shape[0] * self.shape[1]
+
+    def cell_index(self, lat, lon):
+        """Find the grid cell of each fire.
+
+        Args:
+            lat, lon (array) - fire latitudes and longitudes in degrees
+
+        Returns:
+            An integer array of flat cell indices (row * columns + column),
+            with -1 for fires outside the grid.
+        """
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        nrow, ncol = self.shape
+        row = np.floor((lat - self.south) / self.resolution).astype(int)
+        col = np.floor((lon - self.west) / self.resolution).astype(int)
+        row[lat == self.north] = nrow - 1
+        col[lon == self.east] = ncol - 1
+        inside = (row >= 0) & (row < nrow) & (col >= 0) & (col < ncol)
+        return np.where(inside, row * ncol + col, -1)
+
+    def centers(self):
+        """Get the (latitude, longitude) of each cell center.
+
+        Returns:
+            A tuple of two arrays of the grid shape.
+        """
+        half = self.resolution / 2.0
+        lat = self.south + half + self.resolution * np.arange(self.shape[0])
+        lon = self.west + half + self.resolution * np.arange(self.shape[1])
+        lon, lat = np.meshgrid(lon, lat)
+        return lat, lon
+
+    def cell_areas(self):
+        """Get the area of each cell in m2, for converting totals to fluxes.
+
+        Returns:
+            An array of the grid shape.
+        """
+        edges = np.radians(
+            self.south + self.resolution * np.arange(self.shape[0] + 1)
+        )
+        band = np.diff(np.sin(edges)) * np.radians(self.resolution)
+        return np.repeat(
+            (EARTH_RADIUS ** 2 * band)[:, None], self.shape[1], axis=1
+        )
+
+    def to_dict(self):
+        """Describe the grid, e.g. for the metadata of a gridded file."""
+        return {
+            "type": "latlon",
+            "resolution": self.resolution,
+            "south": self.south,
+            "north": self.north,
+            "west": self.west,
+            "east": self.east,
+        }
+
+
+class ProjectedGrid(object):
+    """Regular grid on a map projection, as used by WRF and CMAQ domains.
+
+    The domain is centered on (ref_lat, ref_lon). Rows run from south to
+    north, and columns from west to east, in projected coordinates.
+    Subclasses define the projection with project() and unproject().
+
+    Args:
+        nx, ny (int) - number of grid columns and rows
+        dx, dy (float) - size of a grid cell in m
+        ref_lat, ref_lon (float) - latitude and longitude of the domain
+            center in degrees
+        stand_lon (float) - longitude parallel to the grid columns, in
+            degrees
+        earth_radius (float) - radius of the spherical Earth in m
+
+    Attributes:
+        shape (tuple) - number of (rows, columns)
+    """
+
+    # projecting fires is worth caching, see cell_index()
+    cache_cells = True
+
+    def __init__(self, nx, ny, dx, dy, ref_lat, ref_lon, stand_lon,
+                 earth_radius=WRF_EARTH_RADIUS):
+        if nx <= 0 or ny <= 0 or dx <= 0 or dy <= 0:
+            raise ValueError("grid needs positive nx, ny, dx and dy")
+        self.nx = int(nx)
+        self.ny = int(ny)
+        self.dx = float(dx)
+        self.dy = float(dy)
+        self.ref_lat = float(ref_lat)
+        self.ref_lon = float(ref_lon)
+        self.stand_lon = float(stand_lon)
+        self.earth_radius = float(earth_radius)
+        self.shape = (self.ny, self.nx)
+
+    @property
+    def size(self):
+        """Number of grid cells."""
+        return self.nx * self.ny
+
+    def _origin(self):
+        """Projected coordinates of the south west corner of the domain."""
+        x, y = self.project(self.ref_lat, self.ref_lon)
+        return x - self.nx * self.dx / 2.0, y - self.ny * self.dy / 2.0
+
+    def cell_index(self, lat, lon):
+        """Find the grid cell of each fire.
+
+        Args:
+            lat, lon (array) - fire latitudes and longitudes in degrees
+
+        Returns:
+            An integer array of flat cell indices (row * nx + column), with
+            -1 for fires outside the domain.
+        """
+        x, y = self.project(lat, lon)
+        x0, y0 = self._origin()
+        with np.errstate(invalid="ignore"):
+            col = np.floor((x - x0) / self.dx)
+            row = np.floor((y - y0) / self.dy)
+            inside = (col >= 0) & (col < self.nx)
+            inside &= (row >= 0) & (row < self.ny)
+        return np.where(inside, row * self.nx + col, -1).astype(int)
+
+    def centers(self):
+        """Get the (latitude, longitude) of each cell center.
+
+        Returns:
+            A tuple of two arrays of the grid shape.
+        """
+        x0, y0 = self._origin()
+        x = x0 + self.dx * (np.arange(self.nx) + 0.5)
+        y = y0 + self.dy * (np.arange(self.ny) + 0.5)
+        x, y = np.meshgrid(x, y)
+        return self.unproject(x, y)
+
+    def cell_areas(self):
+        """Get the area of each cell in projected coordinates, dx * dy.
+
+        Returns:
+            An array of the grid shape.
+        """
+        return np.full(self.shape, self.dx * self.dy)
+
+    def to_dict(self):
+        """Describe the grid, e.g. for the metadata of a gridded file."""
+        definition = {"type": self.kind}
+        definition.update(
+            (name, getattr(self, name)) for name in self._parameters
+        )
+        return definition
+
+    _parameters = [
+        "nx",
+        "ny",
+        "dx",
+        "dy",
+        "ref_lat",
+        "ref_lon",
+        "stand_lon",
+        "earth_radius",
+    ]
+
+
+class LambertConformalGrid(ProjectedGrid):
+    """Grid on a Lambert conformal conic projection (WRF map_proj=1).
+
+    Args:
+        nx, ny, dx, dy, ref_lat, ref_lon, stand_lon - see ProjectedGrid
+        truelat1, truelat2 (float) - standard parallels in degrees, both in
+            the same hemisphere
+        earth_radius (float) - radius of the spherical Earth in m
+    """
+
+    kind = "lambert"
+    _parameters = ProjectedGrid._parameters + ["truelat1", "truelat2"]
+
+    def __init__(self, nx, ny, dx, dy, ref_lat, ref_lon, stand_lon,
+                 truelat1, truelat2=None, earth_radius=WRF_EARTH_RADIUS):
+        ProjectedGrid.__init__(
+            self, nx, ny, dx, dy, ref_lat, ref_lon, stand_lon, earth_radius
+        )
+        self.truelat1 = float(truelat1)
+        self.truelat2 = self.truelat1 if truelat2 is None else float(truelat2)
+        if self.truelat1 * self.truelat2 < 0 or self.truelat1 == 0:
+            raise ValueError(
+                "truelat1 and truelat2 must be in the same hemisphere"
+            )
+
+        phi1 = np.radians(self.truelat1)
+        phi2 = np.radians(self.truelat2)
+        if self.truelat1 == self.truelat2:
+            self._n = np.sin(phi1)
+        else:
+            self._n = np.log(np.cos(phi1) / np.cos(phi2)) / np.log(
+                np.tan(np.pi / 4 + phi2 / 2) / np.tan(np.pi / 4 + phi1 / 2)
+            )
+        self._F = (
+            np.cos(phi1) * np.tan(np.pi / 4 + phi1 / 2) ** self._n / self._n
+        )
+
+    def _rho(self, phi):
+        """Distance from the cone apex of latitudes phi in radians."""
+        tan = np.tan(np.pi / 4 + phi / 2)
+        return self.earth_radius * self._F / tan ** self._n
+
+    def project(self, lat, lon):
+        """Project latitudes and longitudes in degrees to x, y in m."""
+        phi = np.radians(np.asarray(lat, dtype=float))
+        dlon = _wrap(np.asarray(lon, dtype=float) - self.stand_lon)
+        theta = self._n * np.radians(dlon)
+        with np.errstate(divide="ignore", over="ignore"):
+            rho = self._rho(phi)
+        return rho * np.sin(theta), -rho * np.cos(theta)
+
+    def unproject(self, x, y):
+        """Get latitudes and longitudes in degrees of projected x, y in m."""
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        sign = np.sign(self._n)
+        rho = sign * np.hypot(x, y)
+        theta = np.arctan2(sign * x, -sign * y)
+        phi = 2 * np.arctan(
+            (self.earth_radius * self._F / rho) ** (1 / self._n)
+        ) - np.pi / 2
+        lon = _wrap(self.stand_lon + np.degrees(theta / self._n))
+        return np.degrees(phi), lon
+
+
+class PolarStereographicGrid(ProjectedGrid):
+    """Grid on a polar stereographic projection (WRF map_proj=2).
+
+    The projection is centered on the north pole if truelat1 is positive,
+    and on the south pole otherwise.
+
+    Args:
+        nx, ny, dx, dy, ref_lat, ref_lon, stand_lon - see ProjectedGrid
+        truelat1 (float) - latitude of true scale in degrees
+        earth_radius (float) - radius of the spherical Earth in m
+    """
+
+    kind = "polar"
+    _parameters = ProjectedGrid._parameters + ["truelat1"]
+
+    def __init__(self, nx, ny, dx, dy, ref_lat, ref_lon, stand_lon,
+                 truelat1, earth_radius=WRF_EARTH_RADIUS):
+        ProjectedGrid.__init__(
+            self, nx, ny, dx, dy, ref_lat, ref_lon, stand_lon, earth_radius
+        )
+        self.truelat1 = float(truelat1)
+        self._hemi = 1.0 if self.truelat1 >= 0 else -1.0
+        self._scale = self.earth_radius * (
+            1 + self._hemi * np.sin(np.radians(self.truelat1))
+        )
+
+    def project(self, lat, lon):
+        """Project latitudes and longitudes in degrees to x, y in m."""
+        phi = np.radians(np.asarray(lat, dtype=float))
+        dlon = np.radians(np.asarray(lon, dtype=float) - self.stand_lon)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rho = self._scale * np.cos(phi) / (1 + self._hemi * np.sin(phi))
+        return rho * np.sin(dlon), -self._hemi * rho * np.cos(dlon)
+
+    def unproject(self, x, y):
+        """Get latitudes and longitudes in degrees of projected x, y in m."""
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        rho = np.hypot(x, y)
+        phi = self._hemi * (np.pi / 2 - 2 * np.arctan(rho / self._scale))
+        lon = _wrap(
+            self.stand_lon + np.degrees(np.arctan2(x, -self._hemi * y))
+        )
+        return np.degrees(phi), lon
+
+
+# Grid classes, keyed by the 'type' of their to_dict() description
+GRID_TYPES = {
+    "latlon": LatLonGrid,
+    "lambert": LambertConformalGrid,
+    "polar": PolarStereographicGrid,
+}
+
+
+def grid_from_dict(definition):
+    """Build a grid from the description made by its to_dict() method."""
+    definition = dict(definition)
+    kind = definition.pop("type")
+    if kind not in GRID_TYPES:
+        raise ValueError("unknown grid type {!r}".format(kind))
+    return GRID_TYPES[kind](**definition)
+
+
+# Recently used fire-to-cell mappings, keyed by grid and fire locations
+_cell_cache = collections.OrderedDict()
+
+
+def cell_index(grid, lat, lon, cache_dir=None):
+    """Find the grid cell of each fire, reusing earlier results.
+
+    For projected grids, the cell indices are cached under a hash of the
+    grid definition and the fire locations, so repeated runs over the same
+    fires and domain do not project them again. The last CELL_CACHE_SIZE
+    mappings are kept in memory, and with cache_dir they are also saved to
+    disk.
+
+    Args:
+        grid (LatLonGrid or ProjectedGrid) - grid to find cells on
+        lat, lon (array) - fire latitudes and longitudes in degrees
+        cache_dir (str) - optional directory to save mappings in, so that
+            they are reused across processes
+
+    Returns:
+        An integer array of flat cell indices, with -1 for fires outside
+        the grid.
+    """
+    if not grid.cache_cells:
+        return grid.cell_index(lat, lon)
+    lat = np.ascontiguousarray(lat, dtype=float)
+    lon = np.ascontiguousarray(lon, dtype=float)
+    digest = hashlib.sha1(
+        json.dumps(grid.to_dict(), sort_keys=True).encode()
+    )
+    digest.update(lat.tobytes())
+    digest.update(lon.tobytes())
+    key = digest.hexdigest()
+
+    if key in _cell_cache:
+        _cell_cache.move_to_end(key)
+        return _cell_cache[key]
+    path = None
+    if cache_dir is not None:
+        path = os.path.join(cache_dir, "cells-{}.npy".format(key))
+    if path is not None and os.path.isfile(path):
+        cells = np.load(path)
+    else:
+        cells = grid.cell_index(lat, lon)
+        if path is not None:
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            np.save(path, cells)
+    cells.flags.writeable = False
+    _cell_cache[key] = cells
+    while len(_cell_cache) > CELL_CACHE_SIZE:
+        _cell_cache.popitem(last=False)
+    return cells
+
+
+def _wrap(lon):
+    """Wrap longitudes in degrees to [-180, 180)."""
+    return (lon + 180.0) % 360.0 - 180.0
+
+
+def grid_emissions(
+    fire,
+    grid,
+    species=None,
+    lat="lat",
+    lon="longi",
+    day="jd",
+    outfile=None,
+    dtype="float32",
+    cache_dir=None,
+):
+    """Total per-fire emissions on a grid, for each day.
+
+    Each day's emissions are binned for all species in one np.bincount()
+    call, so only one day of the grid is computed at a time. Totals are
+    accumulated in double precision, and stored as dtype.
+
+    Args:
+        fire (DataFrame) - per-fire emissions, as returned by
+            get_emissions() or speciate(). For speciate() output, use
+            lat='lati' and day='day'.
+        grid (LatLonGrid or ProjectedGrid) - grid to total emissions on
+        species (list) - optional names of the columns to grid. If None,
+            every numeric column not in NON_SPECIES_COLUMNS is gridded.
+        lat, lon, day (str) - names of the latitude, longitude and day of
+            year columns of fire
+        outfile (str) - optional path of a .npy file to write the grids to.
+            The file is written one day at a time, and can be memory mapped
+            with read_gridded(). The metadata are written alongside it, with
+            the extension .json.
+        dtype (str) - dtype of the gridded emissions
+        cache_dir (str) - optional directory to save fire-to-cell mappings
+            in, see cell_index()
+
+    Returns:
+        A tuple of (array of gridded emissions indexed by [day, species,
+        row, column], metadata dictionary with 'days', 'species' and
+        'grid'). Fires outside the grid are left out. The emissions are in
+        the units of the per-fire columns, per cell and day.
+    """
+    species = species_columns(fire, species)
+    nspecies = len(species)
+
+    cells = cell_index(grid, fire[lat].values, fire[lon].values, cache_dir)
+    inside = cells >= 0
+    cells = cells[inside]
+    values = fire[species].to_numpy(dtype=float)[inside]
+    days, day_index = np.unique(fire[day].values[inside], return_inverse=True)
+    metadata = {
+        "days": [int(d) for d in days],
+        "species": species,
+        "grid": grid.to_dict(),
+    }
+
+    shape = (len(days), nspecies) + tuple(grid.shape)
+    if outfile is None:
+        gridded = np.zeros(shape, dtype=dtype)
+    else:
+        gridded = np.lib.format.open_memmap(
+            outfile, mode="w+", dtype=dtype, shape=shape
+        )
+    flat = gridded.reshape(len(days), nspecies, grid.size)
+
+    # sort fires by day once, so each day is a contiguous block of rows
+    order = np.argsort(day_index, kind="mergesort")
+    bounds = np.searchsorted(day_index[order], np.arange(len(days) + 1))
+    cells = cells[order]
+    values = values[order].T
+    for d in range(len(days)):
+        rows = slice(bounds[d], bounds[d + 1])
+        bin_cells(cells[rows], values[:, rows], flat[d])
+
+    if outfile is not None:
+        gridded.flush()
+        with open(derived_path(outfile, "", ".json"), "w") as f:
+            json.dump(metadata, f, indent=1)
+    return gridded, metadata
+
+
+def bin_cells(cells, values, out):
+    """Add values into grid cells with one np.bincount() call.
+
+    Only the occupied cells are binned, so the cost does not depend on the
+    size of the grid.
+
+    Args:
+        cells (array) - flat cell index of each fire
+        values (array) - values indexed by [species, fire]
+        out (array) - totals indexed by [species, flat cell index], which
+            are set for the occupied cells
+    """
+    nspecies = len(values)
+    occupied, cell = np.unique(cells, return_inverse=True)
+    keys = np.arange(nspecies)[:, None] * len(occupied) + cell[None, :]
+    totals = np.bincount(
+        keys.ravel(),
+        weights=values.ravel(),
+        minlength=nspecies * len(occupied),
+    )
+    out[:, occupied] = totals.reshape(nspecies, len(occupied))
+
+
+def species_columns(fire, species=None):
+    """Get the names of the emitted species columns of fire.
+
+    Args:
+        fire (DataFrame) - per-fire emissions
+        species (list) - optional names of the columns to use. If None,
+            every numeric column not in NON_SPECIES_COLUMNS is used, except
+            row index columns, such as the 'Unnamed: 0' column of an output
+            csv read without index_col=0.
+    """
+    if species is not None:
+        return list(species)
+    return [
+        column
+        for column in fire.select_dtypes(include="number").columns
+        if column not in NON_SPECIES_COLUMNS
+        and not _is_index_column(column)
+    ]
+
+
+def _is_index_column(column):
+    """Check whether a column name is that of a written row index."""
+    column = str(column)
+    return column == "index" or column.startswith("Unnamed:")
+
+
+def read_gridded(path, mmap_mode="r"):
+    """Read gridded emissions written by grid_emissions().
+
+    Args:
+        path (str) - path to the .npy file
+        mmap_mode (str) - memory map mode passed to np.load(). The default
+            'r' reads only the parts of the array that are used. None reads
+            the whole array into memory.
+
+    Returns:
+        A tuple of (array indexed by [day, species, row, column], metadata
+        dictionary with 'days', 'species' and 'grid').
+    """
+    with open(derived_path(path, "", ".json")) as f:
+        metadata = json.load(f)
+    return np.load(path, mmap_mode=mmap_mode), metadata
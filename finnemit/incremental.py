@@ -0,0 +1,308 @@
+""" Incremental emissions for input files that grow over time. """
+
+import hashlib
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from . import __version__
+from .finnemit import (
+    EmissionModel,
+    INPUT_COLUMNS,
+    read_fires,
+    _check_cover,
+    _emission_totals,
+    _fuel_loads,
+    _land_cover,
+    _read_fires,
+)
+from .io import derived_path, write_table
+
+
+# Columns identifying a fire detection in the input, and in the output
+KEY_COLUMNS = ["polyid", "fireid", "acq_date_lst"]
+OUTPUT_KEY_COLUMNS = ["polyid", "fireid", "date"]
+
+# Counters kept for each fire key: the number of input fires with a global
+# region, and the quality assurance counters of the summary
+COUNTERS = [
+    "numorig",
+    "lct0",
+    "spixct",
+    "antarc",
+    "allbare",
+    "genveg0",
+    "bmass0",
+    "vcfcount",
+    "vcflt50",
+    "confnum",
+    "overlapct",
+    "urbnum",
+]
+
+
+def update_emissions(
+    infile,
+    state_file,
+    outfile=None,
+    fuelin=None,
+    emisin=None,
+    method="vectorized",
+    model=None,
+    columns=None,
+    float_dtype=None,
+):
+    """Estimate emissions for an input file, reusing the results of
+    earlier runs on older versions of the file.
+
+    The state file holds a hash of the input rows of each
+    (polyid, fireid, acq_date_lst) key already processed, with the key's
+    outputs and quality assurance counters. Each run only processes the
+    fires whose key is new, or whose input rows have changed, and drops the
+    results of changed or removed fires. The output file and summary always
+    cover every fire in infile, as get_emissions() would.
+
+    Args:
+        infile (str) - path to a file created with the FINN preprocessor,
+            in any format read by read_table()
+        state_file (str) - path to the state file. It is created by the
+            first run, and replaced (atomically) by each later run. It is
+            ignored if the fuel loading or emission factor tables, the
+            method or the package version have changed since.
+        outfile (str) - optional path to the output file. If None, then
+            this is constructed by appending '_out' to the input filename.
+        fuelin (str) - optional path to a fuel loading file, see
+            get_emissions()
+        emisin (str) - optional path to an emissions file, see
+            get_emissions()
+        method (str) - 'vectorized' (default) or 'loop', see get_emissions()
+        model (EmissionModel) - optional model with preloaded tables. If
+            given, fuelin and emisin are ignored.
+        columns (list) - optional names of the columns to write to outfile
+        float_dtype (str) - optional dtype for the floating point columns
+            of outfile
+
+    Returns:
+        A dictionary summarizing emission totals for all fires in infile,
+        as returned by get_emissions(), with the numbers of fire keys that
+        were 'num_fires_new', 'num_fires_changed', 'num_fires_removed' and
+        'num_fires_reused' in this run. With the loop method, emission
+        totals are summed in a different order, so can differ from those of
+        a full run in the last few digits.
+    """
+    if model is None:
+        model = EmissionModel(fuelin=fuelin, emisin=emisin)
+    if outfile is None:
+        outfile = derived_path(infile, "_out")
+    signature = _signature(model, method)
+
+    fires = read_fires(infile).reset_index(drop=True)
+    # place of each row among the rows with the same key
+    occurrence = fires.groupby(KEY_COLUMNS, sort=False).cumcount().values
+    groups = _group_hashes(fires, occurrence)
+
+    state = _load_state(state_file, signature, model.output_columns)
+    merged = groups.merge(
+        state["keys"][KEY_COLUMNS + ["group_hash"]],
+        on=KEY_COLUMNS,
+        how="outer",
+        suffixes=("", "_old"),
+        indicator=True,
+    )
+    new = merged["_merge"] == "left_only"
+    removed = merged["_merge"] == "right_only"
+    changed = (merged["_merge"] == "both") & (
+        merged["group_hash"] != merged["group_hash_old"]
+    )
+    fresh_keys = _key_index(merged[new | changed], KEY_COLUMNS)
+    stale_keys = _key_index(merged[changed | removed], KEY_COLUMNS)
+
+    # drop the results of the old versions of changed or removed fires
+    keys = state["keys"]
+    keys = keys[~_key_index(keys, KEY_COLUMNS).isin(stale_keys)]
+    outputs = state["outputs"]
+    outputs = outputs[
+        ~_key_index(outputs, OUTPUT_KEY_COLUMNS).isin(stale_keys)
+    ]
+
+    fresh = _key_index(fires, KEY_COLUMNS).isin(fresh_keys)
+    if fresh.any():
+        fresh_counts, fresh_outputs = _process_fresh(
+            fires[fresh], occurrence[fresh], method, model
+        )
+        fresh_groups = groups[_key_index(groups, KEY_COLUMNS).isin(fresh_keys)]
+        fresh_groups = fresh_groups.merge(
+            fresh_counts, on=KEY_COLUMNS, how="left"
+        )
+        fresh_groups[COUNTERS] = fresh_groups[COUNTERS].fillna(0).astype(int)
+        keys = _concat(keys, fresh_groups)
+        outputs = _concat(outputs, fresh_outputs)
+
+    # put the outputs in the order of their input rows, then sort by day as
+    # run() does
+    position = pd.MultiIndex.from_arrays(
+        [fires[column].values for column in KEY_COLUMNS] + [occurrence]
+    ).get_indexer(
+        pd.MultiIndex.from_arrays(
+            [outputs[column].values for column in OUTPUT_KEY_COLUMNS]
+            + [outputs["occurrence"].values]
+        )
+    )
+    outputs = outputs.iloc[np.argsort(position, kind="mergesort")]
+    outputs = outputs.reset_index(drop=True)
+    out_df = outputs.drop(columns="occurrence").sort_values(
+        by=["jd"], kind="mergesort"
+    )
+    write_table(out_df, outfile, columns=columns, float_dtype=float_dtype)
+
+    _save_state(
+        state_file, {"signature": signature, "keys": keys, "outputs": outputs}
+    )
+
+    counts = dict((name, int(keys[name].sum())) for name in COUNTERS)
+    numorig = counts.pop("numorig")
+    totals = _emission_totals(
+        outputs["area"].values,
+        outputs["bmass"].values,
+        outputs["genLC"].values,
+        np.ascontiguousarray(outputs[model.species].values),
+        model.species,
+    )
+    summary_dict = {"input_file": infile, "output_file": outfile}
+    summary_dict.update(model._summary(numorig, counts, totals))
+    summary_dict.update(
+        {
+            "num_fires_new": int(new.sum()),
+            "num_fires_changed": int(changed.sum()),
+            "num_fires_removed": int(removed.sum()),
+            "num_fires_reused": int(len(groups) - new.sum() - changed.sum()),
+        }
+    )
+    return summary_dict
+
+
+def _process_fresh(fires, occurrence, method, model):
+    """Process the input rows of new or changed fire keys.
+
+    Args:
+        fires (DataFrame) - input rows, as returned by read_fires()
+        occurrence (ndarray) - place of each row among the rows of infile
+            with the same key
+        method (str) - 'vectorized' or 'loop'
+        model (EmissionModel) - the model
+
+    Returns:
+        A tuple of (DataFrame of the COUNTERS of each key, DataFrame of
+        per-fire emissions with the 'occurrence' of the input row of each).
+    """
+    valid = fires["v_regnum"].notnull().values
+    flags = {}
+    cover, keep, counts = _check_cover(_read_fires(fires), flags)
+    cover["index"] = np.arange(len(keep))
+    cover = _land_cover(cover, keep, counts, flags)
+    nofuel = _fuel_loads(model.fuel_load, cover) == -1
+    flags["bmass0"] = np.zeros(len(keep), dtype=bool)
+    flags["bmass0"][cover["index"][nofuel]] = True
+
+    if method == "loop":
+        out_df, _, _, _ = model._process(fires, method)
+    else:
+        out_df, _ = model.emit(model._assign_fuel(cover, counts))
+    out_df["occurrence"] = occurrence[valid][cover["index"][~nofuel]]
+
+    key_counts = fires.loc[valid, KEY_COLUMNS].reset_index(drop=True)
+    for name in COUNTERS:
+        key_counts[name] = flags.get(name, int(name == "numorig"))
+    key_counts = key_counts.astype(dict((name, int) for name in COUNTERS))
+    return (
+        key_counts.groupby(KEY_COLUMNS, sort=False, as_index=False).sum(),
+        out_df,
+    )
+
+
+def _concat(a, b):
+    """Append the rows of b to a, keeping dtypes if a is empty."""
+    if not len(a):
+        return b.reset_index(drop=True)
+    return pd.concat([a, b], ignore_index=True)
+
+
+def _signature(model, method):
+    """Hash everything besides the input that the outputs depend on."""
+    digest = hashlib.sha1(
+        "{} {} {}".format(__version__, method, model.species).encode()
+    )
+    for table in [model.fuel_load, model.lct_tree, model.lct_herb, model.ef]:
+        digest.update(np.ascontiguousarray(table).tobytes())
+    return digest.hexdigest()
+
+
+def _group_hashes(fires, occurrence):
+    """Hash the input rows of each fire key.
+
+    Args:
+        fires (DataFrame) - input rows, as returned by read_fires()
+        occurrence (ndarray) - place of each row among the rows with the
+            same key
+
+    Returns:
+        A DataFrame with the key columns and a 'group_hash' of all the rows
+        with that key.
+    """
+    row_hash = pd.util.hash_pandas_object(
+        fires[INPUT_COLUMNS], index=False
+    ).values
+    keys = fires[KEY_COLUMNS].reset_index(drop=True)
+    # weight each row by its place among rows with the same key, so that
+    # reordering or duplicating rows changes the hash
+    with np.errstate(over="ignore"):
+        weighted = row_hash * (occurrence.astype(np.uint64) + np.uint64(1))
+    keys["group_hash"] = weighted
+    return keys.groupby(KEY_COLUMNS, sort=False, as_index=False).agg(
+        {"group_hash": "sum"}
+    )
+
+
+def _key_index(df, columns):
+    """Index of the fire keys of each row of df."""
+    return pd.MultiIndex.from_arrays(
+        [df[column].values for column in columns], names=KEY_COLUMNS
+    )
+
+
+def _empty_state(signature, output_columns):
+    """State of a run that has not processed any fires."""
+    inputs = read_fires(
+        pd.DataFrame(
+            {column: pd.Series(dtype=object) for column in INPUT_COLUMNS}
+        )
+    )
+    keys = _group_hashes(inputs, np.zeros(0, dtype=int))
+    for name in COUNTERS:
+        keys[name] = pd.Series(dtype=int)
+    return {
+        "signature": signature,
+        "keys": keys,
+        "outputs": pd.DataFrame(columns=output_columns + ["occurrence"]),
+    }
+
+
+def _load_state(state_file, signature, output_columns):
+    """Read the state file, or start afresh if it is missing or stale."""
+    if not os.path.isfile(state_file):
+        return _empty_state(signature, output_columns)
+    with open(state_file, "rb") as f:
+        state = pickle.load(f)
+    if state["signature"] != signature:
+        return _empty_state(signature, output_columns)
+    return state
+
+
+def _save_state(state_file, state):
+    """Replace the state file, so that it is never left half written."""
+    tmp_file = state_file + ".tmp"
+    with open(tmp_file, "wb") as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_file, state_file)
@@ -0,0 +1,222 @@
+""" Reading and writing tables in csv, Parquet and Arrow (Feather) formats. """
+
+import os
+
+import pandas as pd
+
+
+# File formats, keyed by file extension. Other extensions are read and
+# written as csv.
+FORMATS = {
+    ".csv": "csv",
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".feather": "feather",
+    ".arrow": "feather",
+    ".ipc": "feather",
+}
+
+
+def file_format(path):
+    """Get the format of a file ('csv', 'parquet' or 'feather') from its
+    extension."""
+    return FORMATS.get(os.path.splitext(path)[1].lower(), "csv")
+
+
+def derived_path(path, suffix, ext=None):
+    """Build a path next to an input file, e.g. 'fires.csv' -> 'fires_out.csv'.
+
+    Args:
+        path (str) - path to the input file
+        suffix (str) - text to add before the file extension
+        ext (str) - optional new extension. If None, the extension of path
+            is kept.
+    """
+    root, path_ext = os.path.splitext(path)
+    return root + suffix + (path_ext if ext is None else ext)
+
+
+def read_table(path, columns=None, dtype=None, engine=None):
+    """Read a table from a csv, Parquet or Arrow (Feather) file.
+
+    Args:
+        path (str) - path to the file. The format is taken from the
+            extension, see FORMATS.
+        columns (list) - optional names of the columns to read. Columnar
+            formats only read these columns from disk.
+        dtype (dict) - optional dtypes, keyed by column name. csv columns
+            are parsed straight into these types, and columns of other
+            formats are cast to them after reading.
+        engine (str) - optional csv parser passed to pandas.read_csv(),
+            e.g. 'pyarrow' for a faster, multithreaded parser. Ignored for
+            other formats.
+
+    Returns:
+        A DataFrame.
+    """
+    fmt = file_format(path)
+    if fmt == "parquet":
+        return _cast(pd.read_parquet(path, columns=columns), dtype)
+    if fmt == "feather":
+        return _cast(pd.read_feather(path, columns=columns), dtype)
+    return pd.read_csv(path, usecols=columns, dtype=dtype, engine=engine)
+
+
+def iter_tables(path, chunksize, columns=None, dtype=None):
+    """Read a table from a file in chunks of rows.
+
+    Args:
+        path (str) - path to a csv, Parquet or Arrow (Feather) file
+        chunksize (int) - number of rows in each chunk
+        columns (list) - optional names of the columns to read
+        dtype (dict) - optional dtypes, keyed by column name, see
+            read_table()
+
+    Yields:
+        DataFrames of at most chunksize rows, in file order.
+    """
+    fmt = file_format(path)
+    if fmt == "csv":
+        chunks = pd.read_csv(
+            path, usecols=columns, dtype=dtype, chunksize=chunksize
+        )
+        for chunk in chunks:
+            yield chunk
+        return
+
+    pa = _import_pyarrow()
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        batches = pq.ParquetFile(path).iter_batches(
+            batch_size=chunksize, columns=columns
+        )
+        for batch in batches:
+            yield _cast(batch.to_pandas(), dtype)
+    else:
+        # Arrow files are memory mapped, so only the sliced rows are read
+        with pa.memory_map(path) as source:
+            table = pa.ipc.open_file(source).read_all()
+            if columns is not None:
+                table = table.select(columns)
+            for start in range(0, table.num_rows, chunksize):
+                yield _cast(table.slice(start, chunksize).to_pandas(), dtype)
+
+
+def write_table(df, path, columns=None, float_dtype=None):
+    """Write a table to a csv, Parquet or Arrow (Feather) file.
+
+    csv files include the DataFrame index as their first column, as
+    DataFrame.to_csv() does. Parquet and Arrow files only hold the columns.
+
+    Args:
+        df (DataFrame) - table to write
+        path (str) - path to the file. The format is taken from the
+            extension, see FORMATS.
+        columns (list) - optional names of the columns to write
+        float_dtype (str) - optional dtype for floating point columns, e.g.
+            'float32' to halve their size. If None, they are written as is.
+    """
+    with TableWriter(path, columns=columns, float_dtype=float_dtype) as writer:
+        writer.write(df)
+
+
+class TableWriter(object):
+    """Write a table to a file a few rows at a time.
+
+    Each call to write() appends rows to the file, so that large outputs
+    never need to be held in memory at once. Use as a context manager, or
+    call close() when done.
+
+    Args:
+        path (str) - path to a csv, Parquet or Arrow (Feather) file
+        columns (list) - optional names of the columns to write. These are
+            also written as the header of an empty table.
+        float_dtype (str) - optional dtype for floating point columns
+        index (bool) - if True (default), csv files include the DataFrame
+            index as their first column. Other formats never include it.
+    """
+
+    def __init__(self, path, columns=None, float_dtype=None, index=True):
+        self.path = path
+        self.format = file_format(path)
+        self.columns = columns
+        self.float_dtype = float_dtype
+        self.index = index
+        self._writer = None
+        self._schema = None
+        self._written = False
+        if self.format != "csv":
+            _import_pyarrow()
+
+    def write(self, df):
+        """Append the rows of a DataFrame to the file."""
+        df = _prepare(df, self.columns, self.float_dtype)
+        if self.format == "csv":
+            if self._written:
+                df.to_csv(self.path, mode="a", header=False, index=self.index)
+            else:
+                df.to_csv(self.path, index=self.index)
+        else:
+            import pyarrow as pa
+
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._writer is None:
+                self._schema = table.schema
+                self._writer = self._open(table.schema)
+            else:
+                table = table.cast(self._schema)
+            self._writer.write_table(table)
+        self._written = True
+
+    def close(self):
+        """Finish writing the file."""
+        if not self._written:
+            self.write(pd.DataFrame(columns=self.columns))
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _open(self, schema):
+        import pyarrow as pa
+
+        if self.format == "parquet":
+            import pyarrow.parquet as pq
+
+            return pq.ParquetWriter(self.path, schema)
+        return pa.ipc.new_file(self.path, schema)
+
+
+def _cast(df, dtype):
+    """Cast the columns of df that appear in dtype."""
+    if dtype is None:
+        return df
+    return df.astype({c: t for c, t in dtype.items() if c in df.columns})
+
+
+def _prepare(df, columns, float_dtype):
+    """Select columns, and cast floating point columns to float_dtype."""
+    if columns is not None:
+        df = df[list(columns)]
+    if float_dtype is not None:
+        floats = df.select_dtypes(include="floating").columns
+        df = df.astype({column: float_dtype for column in floats})
+    return df
+
+
+def _import_pyarrow():
+    """Import pyarrow, which is needed for Parquet and Arrow files."""
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError(
+            "pyarrow is required to read and write Parquet and Arrow files. "
+            "Install it with: pip install pyarrow"
+        )
+    return pyarrow
@@ -0,0 +1,96 @@
+""" Emissions and speciation in one pass, without intermediate files. """
+
+from .finnemit import EmissionModel
+from .io import derived_path, write_table
+from .timing import StageTimer
+from .speciate import speciate_emissions, _speciation_file, _write_log
+
+
+def run_pipeline(
+    infile,
+    emissions_outfile=None,
+    species_outfile=None,
+    fuelin=None,
+    emisin=None,
+    sfile=None,
+    method="vectorized",
+    model=None,
+    float_dtype=None,
+    regions=None,
+    precision="float64",
+):
+    """Estimate emissions with FINN, and speciate them in memory.
+
+    The per-fire emissions are passed straight to the speciation step
+    instead of being written to a csv file and read back in. Only the
+    outputs that are asked for are written.
+
+    Args:
+        infile (str or DataFrame) - path to a file created with the FINN
+            preprocessor, or a DataFrame with the same columns
+        emissions_outfile (str) - optional path to write the per-fire
+            emissions to, as get_emissions() would
+        species_outfile (str) - optional path to write the speciated
+            emissions to, as speciate() would. A log file is written
+            alongside it. Output formats are taken from the extensions, see
+            write_table().
+        fuelin (str) - optional path to a fuel loading file. This must be
+            formatted like the file finnemit/data/fuel-loads.csv
+        emisin (str) - optional path to an emissions file. This must be
+            formatted like the file finnemit/data/emission-factors.csv
+        sfile (str) - optional path to a speciation file. This must be
+            formatted like the file finnemit/data/speciation.csv.
+        method (str) - 'vectorized' (default) or 'loop', see get_emissions()
+        model (EmissionModel) - optional model with preloaded tables. If
+            given, fuelin and emisin are ignored.
+        float_dtype (str) - optional dtype for the floating point columns
+            of the output files, e.g. 'float32'.
+        regions (dict) - optional regions to total emissions over in the
+            log file, see speciate()
+        precision (str) - 'float64' (default) or 'float32', the precision
+            to calculate and store emissions and speciated emissions in, see
+            EmissionModel. Ignored if model is given.
+
+    Returns:
+        A tuple of (dictionary summarizing emission totals and the timings
+        of each stage, including 'speciate', DataFrame of speciated
+        emissions).
+    """
+    timer = StageTimer()
+    if model is None:
+        with timer.stage("table_load"):
+            model = EmissionModel(
+                fuelin=fuelin, emisin=emisin, precision=precision
+            )
+    sfile = _speciation_file(sfile)
+    if not isinstance(infile, str):
+        infile_name = "(in memory)"
+    else:
+        infile_name = infile
+
+    out_df, summary = model.run(infile, method=method, timer=timer)
+    if emissions_outfile is not None:
+        with timer.stage("write", rows=len(out_df)):
+            write_table(out_df, emissions_outfile, float_dtype=float_dtype)
+
+    # number the fires as speciate() would after reading emissions_outfile
+    fire = out_df.reset_index(drop=True)
+    with timer.stage("speciate", rows=len(fire)):
+        species_df = speciate_emissions(fire, sfile)
+    if species_outfile is not None:
+        with timer.stage("write", rows=len(species_df)):
+            write_table(species_df, species_outfile, float_dtype=float_dtype)
+            logfile_name = derived_path(species_outfile, "_log", ".txt")
+            _write_log(
+                logfile_name, infile_name, sfile, fire, species_df, regions
+            )
+
+    summary_dict = {
+        "input_file": infile_name,
+        "output_file": emissions_outfile,
+        "species_file": species_outfile,
+        "speciation_file": sfile,
+    }
+    summary_dict.update(summary)
+    summary_dict.update(timer.summary())
+    return summary_dict, species_df
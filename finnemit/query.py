@@ -0,0 +1,267 @@
+""" Spatio-temporal index of per-fire emissions, for box and date queries.
+
+The index holds the fires of an emissions file sorted into partitions by
+day and by coarse grid cell. A query reads only the partitions of the days
+and cells that overlap it, through a memory map.
+"""
+
+import json
+
+import numpy as np
+import pandas as pd
+
+from .archive import (
+    read_output,
+    record_dtype,
+    records_to_frame,
+    to_records,
+    _replace,
+    _write_json,
+    _write_npy,
+)
+from .grid import species_columns
+from .io import derived_path
+from .regions import region_membership
+
+
+# Size of the grid cells that fires are partitioned by, in degrees
+DEFAULT_CELL_SIZE = 1.0
+
+PARTITION_DTYPE = np.dtype(
+    [("day", "int64"), ("cell", "int64"), ("start", "int64"),
+     ("stop", "int64")]
+)
+
+
+def build_index(
+    fire, path, cell_size=DEFAULT_CELL_SIZE, lat=None, lon="longi", day=None
+):
+    """Build a query index for per-fire emissions.
+
+    Three files are written: the fires at path, sorted by day and grid
+    cell, a .json file of metadata alongside it, and a '_partitions.npy'
+    file with the position of the fires of each day and cell.
+
+    Args:
+        fire (DataFrame or str) - per-fire emissions as returned by
+            get_emissions() or speciate(), or a path to a file they wrote
+        path (str) - path to the index, e.g. 'emissions.idx'
+        cell_size (float) - size of the grid cells fires are partitioned
+            by, in degrees. Smaller cells read fewer fires for small boxes,
+            at the cost of more partitions.
+        lat, lon (str) - names of the latitude and longitude columns. If
+            lat is None, 'lat' is used, or 'lati' for speciate() output.
+        day (str) - name of the day column. If None, 'date' is used, or
+            'day' (the day of year) for speciate() output.
+
+    Returns:
+        An EmissionIndex for querying the fires.
+    """
+    if isinstance(fire, str):
+        fire = read_output(fire)
+    if lat is None:
+        lat = "lati" if "lati" in fire else "lat"
+    if day is None:
+        day = "date" if "date" in fire else "day"
+    for column in [lat, lon, day]:
+        if column not in fire:
+            raise ValueError(
+                "index needs a {!r} column, got {}".format(
+                    column, list(fire.columns)
+                )
+            )
+    if cell_size <= 0:
+        raise ValueError("cell_size must be positive")
+
+    records = to_records(fire, record_dtype(fire))
+    is_date = records.dtype[day].kind == "M"
+    days = _day_numbers(records[day], is_date)
+    cells = _cells(records[lat], records[lon], cell_size)
+    order = np.lexsort((cells, days))
+    records, days, cells = records[order], days[order], cells[order]
+
+    # a partition starts wherever the day or the cell changes
+    changes = (np.diff(days) != 0) | (np.diff(cells) != 0)
+    starts = np.flatnonzero(np.r_[len(records) > 0, changes])
+    partitions = np.empty(len(starts), dtype=PARTITION_DTYPE)
+    partitions["day"] = days[starts]
+    partitions["cell"] = cells[starts]
+    partitions["start"] = starts
+    partitions["stop"] = np.r_[starts[1:], len(records)]
+
+    with open(path, "wb") as f:
+        f.write(records.tobytes())
+    _replace(derived_path(path, "_partitions", ".npy"), partitions, _write_npy)
+    metadata = {
+        "dtype": records.dtype.descr,
+        "records": len(records),
+        "cell_size": float(cell_size),
+        "lat": lat,
+        "lon": lon,
+        "day": day,
+    }
+    _replace(derived_path(path, "", ".json"), metadata, _write_json)
+    return EmissionIndex(path)
+
+
+class EmissionIndex(object):
+    """Query per-fire emissions indexed by build_index().
+
+    Queries select fires in a (south, north, west, east) box, including
+    its edges, and from a start to an end day, inclusive. Days are dates
+    such as '2016-06-01' for get_emissions() output, or days of the year
+    for speciate() output. Either may be left out to select every day, or
+    everywhere.
+
+    Args:
+        path (str) - path to the index
+
+    Attributes:
+        records (ndarray) - memory map of every fire, sorted by day and
+            grid cell
+        partitions (ndarray) - the 'day', grid 'cell' and 'start' and 'stop'
+            positions in records of each partition
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(derived_path(path, "", ".json")) as f:
+            metadata = json.load(f)
+        self.cell_size = metadata["cell_size"]
+        self.lat = metadata["lat"]
+        self.lon = metadata["lon"]
+        self.day = metadata["day"]
+        dtype = np.dtype([tuple(field) for field in metadata["dtype"]])
+        if metadata["records"]:
+            self.records = np.memmap(
+                path, dtype=dtype, mode="r", shape=(metadata["records"],)
+            )
+        else:
+            # an empty file cannot be memory mapped
+            self.records = np.zeros(0, dtype=dtype)
+        self.partitions = np.load(
+            derived_path(path, "_partitions", ".npy"), mmap_mode="r"
+        )
+
+    def fires(self, box=None, start=None, end=None):
+        """Get the fires in a box and range of days.
+
+        Args:
+            box (tuple) - optional (south, north, west, east) box in degrees
+            start, end (str or int) - optional first and last days
+
+        Returns:
+            A DataFrame of the matching fires, sorted by day.
+        """
+        chunks = list(self._select(box, start, end))
+        if not chunks:
+            return records_to_frame(self.records[:0])
+        records = np.concatenate(chunks)
+        # fires were sorted by cell within each day
+        records = records[np.argsort(records[self.day], kind="mergesort")]
+        return records_to_frame(records)
+
+    def totals(self, box=None, start=None, end=None, columns=None):
+        """Total the emissions of the fires in a box and range of days.
+
+        Args:
+            box (tuple) - optional (south, north, west, east) box in degrees
+            start, end (str or int) - optional first and last days
+            columns (list) - optional names of the columns to total. If
+                None, every emitted species column is totalled.
+
+        Returns:
+            A Series of totals, with 'num_fires' for the number of fires.
+        """
+        if columns is None:
+            columns = species_columns(records_to_frame(self.records[:0]))
+        totals = np.zeros(len(columns))
+        nfires = 0
+        for records in self._select(box, start, end):
+            nfires += len(records)
+            for i, column in enumerate(columns):
+                totals[i] += np.sum(records[column], dtype="float64")
+        totals = pd.Series(totals, index=list(columns))
+        totals["num_fires"] = nfires
+        return totals
+
+    def _select(self, box, start, end):
+        """Yield the fires of the partitions that overlap a query."""
+        partitions = self.partitions
+        is_date = self.records.dtype[self.day].kind == "M"
+        first, last = 0, len(partitions)
+        if start is not None:
+            first = np.searchsorted(
+                partitions["day"], _day_number(start, is_date), side="left"
+            )
+        if end is not None:
+            last = np.searchsorted(
+                partitions["day"], _day_number(end, is_date), side="right"
+            )
+        partitions = np.asarray(partitions[first:last])
+
+        if box is not None:
+            south, north, west, east = box
+            if south > north or west > east:
+                raise ValueError(
+                    "box must be (south, north, west, east), got "
+                    "{}".format(box)
+                )
+            ncols = _ncols(self.cell_size)
+            row = partitions["cell"] // ncols
+            col = partitions["cell"] % ncols
+            rows = _rows([south, north], self.cell_size)
+            cols = _cols([west, east], self.cell_size)
+            partitions = partitions[
+                (row >= rows[0]) & (row <= rows[1])
+                & (col >= cols[0]) & (col <= cols[1])
+            ]
+
+        # neighbouring partitions are read as one slice
+        breaks = np.flatnonzero(partitions["start"][1:]
+                                != partitions["stop"][:-1]) + 1
+        for run in np.split(np.arange(len(partitions)), breaks):
+            if len(run) == 0:
+                continue
+            records = self.records[
+                partitions["start"][run[0]]:partitions["stop"][run[-1]]
+            ]
+            if box is not None:
+                inside = region_membership(
+                    records[self.lat], records[self.lon], {"box": box}
+                )[:, 0]
+                records = records[inside]
+            yield records
+
+
+def _day_numbers(days, is_date):
+    """Days as integers: days since 1970 for dates, or as they are."""
+    if is_date:
+        return days.astype("datetime64[D]").astype("int64")
+    return days.astype("int64")
+
+
+def _day_number(day, is_date):
+    if is_date:
+        return np.datetime64(day, "D").astype("int64")
+    return int(day)
+
+
+def _ncols(cell_size):
+    return int(np.ceil(360.0 / cell_size))
+
+
+def _rows(lat, cell_size):
+    nrows = int(np.ceil(180.0 / cell_size))
+    row = np.floor((np.asarray(lat, dtype=float) + 90.0) / cell_size)
+    return np.clip(row, 0, nrows - 1).astype("int64")
+
+
+def _cols(lon, cell_size):
+    col = np.floor((np.asarray(lon, dtype=float) + 180.0) / cell_size)
+    return np.clip(col, 0, _ncols(cell_size) - 1).astype("int64")
+
+
+def _cells(lat, lon, cell_size):
+    """Number the grid cells of a set of locations, row by row."""
+    return _rows(lat, cell_size) * _ncols(cell_size) + _cols(lon, cell_size)
@@ -0,0 +1,74 @@
+""" Totals of per-fire emissions over geographic regions. """
+
+import numpy as np
+import pandas as pd
+
+
+# Regions summarized in the speciation log, keyed by name. Each region is a
+# (south, north, west, east) box in degrees, and includes its edges.
+DEFAULT_REGIONS = {
+    "Western US": (24, 49, -125, -100),
+    "Eastern US": (24, 49, -100, -60),
+    "Canada/Alaska": (49, 70, -170, -55),
+    "Mexico/Central America": (10, 28, -120, -65),
+}
+
+
+def region_totals(fire, columns, regions=None, lat="lat", lon="longi"):
+    """Total per-fire values over each of a set of regions.
+
+    Regions may overlap, so a fire can count towards more than one region.
+    All region and column totals are found in one pass, as the product of a
+    (fire x region) membership matrix with the (fire x column) values.
+
+    Args:
+        fire (DataFrame) - per-fire values, e.g. as written by
+            get_emissions()
+        columns (list) - names of the columns of fire to total
+        regions (dict) - optional regions keyed by name, each a
+            (south, north, west, east) box in degrees. If None,
+            DEFAULT_REGIONS are used.
+        lat (str) - name of the latitude column of fire
+        lon (str) - name of the longitude column of fire
+
+    Returns:
+        A DataFrame of totals, with one row for each region and one column
+        for each of columns.
+    """
+    if regions is None:
+        regions = DEFAULT_REGIONS
+    membership = region_membership(fire[lat].values, fire[lon].values, regions)
+    values = fire[list(columns)].to_numpy(dtype=float)
+    weights = membership.T.astype(float)
+    # a missing value only makes the totals of its own regions missing
+    missing = np.isnan(values)
+    totals = weights.dot(np.where(missing, 0.0, values))
+    totals[weights.dot(missing) > 0] = np.nan
+    return pd.DataFrame(
+        totals,
+        index=pd.Index(list(regions), name="region"),
+        columns=list(columns),
+    )
+
+
+def region_membership(lat, lon, regions):
+    """Find the regions that contain each fire.
+
+    Args:
+        lat, lon (array) - fire latitudes and longitudes in degrees
+        regions (dict) - regions keyed by name, see region_totals()
+
+    Returns:
+        A boolean array indexed by [fire, region], in the order of regions.
+    """
+    lat = np.asarray(lat, dtype=float)[:, None]
+    lon = np.asarray(lon, dtype=float)[:, None]
+    bounds = np.array(list(regions.values()), dtype=float).reshape(-1, 4)
+    south, north, west, east = bounds.T
+    for name, (s, n, w, e) in zip(regions, bounds):
+        if s > n or w > e:
+            raise ValueError(
+                "region {!r} must be (south, north, west, east), got "
+                "{}".format(name, regions[name])
+            )
+    return (lat >= south) & (lat <= north) & (lon >= west) & (lon <= east)
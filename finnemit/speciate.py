@@ -1,61 +1,221 @@
 """ Speciation conversions. """
 
+import os
+import shutil
 import pkg_resources
+import numpy as np
 import pandas as pd
-import re
 
+from .cache import file_digest, open_cache
+from .finnemit import _cast_floats
+from .io import derived_path, file_format, read_table, write_table
+from .regions import region_totals
 
-def speciate(infile, outfile=None, sfile=None):
+
+# Columns read from the per-fire emissions file
+EMISSION_COLUMNS = [
+    "longi",
+    "lat",
+    "polyid",
+    "fireid",
+    "jd",
+    "genLC",
+    "area",
+    "bmass",
+    "CO",
+    "NOx",
+    "NO",
+    "NO2",
+    "NH3",
+    "SO2",
+    "NMOC",
+    "PM25",
+    "PM10",
+    "OC",
+    "BC",
+]
+
+
+# Speciation profile columns, keyed by the generic land cover (genveg) code
+# they apply to
+PROFILE_COLUMNS = {
+    1: "Savanna",
+    2: "Shrub",
+    3: "TropFor",
+    4: "TempFor",
+    5: "Boreal",
+    6: "TempFor",
+    9: "Crop",
+}
+
+# Per-fire emission columns totalled by region in the log, keyed by the
+# label the log gives them
+LOG_COLUMNS = {
+    "CO": "CO",
+    "NOX": "NOx",
+    "NO": "NO",
+    "NO2": "NO2",
+    "NH3": "NH3",
+    "SO2": "SO2",
+    "VOC": "NMOC",
+    "OC": "OC",
+    "BC": "BC",
+    "PM2.5": "PM25",
+    "PM10": "PM10",
+}
+
+# MOZART4 species totalled in the log: (species, label, molecular weight
+# for a total in Tg, or None)
+MOZART_LOG_SPECIES = [
+    ("BIGENE", "The total BIGENE emissio (moles) = ", None),
+    ("C2H6", "The total C2H6 emissions (moles) = ", 30.07),
+    ("MEK", "The total MEK emissions (moles) = ", None),
+    ("TOLUENE", "The total TOLUENE emiss (moles) = ", 90.1),
+    ("CH2O", "The total CH2O emissions (moles) = ", 30.3),
+    ("HCOOH", "The total HCOOH emissions (moles) = ", 47.02),
+    ("C2H2", "The total C2H2 emissions (moles) = ", 26.04),
+    ("GLYALD", "The total GLYALD emissions (moles) = ", None),
+    ("ISOP", "The total ISOPRENE emissions (moles) = ", 68.12),
+    ("HCN", "The total HCN emissions (moles) = ", 27.025),
+    ("CH3CN", "The total CH3CN emissions (moles) = ", 41.05),
+    ("CH3OH", "The total CH3OH emissions (moles) = ", 32.04),
+    ("C2H4", "The total C2H4 emissions (moles) = ", 28.05),
+]
+
+
+def speciate(
+    infile,
+    outfile=None,
+    sfile=None,
+    return_df=False,
+    columns=None,
+    float_dtype=None,
+    regions=None,
+    cache=None,
+    precision=None,
+):
     """Get speciated estimates with FINN
 
     Args:
-        infile (str) - path to input file (this should be an outfile file
-            written by the get_emissions() function).
+        infile (str or DataFrame) - path to input file (this should be an
+            outfile file written by the get_emissions() function, in csv,
+            Parquet or Arrow/Feather format), or a DataFrame of per-fire
+            emissions like the one returned by
+            get_emissions(..., return_df=True).
         outfile (str) - optional path to output file. If None, then this is
-            constructed by appending '_species' to the input filename.
+            constructed by appending '_species' to the input filename. If
+            None and infile is a DataFrame, no files are written. The
+            format is taken from the extension, as for infile.
         sfile (str) - optional path to a speciation file. This must be
             formatted like the file finnemit/data/speciation.csv.
+        return_df (bool) - if True, return the speciated DataFrame.
+        columns (list) - optional names of the columns to write to outfile
+        float_dtype (str) - optional dtype for the floating point columns
+            of outfile, e.g. 'float32'.
+        regions (dict) - optional regions to total emissions over in the
+            log file, keyed by name, each a (south, north, west, east) box
+            in degrees. If None, the regions in
+            finnemit.regions.DEFAULT_REGIONS are used.
+        cache (str or ResultCache) - optional cache, or path to a cache
+            directory, see finnemit.cache. If the same input file contents
+            have been speciated before with the same speciation file and
+            options, the cached output and log files are used instead of
+            speciating again. DataFrame inputs are not cached.
+        precision (str) - optional precision, 'float64' or 'float32', to
+            speciate in. If None, the precision of the per-fire emissions is
+            kept, e.g. float32 for get_emissions(..., precision='float32').
+            Log totals are always accumulated in float64.
 
     Returns:
-        A dictionary summarizing emission totals, and writes a file to outfile.
+        The speciated DataFrame if return_df is True, and writes a file to
+        outfile along with a log file summarizing the results.
     """
-    if sfile is None:
-        sfile = pkg_resources.resource_filename("finnemit", "data/speciation.csv")
-    speciate = pd.read_csv(sfile)
-
-    sav = speciate["Savanna"]
-    boreal = speciate["Boreal"]
-    tempfor = speciate["TempFor"]
-    tropfor = speciate["TropFor"]
-    shrub = speciate["Shrub"]
-    ag = speciate["Crop"]
-
-    if outfile is None:
-        outfile = re.sub("\\.csv$", "_species.csv", infile)
-
-    fire = pd.read_csv(infile)
-    longi = fire["longi"]
-    lati = fire["lat"]
-    polyid = fire["polyid"]
-    fireid = fire["fireid"]
-    jday = fire["jd"]
-    lct = fire["lct"]
+    sfile = _speciation_file(sfile)
+
+    cache = open_cache(cache)
+    if isinstance(infile, pd.DataFrame):
+        cache = None
+    if cache is not None:
+        if outfile is None:
+            outfile = derived_path(infile, "_species")
+        logfile_name = derived_path(outfile, "_log", ".txt")
+        # the log names the input and speciation files, so they are part
+        # of the key as well as their contents
+        key = cache.key(
+            "speciate",
+            file_digest(infile),
+            infile,
+            file_digest(sfile),
+            sfile,
+            file_format(outfile),
+            columns,
+            float_dtype,
+            regions,
+            precision,
+        )
+        hit = cache.lookup(key)
+        if hit is not None and (not return_df or "out_df" in hit[1]):
+            entry, data = hit
+            shutil.copyfile(os.path.join(entry, "output"), outfile)
+            shutil.copyfile(os.path.join(entry, "log"), logfile_name)
+            if return_df:
+                return data["out_df"]
+            return
+
+    if isinstance(infile, pd.DataFrame):
+        fire = infile
+    else:
+        if outfile is None:
+            outfile = derived_path(infile, "_species")
+        fire = read_table(infile, columns=EMISSION_COLUMNS)
+    if precision is not None:
+        fire = _cast_floats(fire, precision)
+
+    out_df = speciate_emissions(fire, sfile)
+
+    if outfile is not None:
+        # Save output
+        write_table(out_df, outfile, columns=columns, float_dtype=float_dtype)
+        # Generate log
+        logfile_name = derived_path(outfile, "_log", ".txt")
+        if isinstance(infile, pd.DataFrame):
+            infile = "(in memory)"
+        _write_log(logfile_name, infile, sfile, fire, out_df, regions)
+
+    if cache is not None:
+        data = {}
+        if return_df:
+            data["out_df"] = out_df
+        cache.store(key, {"output": outfile, "log": logfile_name}, data)
+
+    if return_df:
+        return out_df
+
+
+def speciate_emissions(fire, sfile=None):
+    """Speciate per-fire emissions held in memory.
+
+    Args:
+        fire (DataFrame) - per-fire emissions, with the columns written by
+            get_emissions()
+        sfile (str) - optional path to a speciation file. This must be
+            formatted like the file finnemit/data/speciation.csv.
+
+    Returns:
+        A DataFrame of speciated emissions, with the same index as fire, in
+        the precision of fire's 'NMOC' column.
+    """
+    sfile = _speciation_file(sfile)
+    species, profiles = _read_profiles(sfile)
+    profiles = profiles.astype(fire["NMOC"].dtype)
+
     genveg = fire["genLC"]
     CO = fire["CO"]
-    NOX = fire["NOx"]
+    NH3 = fire["NH3"]
     NO = fire["NO"]
     NO2 = fire["NO2"]
-    NH3 = fire["NH3"]
     SO2 = fire["SO2"]
     VOC = fire["NMOC"]
-    PM25 = fire["PM25"]
-    PM10 = fire["PM10"]
-    OC = fire["OC"]
-    BC = fire["BC"]
-    area = fire["area"]
-    bmass = fire["bmass"]
-
-    nfires = fire.shape[0]
 
     # Convert orignial emissions converted to mole/km2/day
     COemis = CO * 1000.0 / 28.01
@@ -64,425 +224,161 @@ def speciate(infile, outfile=None, sfile=None):
     NO2emis = NO2 * 1000 / 46.01
     SO2emis = SO2 * 1000 / 64.06
 
+    # Speciate VOC emissions: each fire's VOC (kg) times the MOZ4 profile
+    # of its generic land cover gives moles of each MOZ4 species
+    voc = pd.DataFrame(
+        VOC.values[:, None] * profiles[_profile_index(genveg.values)],
+        columns=species,
+        index=fire.index,
+    )
+
     # some are not converted
-    NOXemis = NOX
-    VOCemis = VOC
-    OCemis = OC
-    BCemis = BC
-    PM25emis = PM25
-    PM10emis = PM10
-
-    # set up empty speciated VOC arrays
-    APINemis = [None] * nfires
-    BENZENEemis = [None] * nfires
-    BIGALKemis = [None] * nfires
-    BIGENEemis = [None] * nfires
-    BPINemis = [None] * nfires
-    BZALDemis = [None] * nfires
-    C2H2emis = [None] * nfires
-    C2H4emis = [None] * nfires
-    C2H6emis = [None] * nfires
-    C3H6emis = [None] * nfires
-    C3H8emis = [None] * nfires
-    CH2Oemis = [None] * nfires
-    CH3CH2OHemis = [None] * nfires
-    CH3CHOemis = [None] * nfires
-    CH3CNemis = [None] * nfires
-    CH3COCH3emis = [None] * nfires
-    CH3COOHemis = [None] * nfires
-    CH3OHemis = [None] * nfires
-    CRESOLemis = [None] * nfires
-    GLYALDemis = [None] * nfires
-    HCNemis = [None] * nfires
-    HCOOHemis = [None] * nfires
-    HONOemis = [None] * nfires
-    HYACemis = [None] * nfires
-    ISOPemis = [None] * nfires
-    LIMONemis = [None] * nfires
-    MACRemis = [None] * nfires
-    MEKemis = [None] * nfires
-    MGLYemis = [None] * nfires
-    MVKemis = [None] * nfires
-    MYRCemis = [None] * nfires
-    PHENOLemis = [None] * nfires
-    TOLUENEemis = [None] * nfires
-    XYLENEemis = [None] * nfires
-    XYLOLemis = [None] * nfires
-
-    for i in range(nfires):
-        if genveg[i] in [7, 8, 11, 12]:
-            raise ValueError("Invalid vegetation type")
-
-        if genveg[i] == 1:
-            convert2MOZ4 = sav
-        if genveg[i] == 2:
-            convert2MOZ4 = shrub
-        if genveg[i] == 3:
-            convert2MOZ4 = tropfor
-        if genveg[i] == 4:
-            convert2MOZ4 = tempfor
-        if genveg[i] == 5:
-            convert2MOZ4 = boreal
-        if genveg[i] == 6:
-            convert2MOZ4 = tempfor
-        if genveg[i] == 9:
-            convert2MOZ4 = ag
-
-        # Speciate VOC emissoins.
-        # VOC is in kg and the output of this is mole MOZ4 species
-        # 0 APIN
-        # 1 BENZENE
-        # 2 BIGALK
-        # 3 BIGENE
-        # 4 BPIN
-        # 5 BZALD
-        # 6 C2H2
-        # 7 C2H4
-        # 8 C2H6
-        # 9 C3H6
-        # 10  C3H8
-        # 11  CH2O
-        # 12  CH3CH2OH
-        # 13  CH3CHO
-        # 14  CH3CN
-        # 15  CH3COCH3
-        # 16  CH3COOH
-        # 17  CH3OH
-        # 18  CRESOL
-        # 19  GLYALD
-        # 20  HCN
-        # 21  HCOOH
-        # 22  HONO
-        # 23  HYAC
-        # 24  ISOP
-        # 25  LIMON
-        # 26  MACR
-        # 27  MEK
-        # 28  MGLY
-        # 29  MVK
-        # 30  MYRC
-        # 31  PHENOL
-        # 32  TOLUENE
-        # 33  XYLENE
-        # 34  XYLOL
-        APINemis[i] = VOC[i] * convert2MOZ4[0]
-        BENZENEemis[i] = VOC[i] * convert2MOZ4[1]
-        BIGALKemis[i] = VOC[i] * convert2MOZ4[2]
-        BIGENEemis[i] = VOC[i] * convert2MOZ4[3]
-        BPINemis[i] = VOC[i] * convert2MOZ4[4]
-        BZALDemis[i] = VOC[i] * convert2MOZ4[5]
-        C2H2emis[i] = VOC[i] * convert2MOZ4[6]
-        C2H4emis[i] = VOC[i] * convert2MOZ4[7]
-        C2H6emis[i] = VOC[i] * convert2MOZ4[8]
-        C3H6emis[i] = VOC[i] * convert2MOZ4[9]
-        C3H8emis[i] = VOC[i] * convert2MOZ4[10]
-        CH2Oemis[i] = VOC[i] * convert2MOZ4[11]
-        CH3CH2OHemis[i] = VOC[i] * convert2MOZ4[12]
-        CH3CHOemis[i] = VOC[i] * convert2MOZ4[13]
-        CH3CNemis[i] = VOC[i] * convert2MOZ4[14]
-        CH3COCH3emis[i] = VOC[i] * convert2MOZ4[15]
-        CH3COOHemis[i] = VOC[i] * convert2MOZ4[16]
-        CH3OHemis[i] = VOC[i] * convert2MOZ4[17]
-        CRESOLemis[i] = VOC[i] * convert2MOZ4[18]
-        GLYALDemis[i] = VOC[i] * convert2MOZ4[19]
-        HCNemis[i] = VOC[i] * convert2MOZ4[20]
-        HCOOHemis[i] = VOC[i] * convert2MOZ4[21]
-        HONOemis[i] = VOC[i] * convert2MOZ4[22]
-        HYACemis[i] = VOC[i] * convert2MOZ4[23]
-        ISOPemis[i] = VOC[i] * convert2MOZ4[24]
-        LIMONemis[i] = VOC[i] * convert2MOZ4[25]
-        MACRemis[i] = VOC[i] * convert2MOZ4[26]
-        MEKemis[i] = VOC[i] * convert2MOZ4[27]
-        MGLYemis[i] = VOC[i] * convert2MOZ4[28]
-        MVKemis[i] = VOC[i] * convert2MOZ4[29]
-        MYRCemis[i] = VOC[i] * convert2MOZ4[30]
-        PHENOLemis[i] = VOC[i] * convert2MOZ4[31]
-        TOLUENEemis[i] = VOC[i] * convert2MOZ4[32]
-        XYLENEemis[i] = VOC[i] * convert2MOZ4[33]
-        XYLOLemis[i] = VOC[i] * convert2MOZ4[34]
-
-    # Save output as csv file
     out_data = {
-        "day": jday,
-        "polyid": polyid,
-        "fireid": fireid,
+        "day": fire["jd"],
+        "polyid": fire["polyid"],
+        "fireid": fire["fireid"],
         "genveg": genveg,
-        "lati": lati,
-        "longi": longi,
-        "area": area,
-        "bmass": bmass,
+        "lati": fire["lat"],
+        "longi": fire["longi"],
+        "area": fire["area"],
+        "bmass": fire["bmass"],
         "CO": COemis,
-        "NOx": NOXemis,
+        "NOx": fire["NOx"],
         "NO": NOemis,
         "NO2": NO2emis,
         "SO2": SO2emis,
         "NH3": NH3emis,
-        "PM25": PM25emis,
-        "OC": OCemis,
-        "BC": BCemis,
-        "PM10": PM10emis,
-        "NMOC": VOCemis,
-        "APIN": APINemis,
-        "BENZENE": BENZENEemis,
-        "BIGALK": BIGALKemis,
-        "BIGENE": BIGENEemis,
-        "BPIN": BPINemis,
-        "BZALD": BZALDemis,
-        "C2H2": C2H2emis,
-        "C2H4": C2H4emis,
-        "C2H6": C2H6emis,
-        "C3H6": C3H6emis,
-        "C3H8": C3H8emis,
-        "CH2O": CH2Oemis,
-        "CH3CH2OH": CH3CH2OHemis,
-        "CH3CHO": CH3CHOemis,
-        "CH3CN": CH3CNemis,
-        "CH3COCH3": CH3COCH3emis,
-        "CH3COOH": CH3COOHemis,
-        "CH3OH": CH3OHemis,
-        "CRESOL": CRESOLemis,
-        "GLYALD": GLYALDemis,
-        "HCN": HCNemis,
-        "HCOOH": HCOOHemis,
-        "HONO": HONOemis,
-        "HYAC": HYACemis,
-        "ISOP": ISOPemis,
-        "LIMON": LIMONemis,
-        "MACR": MACRemis,
-        "MEK": MEKemis,
-        "MGLY": MGLYemis,
-        "MVK": MVKemis,
-        "MYRC": MYRCemis,
-        "PHENOL": PHENOLemis,
-        "TOLUENE": TOLUENEemis,
-        "XYLENE": XYLENEemis,
-        "XYLOL": XYLOLemis,
+        "PM25": fire["PM25"],
+        "OC": fire["OC"],
+        "BC": fire["BC"],
+        "PM10": fire["PM10"],
+        "NMOC": VOC,
     }
+    return pd.concat([pd.DataFrame(data=out_data), voc], axis=1)
+
 
-    out_df = pd.DataFrame(data=out_data)
-    out_df.to_csv(outfile)
+def _write_log(logfile, infile, sfile, fire, out_df, regions=None):
+    """Write a log file summarizing speciated emissions."""
+    # each total is found once, rather than with a Python sum per line, and
+    # in float64 whatever the precision of the emissions
+    fire_total = _totals(fire, list(LOG_COLUMNS.values()))
+    species = ["CO", "NO", "NO2", "SO2", "NH3", "OC", "BC", "PM25", "PM10"]
+    species += [name for name, _, _ in MOZART_LOG_SPECIES]
+    total = _totals(out_df, species)
 
-    # Generate log
-    logfile_name = re.sub("\\.csv$", "_log.txt", outfile)
-    with open(logfile_name, "w") as log:
+    with open(logfile, "w") as log:
         log.write(" " + "\n")
-        log.write("The input file was: " + infile + "\n")
+        log.write("The input file was: " + str(infile) + "\n")
         log.write("The speciation file was: " + sfile + "\n")
         log.write(" " + "\n")
         log.write("Original from fire emissions model before speciation" + "\n")
         log.write(
             "The total CO emissions (moles, Tg) =  "
-            + str(sum(COemis))
+            + str(total["CO"])
             + ","
-            + str(sum(CO) / 1.0e9)
+            + str(fire_total["CO"] / 1.0e9)
             + "\n"
         )
         log.write(
             "The total NO emissions (moles, Tg) =  "
-            + str(sum(NOemis))
-            + ","
-            + str(sum(NO) / 1.0e9)
-            + "\n"
-        )
-        log.write(
-            "The total NOx emissions (Tg) = " + str(sum(NOX) / 1.0e9) + "\n"
-        )
-        log.write(
-            "The total NO2 emissions (moles, Tg) = "
-            + str(sum(NO2emis))
-            + ","
-            + str(sum(NO2) / 1.0e9)
-            + "\n"
-        )
-        log.write(
-            "The total SO2 emissions (moles, Tg) = "
-            + str(sum(SO2emis))
+            + str(total["NO"])
             + ","
-            + str(sum(SO2) / 1.0e9)
+            + str(fire_total["NO"] / 1.0e9)
             + "\n"
         )
         log.write(
-            "The total NH3 emissions (moles, Tg) = "
-            + str(sum(NH3emis))
-            + ","
-            + str(sum(NH3) / 1.0e9)
+            "The total NOx emissions (Tg) = "
+            + str(fire_total["NOx"] / 1.0e9)
             + "\n"
         )
+        for species in ["NO2", "SO2", "NH3"]:
+            log.write(
+                "The total {} emissions (moles, Tg) = ".format(species)
+                + str(total[species])
+                + ","
+                + str(fire_total[species] / 1.0e9)
+                + "\n"
+            )
         log.write(
-            "The total VOC emissions (Tg) = " + str(sum(VOC) / 1.0e9) + "\n"
-        )
-        log.write(
-            "The total OC emissions (Tg) = " + str(sum(OCemis) / 1.0e9) + "\n"
-        )
-        log.write(
-            "The total BC emissions (Tg) = " + str(sum(BCemis) / 1.0e9) + "\n"
-        )
-        log.write(
-            "The total PM10 emissions (Tg) = "
-            + str(sum(PM10emis) / 1.0e9)
-            + "\n"
-        )
-        log.write(
-            "The total PM2.5 emissions (Tg) = "
-            + str(sum(PM25emis) / 1.0e9)
+            "The total VOC emissions (Tg) = "
+            + str(fire_total["NMOC"] / 1.0e9)
             + "\n"
         )
+        for label, species in [
+            ("OC", "OC"),
+            ("BC", "BC"),
+            ("PM10", "PM10"),
+            ("PM2.5", "PM25"),
+        ]:
+            log.write(
+                "The total {} emissions (Tg) = ".format(label)
+                + str(total[species] / 1.0e9)
+                + "\n"
+            )
         log.write(" " + "\n")
         log.write("SUMMARY FROM MOZART4 speciation" + "\n")
-        log.write(
-            "The total BIGENE emissio (moles) = " + str(sum(BIGENEemis)) + "\n"
-        )
-        log.write(
-            "The total C2H6 emissions (moles) = "
-            + str(sum(C2H6emis))
-            + ", and in Tg = "
-            + str(sum(C2H6emis) * 30.07 / 1.0e12)
-            + "\n"
-        )
-        log.write(
-            "The total MEK emissions (moles) = " + str(sum(MEKemis)) + "\n"
-        )
-        log.write(
-            "The total TOLUENE emiss (moles) = "
-            + str(sum(TOLUENEemis))
-            + ", and in Tg = "
-            + str(sum(TOLUENEemis) * 90.1 / 1.0e12)
-            + "\n"
-        )
-        log.write(
-            "The total CH2O emissions (moles) = "
-            + str(sum(CH2Oemis))
-            + ", and in Tg = "
-            + str(sum(CH2Oemis) * 30.3 / 1.0e12)
-            + "\n"
-        )
-        log.write(
-            "The total HCOOH emissions (moles) = "
-            + str(sum(HCOOHemis))
-            + ", and in Tg = "
-            + str(sum(HCOOHemis) * 47.02 / 1.0e12)
-            + "\n"
-        )
-        log.write(
-            "The total C2H2 emissions (moles) = "
-            + str(sum(C2H2emis))
-            + ", and in Tg = "
-            + str(sum(C2H2emis) * 26.04 / 1.0e12)
-            + "\n"
-        )
-        log.write(
-            "The total GLYALD emissions (moles) = "
-            + str(sum(GLYALDemis))
-            + "\n"
-        )
-        log.write(
-            "The total ISOPRENE emissions (moles) = "
-            + str(sum(ISOPemis))
-            + ", and in Tg = "
-            + str(sum(ISOPemis) * 68.12 / 1.0e12)
-            + "\n"
-        )
-        log.write(
-            "The total HCN emissions (moles) = "
-            + str(sum(HCNemis))
-            + ", and in Tg = "
-            + str(sum(HCNemis) * 27.025 / 1.0e12)
-            + "\n"
-        )
-        log.write(
-            "The total CH3CN emissions (moles) = "
-            + str(sum(CH3CNemis))
-            + ", and in Tg = "
-            + str(sum(CH3CNemis) * 41.05 / 1.0e12)
-            + "\n"
-        )
-        log.write(
-            "The total CH3OH emissions (moles) = "
-            + str(sum(CH3OHemis))
-            + ", and in Tg = "
-            + str(sum(CH3OHemis) * 32.04 / 1.0e12)
-            + "\n"
-        )
-        log.write(
-            "The total C2H4 emissions (moles) = "
-            + str(sum(C2H4emis))
-            + ", and in Tg = "
-            + str(sum(C2H4emis) * 28.05 / 1.0e12)
-            + "\n"
-        )
+        for species, label, weight in MOZART_LOG_SPECIES:
+            line = label + str(total[species])
+            if weight is not None:
+                tg = total[species] * weight / 1.0e12
+                line += ", and in Tg = " + str(tg)
+            log.write(line + "\n")
         log.write("" + "\n")
         log.write("" + "\n")
 
         # regional sums
         log.write("GLOBAL TOTALS (Tg Species)" + "\n")
-        log.write("CO, " + str(sum(CO) / 1.0e9) + "\n")
-        log.write("NOX, " + str(sum(NOX) / 1.0e9) + "\n")
-        log.write("NO, " + str(sum(NO) / 1.0e9) + "\n")
-        log.write("NO2, " + str(sum(NO2) / 1.0e9) + "\n")
-        log.write("NH3, " + str(sum(NH3) / 1.0e9) + "\n")
-        log.write("SO2, " + str(sum(SO2) / 1.0e9) + "\n")
-        log.write("VOC, " + str(sum(VOC) / 1.0e9) + "\n")
-        log.write("OC, " + str(sum(OC) / 1.0e9) + "\n")
-        log.write("BC, " + str(sum(BC) / 1.0e9) + "\n")
-        log.write("PM2.5, " + str(sum(PM25) / 1.0e9) + "\n")
-        log.write("PM20, " + str(sum(PM10) / 1.0e9) + "\n")
-
-        # WESTERN U.S.
-        westUS = (lati.between(24, 49) & longi.between(-125, -100)).values
-        log.write("Western US (Gg Species)" + "\n")
-        log.write("CO, " + str(sum(CO[westUS]) / 1.0e6) + "\n")
-        log.write("NOX, " + str(sum(NOX[westUS]) / 1.0e6) + "\n")
-        log.write("NO, " + str(sum(NO[westUS]) / 1.0e6) + "\n")
-        log.write("NO2, " + str(sum(NO2[westUS]) / 1.0e6) + "\n")
-        log.write("NH3, " + str(sum(NH3[westUS]) / 1.0e6) + "\n")
-        log.write("SO2, " + str(sum(SO2[westUS]) / 1.0e6) + "\n")
-        log.write("VOC, " + str(sum(VOC[westUS]) / 1.0e6) + "\n")
-        log.write("OC, " + str(sum(OC[westUS]) / 1.0e6) + "\n")
-        log.write("BC, " + str(sum(BC[westUS]) / 1.0e6) + "\n")
-        log.write("PM2.5, " + str(sum(PM25[westUS]) / 1.0e6) + "\n")
-        log.write("PM10, " + str(sum(PM10[westUS]) / 1.0e6) + "\n")
-
-        # EASTERN U.S.
-        eastUS = (lati.between(24, 49) & longi.between(-100, -60)).values
-        log.write("Eastern US (Gg Species)" + "\n")
-        log.write("CO, " + str(sum(CO[eastUS]) / 1.0e6) + "\n")
-        log.write("NOX, " + str(sum(NOX[eastUS]) / 1.0e6) + "\n")
-        log.write("NO, " + str(sum(NO[eastUS]) / 1.0e6) + "\n")
-        log.write("NO2, " + str(sum(NO2[eastUS]) / 1.0e6) + "\n")
-        log.write("NH3, " + str(sum(NH3[eastUS]) / 1.0e6) + "\n")
-        log.write("SO2, " + str(sum(SO2[eastUS]) / 1.0e6) + "\n")
-        log.write("VOC, " + str(sum(VOC[eastUS]) / 1.0e6) + "\n")
-        log.write("OC, " + str(sum(OC[eastUS]) / 1.0e6) + "\n")
-        log.write("BC, " + str(sum(BC[eastUS]) / 1.0e6) + "\n")
-        log.write("PM2.5, " + str(sum(PM25[eastUS]) / 1.0e6) + "\n")
-        log.write("PM10, " + str(sum(PM10[eastUS]) / 1.0e6) + "\n")
-
-        # CANADA/AK
-        CANAK = (lati.between(49, 70) & longi.between(-170, -55)).values
-        log.write("Canada/Alaska (Gg Species)" + "\n")
-        log.write("CO, " + str(sum(CO[CANAK]) / 1.0e6) + "\n")
-        log.write("NOX, " + str(sum(NOX[CANAK]) / 1.0e6) + "\n")
-        log.write("NO, " + str(sum(NO[CANAK]) / 1.0e6) + "\n")
-        log.write("NO2, " + str(sum(NO2[CANAK]) / 1.0e6) + "\n")
-        log.write("NH3, " + str(sum(NH3[CANAK]) / 1.0e6) + "\n")
-        log.write("SO2, " + str(sum(SO2[CANAK]) / 1.0e6) + "\n")
-        log.write("VOC, " + str(sum(VOC[CANAK]) / 1.0e6) + "\n")
-        log.write("OC, " + str(sum(OC[CANAK]) / 1.0e6) + "\n")
-        log.write("BC, " + str(sum(BC[CANAK]) / 1.0e6) + "\n")
-        log.write("PM2.5, " + str(sum(PM25[CANAK]) / 1.0e6) + "\n")
-        log.write("PM10, " + str(sum(PM10[CANAK]) / 1.0e6) + "\n")
-
-        # Mexico and Central America
-        MXCA = (lati.between(10, 28) & longi.between(-120, -65)).values
-        log.write("Mexico/Central America (Gg Species)" + "\n")
-        log.write("CO, " + str(sum(CO[MXCA]) / 1.0e6) + "\n")
-        log.write("NOX, " + str(sum(NOX[MXCA]) / 1.0e6) + "\n")
-        log.write("NO, " + str(sum(NO[MXCA]) / 1.0e6) + "\n")
-        log.write("NO2, " + str(sum(NO2[MXCA]) / 1.0e6) + "\n")
-        log.write("NH3, " + str(sum(NH3[MXCA]) / 1.0e6) + "\n")
-        log.write("SO2, " + str(sum(SO2[MXCA]) / 1.0e6) + "\n")
-        log.write("VOC, " + str(sum(VOC[MXCA]) / 1.0e6) + "\n")
-        log.write("OC, " + str(sum(OC[MXCA]) / 1.0e6) + "\n")
-        log.write("BC, " + str(sum(BC[MXCA]) / 1.0e6) + "\n")
-        log.write("PM2.5, " + str(sum(PM25[MXCA]) / 1.0e6) + "\n")
-        log.write("PM10, " + str(sum(PM10[MXCA]) / 1.0e6) + "\n")
+        for label, column in LOG_COLUMNS.items():
+            log.write(label + ", " + str(fire_total[column] / 1.0e9) + "\n")
+
+        regional = region_totals(fire, list(LOG_COLUMNS.values()), regions)
+        for region, region_total in (regional / 1.0e6).iterrows():
+            log.write(region + " (Gg Species)" + "\n")
+            for label, column in LOG_COLUMNS.items():
+                log.write(label + ", " + str(region_total[column]) + "\n")
+
+
+def _totals(df, columns):
+    """Sum columns of df in float64. As with region_totals(), a missing
+    value makes the total of its column missing."""
+    return pd.Series(
+        df[columns].to_numpy(dtype="float64").sum(axis=0),
+        index=columns,
+    )
+
+
+def _speciation_file(sfile):
+    """Path to the speciation file, defaulting to the packaged one."""
+    if sfile is None:
+        sfile = pkg_resources.resource_filename("finnemit", "data/speciation.csv")
+    return sfile
+
+
+def _read_profiles(sfile):
+    """Read a speciation file into a genveg by species profile matrix.
+
+    Args:
+        sfile (str) - path to a speciation file, formatted like the file
+            finnemit/data/speciation.csv
+
+    Returns:
+        A tuple of (list of MOZ4 species names, array of moles of each
+        species per kg VOC, indexed by [genveg, species]). Rows for genveg
+        codes without a profile are NaN.
+    """
+    speciation = pd.read_csv(sfile)
+    species = list(speciation["MOZSPEC"])
+    profiles = np.full((max(PROFILE_COLUMNS) + 1, len(species)), np.nan)
+    for genveg, column in PROFILE_COLUMNS.items():
+        profiles[genveg] = speciation[column].values
+    return species, profiles
+
+
+def _profile_index(genveg):
+    """Check generic land cover codes, and return them as profile rows."""
+    valid = np.isin(genveg, list(PROFILE_COLUMNS))
+    if not valid.all():
+        raise ValueError(
+            "Invalid vegetation type: {}".format(np.unique(genveg[~valid]))
+        )
+    return genveg.astype(int)
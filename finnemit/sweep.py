@@ -0,0 +1,207 @@
+""" Sweeps of one set of fires over many fuel loading and emission factor
+tables.
+
+Fires are read, quality checked and assigned a land cover once. The fuel
+loads, burned biomass and emission totals of every variant are then
+calculated together, as arrays with a first axis of variants.
+"""
+
+import numpy as np
+
+from .finnemit import (
+    EF_INDEX_TEMPERATE_EVERGREEN,
+    EmissionModel,
+    _biomass,
+    _check_cover,
+    _ef_index,
+    _fuel_loads,
+    _land_cover,
+    _read_fires,
+    _select,
+)
+from .io import write_table
+from .timing import StageTimer
+
+# Default memory budget of a chunk of fires, in bytes
+DEFAULT_MEMORY_BYTES = 2 ** 28
+
+# Emission factor rows that fires can be assigned
+NUM_EF_ROWS = EF_INDEX_TEMPERATE_EVERGREEN + 1
+
+# Generic land cover totals of the summary, and the genveg codes they cover
+GENVEG_TOTALS = [
+    ("TOTTROP", [3]),
+    ("TOTTEMP", [4]),
+    ("TOTBOR", [5]),
+    ("TOTSHRUB", [2]),
+    ("TOTCROP", [9]),
+    ("TOTGRAS", [1]),
+]
+
+
+def run_sweep(
+    fires,
+    variants,
+    outfiles=None,
+    columns=None,
+    float_dtype=None,
+    memory_bytes=DEFAULT_MEMORY_BYTES,
+):
+    """Estimate emissions for one set of fires with many fuel loading and
+    emission factor tables.
+
+    This gives the same results as calling get_emissions() once for each
+    variant, but the fires are only read and classified once, and the
+    totals of all variants are calculated together.
+
+    Args:
+        fires (str or DataFrame) - path to a file created with the FINN
+            preprocessor, in any format read by read_table(), or a
+            DataFrame with the same columns
+        variants (list) - (fuelin, emisin) pairs of paths to fuel loading
+            and emission factor files, see get_emissions(), or
+            EmissionModel objects. None in a pair stands for the packaged
+            table. Fuel loading tables must all have the same regions, and
+            models must all emit the same species.
+        outfiles (list) - optional paths to write the per-fire emissions of
+            each variant to, in the same order as variants. A None path, or
+            outfiles of None, skips writing that variant's emissions.
+        columns (list) - optional names of the columns to write to outfiles
+        float_dtype (str) - optional dtype for the floating point columns
+            of outfiles
+        memory_bytes (int) - approximate memory budget of the arrays of a
+            chunk of fires, used to calculate totals
+
+    Returns:
+        A list of dictionaries summarizing the emission totals of each
+        variant, as returned by get_emissions(). Totals are summed in a
+        different order, so can differ from get_emissions() in the last few
+        digits. The timings of the stages shared by all variants are in
+        every summary, and each variant's summary has its own 'write' stage.
+    """
+    timer = StageTimer()
+    with timer.stage("table_load"):
+        models = [
+            variant if isinstance(variant, EmissionModel)
+            else EmissionModel(fuelin=variant[0], emisin=variant[1])
+            for variant in variants
+        ]
+    if outfiles is None:
+        outfiles = [None] * len(models)
+    if len(outfiles) != len(models):
+        raise ValueError(
+            "got {} outfiles for {} variants".format(
+                len(outfiles), len(models)
+            )
+        )
+    if not models:
+        return []
+    shapes = set(model.fuel_load.shape for model in models)
+    if len(shapes) > 1:
+        raise ValueError(
+            "fuel loading tables have different numbers of regions: "
+            "{}".format(sorted(shape[1] for shape in shapes))
+        )
+    if any(model.species != models[0].species for model in models):
+        raise ValueError("every variant must emit the same species")
+
+    infile = fires if isinstance(fires, str) else None
+    with timer.stage("ingest") as stage:
+        fires = _read_fires(fires)
+        numorig = len(fires["jd"])
+        stage.rows = numorig
+    with timer.stage("qa", rows=numorig):
+        cover, keep, counts = _check_cover(fires)
+    with timer.stage("classify") as stage:
+        cover = _land_cover(cover, keep, counts)
+        stage.rows = len(cover["jd"])
+
+    with timer.stage("emissions", rows=len(cover["jd"])):
+        totals = _sweep_totals(models, cover, memory_bytes)
+
+    summaries = []
+    for i, (model, outfile) in enumerate(zip(models, outfiles)):
+        variant_counts = dict(counts)
+        variant_counts["bmass0"] = int(totals["bmass0"][i])
+        variant_totals = dict(
+            (name, values[i]) for name, values in totals.items()
+        )
+        summary = {"input_file": infile, "output_file": outfile}
+        summary.update(model._summary(numorig, variant_counts, variant_totals))
+        summary.update(timer.summary())
+        if outfile is not None:
+            variant_timer = StageTimer()
+            with variant_timer.stage("write") as stage:
+                classified = model._assign_fuel(cover, dict(counts))
+                out_df, _ = model.emit(classified)
+                out_df = out_df.sort_values(by=["jd"], kind="mergesort")
+                write_table(
+                    out_df, outfile, columns=columns, float_dtype=float_dtype
+                )
+                stage.rows = len(out_df)
+            summary.update(variant_timer.summary())
+        summaries.append(summary)
+    return summaries
+
+
+def _sweep_totals(models, cover, memory_bytes):
+    """Sum the biomass, area and emissions of fires for every variant.
+
+    Returns:
+        A dictionary of totals, as accumulated by EmissionModel.emit(), and
+        the 'bmass0' count of fires without a fuel load, each an array with
+        one value per variant.
+    """
+    fuel_load = np.stack([model.fuel_load for model in models])
+    ef = np.stack([model.ef[:NUM_EF_ROWS].astype(float) for model in models])
+    species = models[0].species
+    lct_tree, lct_herb = models[0].lct_tree, models[0].lct_herb
+    nvariants = len(models)
+
+    names = ["bmass", "area", "bmass0"]
+    for name, _ in GENVEG_TOTALS:
+        names.extend([name, name + "area"])
+    totals = dict((name, np.zeros(nvariants)) for name in names)
+    by_row = np.zeros((nvariants, NUM_EF_ROWS))
+    crop_by_row = np.zeros((nvariants, NUM_EF_ROWS))
+
+    # a chunk holds a few (variants, fires) arrays and the one-hot matrix of
+    # its emission factor rows
+    nfires = len(cover["jd"])
+    chunksize = max(
+        1, int(memory_bytes // (8 * (8 * nvariants + NUM_EF_ROWS)))
+    )
+    for start in range(0, nfires, chunksize):
+        chunk = _select(cover, slice(start, start + chunksize))
+        bmass1 = _fuel_loads(fuel_load, chunk)
+        fueled = bmass1 != -1
+        bmass, _, _, _ = _biomass(fuel_load, bmass1, lct_tree, lct_herb, chunk)
+        areanow = chunk["area"] * 1.0e6
+        areanow = areanow - (areanow * (chunk["bare"] / 100.0))
+        area = np.where(fueled, areanow, 0.0)
+        burned = np.where(fueled, bmass / 1000.0 * areanow, 0.0)
+
+        totals["bmass0"] += np.count_nonzero(~fueled, axis=1)
+        totals["bmass"] += burned.sum(axis=1)
+        totals["area"] += area.sum(axis=1)
+        genveg = chunk["genveg"]
+        for name, codes in GENVEG_TOTALS:
+            mask = np.isin(genveg, codes)
+            totals[name] += burned[:, mask].sum(axis=1)
+            totals[name + "area"] += area[:, mask].sum(axis=1)
+
+        rows = np.zeros((len(genveg), NUM_EF_ROWS))
+        rows[np.arange(len(genveg)), _ef_index(chunk["lct"], genveg)] = 1.0
+        by_row += burned.dot(rows)
+        crop = genveg >= 9
+        crop_by_row += burned[:, crop].dot(rows[crop])
+
+    # emissions (kg) = burned biomass (kg) * EF (g/kg) / 1000
+    emissions = np.einsum("vr,vrs->vs", by_row, ef) / 1000.0
+    for i, name in enumerate(species):
+        totals[name] = emissions[:, i]
+    crop_emissions = np.einsum("vr,vrs->vs", crop_by_row, ef) / 1000.0
+    for name in ["CO", "PM25"]:
+        if name in species:
+            totals["TOTCROP" + name] = crop_emissions[:, species.index(name)]
+    return totals
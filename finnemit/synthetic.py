@@ -0,0 +1,144 @@
+""" Synthetic fire inputs, for testing and benchmarking at any scale. """
+
+import numpy as np
+import pandas as pd
+
+from .io import TableWriter
+
+
+# Global regions drawn for synthetic fires: (region, share of fires,
+# (south, north, west, east) box in degrees, day of year of peak burning).
+# The boxes only roughly follow the fuel loading regions, and are only used
+# to give each fire plausible coordinates.
+REGIONS = [
+    (1, 0.06, (25, 65, -160, -60), 200),
+    (2, 0.05, (8, 25, -115, -60), 100),
+    (3, 0.15, (-40, 8, -80, -35), 250),
+    (4, 0.12, (0, 20, -18, 40), 15),
+    (5, 0.19, (-30, 0, 10, 42), 220),
+    (6, 0.02, (35, 60, -10, 30), 210),
+    (7, 0.03, (40, 60, 20, 50), 110),
+    (8, 0.08, (50, 70, 50, 170), 190),
+    (9, 0.09, (20, 50, 75, 135), 90),
+    (10, 0.03, (15, 40, 35, 75), 150),
+    (11, 0.12, (5, 30, 65, 110), 80),
+    (12, 0.05, (-40, -12, 113, 153), 300),
+    (13, 0.01, (-75, -60, -180, 180), 15),
+]
+
+# Share of fires in each MODIS land cover type (LCT) 1-17
+LCT_SHARES = np.array(
+    [3, 8, 1, 3, 4, 2, 8, 14, 20, 15, 2, 12, 2, 4, 0.1, 2, 1], dtype=float
+)
+
+# Dirichlet concentrations of (tree, herb, bare) VCF cover for each LCT 1-17
+VCF_CONCENTRATION = np.array(
+    [
+        [12.0, 5.0, 1.0],  # evergreen needleleaf forest
+        [14.0, 4.0, 1.0],  # evergreen broadleaf forest
+        [10.0, 6.0, 1.0],  # deciduous needleleaf forest
+        [10.0, 6.0, 1.0],  # deciduous broadleaf forest
+        [10.0, 6.0, 1.0],  # mixed forest
+        [4.0, 8.0, 3.0],  # closed shrublands
+        [2.0, 8.0, 5.0],  # open shrublands
+        [6.0, 9.0, 2.0],  # woody savannas
+        [3.0, 10.0, 2.0],  # savannas
+        [1.0, 10.0, 3.0],  # grasslands
+        [3.0, 8.0, 3.0],  # permanent wetlands
+        [1.0, 10.0, 3.0],  # croplands
+        [2.0, 6.0, 6.0],  # urban
+        [3.0, 9.0, 2.0],  # cropland/natural vegetation mosaic
+        [0.5, 2.0, 10.0],  # snow and ice
+        [0.5, 2.0, 10.0],  # barren
+        [2.0, 5.0, 5.0],  # water
+    ]
+)
+
+# Share of fires without a global region, and with VCF fill values that
+# push the total cover above 100%, as in real preprocessor output
+NO_REGION_SHARE = 0.01
+FILL_SHARE = 0.015
+
+
+def synthetic_fires(n, seed=None, year=2016):
+    """Generate random fires in the format of the FINN preprocessor.
+
+    Land cover types, VCF cover, regions, dates and areas are drawn from
+    distributions resembling real fire detections, so that every branch of
+    the emissions model is exercised in realistic proportions.
+
+    Args:
+        n (int) - number of fires
+        seed (int) - optional seed, for a reproducible set of fires
+        year (int) - year of the fire dates
+
+    Returns:
+        A DataFrame with the columns of a preprocessor file.
+    """
+    rng = np.random.RandomState(seed)
+
+    region_ids, shares, boxes, peaks = zip(*REGIONS)
+    shares = np.array(shares) / np.sum(shares)
+    region = rng.choice(len(REGIONS), size=n, p=shares)
+    south, north, west, east = np.array(boxes, dtype=float)[region].T
+    lat = rng.uniform(south, north)
+    lon = rng.uniform(west, east)
+    regnum = np.array(region_ids, dtype=float)[region]
+    regnum[rng.uniform(size=n) < NO_REGION_SHARE] = np.nan
+
+    lct = rng.choice(17, size=n, p=LCT_SHARES / LCT_SHARES.sum()) + 1
+    cover = rng.standard_gamma(VCF_CONCENTRATION[lct - 1])
+    cover = 100.0 * cover / cover.sum(axis=1)[:, None]
+    fill = rng.uniform(size=n) < FILL_SHARE
+    cover[fill] += rng.uniform(0, 100, size=(fill.sum(), 3))
+
+    # burning peaks in a different season in each region
+    ndays = 366 if pd.Timestamp(year, 12, 31).dayofyear == 366 else 365
+    day = np.round(rng.normal(np.array(peaks)[region], 45.0))
+    day = day.astype(int) % ndays
+    dates = np.datetime64("{:04d}-01-01".format(year)) + day
+
+    # several polygons can belong to the same fire
+    new_fire = rng.uniform(size=n) < 0.75
+    new_fire[:1] = True
+
+    return pd.DataFrame(
+        {
+            "polyid": np.arange(1, n + 1),
+            "fireid": np.cumsum(new_fire),
+            "cen_lon": lon,
+            "cen_lat": lat,
+            "acq_date_lst": dates.astype(str),
+            "area_sqkm": 0.7 + rng.lognormal(-0.6, 0.7, size=n),
+            "v_lct": lct,
+            "f_lct": rng.uniform(0.2, 1.0, size=n),
+            "v_tree": cover[:, 0],
+            "v_herb": cover[:, 1],
+            "v_bare": cover[:, 2],
+            "v_regnum": regnum,
+        }
+    )
+
+
+def write_synthetic_fires(path, n, seed=None, year=2016, chunksize=1000000):
+    """Write random fires to a preprocessor file, a chunk at a time.
+
+    Args:
+        path (str) - path to a csv, Parquet or Arrow (Feather) file
+        n (int) - number of fires
+        seed (int) - optional seed, for a reproducible file
+        year (int) - year of the fire dates
+        chunksize (int) - number of fires to generate at a time, which
+            bounds memory use for very large files
+    """
+    rng = np.random.RandomState(seed)
+    with TableWriter(path, index=False) as writer:
+        for start in range(0, n, chunksize):
+            chunk = synthetic_fires(
+                min(chunksize, n - start),
+                seed=rng.randint(2 ** 31 - 1),
+                year=year,
+            )
+            chunk["polyid"] += start
+            chunk["fireid"] += start
+            writer.write(chunk)
@@ -0,0 +1,235 @@
+""" Hourly emissions from daily per-fire emissions. """
+
+import json
+
+import numpy as np
+import pandas as pd
+
+from .grid import bin_cells, cell_index, species_columns
+from .io import TableWriter, derived_path
+
+
+# Share of a fire's daily emissions in each hour of local solar time. Fires
+# smoulder at a low rate overnight, and burn most in the early afternoon.
+DIURNAL_PROFILE = np.array(
+    [
+        0.57, 0.57, 0.57, 0.57, 0.57, 0.57, 0.57, 0.57,
+        0.57, 0.57, 3.0, 5.5, 9.0, 13.0, 15.0, 15.0,
+        12.5, 9.0, 5.5, 3.0, 0.57, 0.57, 0.57, 0.57,
+    ]
+)
+DIURNAL_PROFILE = DIURNAL_PROFILE / DIURNAL_PROFILE.sum()
+
+
+def hourly_emissions(
+    fire,
+    species=None,
+    profiles=None,
+    by=None,
+    utc=True,
+    lat="lat",
+    lon="longi",
+    day="jd",
+):
+    """Spread daily per-fire emissions over the hours of the day, lazily.
+
+    Hours are produced one at a time, each with only the fires burning in
+    that hour (those with a non-zero share of their emissions in it), so
+    the full fire x species x 24 hour table is never held in memory.
+
+    Args:
+        fire (DataFrame) - per-fire daily emissions, as returned by
+            get_emissions() or speciate(). For speciate() output, use
+            lat='lati' and day='day'.
+        species (list) - optional names of the columns to spread over the
+            day. If None, every emitted species column is used.
+        profiles (array or dict) - 24 hourly shares of the daily emissions,
+            in local solar time, or a dictionary of them keyed by the values
+            of the column named by. Each profile is scaled to sum to 1. If
+            None, DIURNAL_PROFILE is used for every fire.
+        by (str) - name of the column used to choose a profile from the
+            profiles dictionary, e.g. 'genLC' (or 'genveg' for speciate()
+            output) for land cover, or 'globreg' for region
+        utc (bool) - if True (default), hours are in UTC, using the local
+            solar time offset of each fire's longitude. Otherwise hours are
+            in each fire's local solar time.
+        lat, lon, day (str) - names of the latitude, longitude and day of
+            year columns of fire
+
+    Yields:
+        A tuple of (day of year, hour, DataFrame of the emissions in that
+        hour) for each hour with burning fires, in time order. The DataFrame
+        has the identifier and location columns of fire, and species
+        columns in the units of fire per hour. In UTC, the first and last
+        days can fall outside the days of fire, e.g. day 0 for the last day
+        of the previous year.
+    """
+    species = species_columns(fire, species)
+    keep = [c for c in ["polyid", "fireid", lat, lon, by] if c is not None]
+    keep = [c for c in dict.fromkeys(keep) if c in fire]
+    ids = fire[keep].reset_index(drop=True)
+    hours = _hourly_values(fire, species, profiles, by, utc, lon, day)
+    for hour, rows, values in hours:
+        hour_df = pd.concat(
+            [
+                ids.iloc[rows].reset_index(drop=True),
+                pd.DataFrame(values, columns=species),
+            ],
+            axis=1,
+        )
+        yield hour // 24 + 1, hour % 24, hour_df
+
+
+def write_hourly_emissions(
+    fire,
+    outfile,
+    grid=None,
+    species=None,
+    profiles=None,
+    by=None,
+    utc=True,
+    lat="lat",
+    lon="longi",
+    day="jd",
+    float_dtype=None,
+    cache_dir=None,
+):
+    """Write hourly emissions straight to a file, one hour at a time.
+
+    Args:
+        fire (DataFrame) - per-fire daily emissions, see hourly_emissions()
+        outfile (str) - path to the output file. Without a grid, this is a
+            csv, Parquet or Arrow (Feather) table with 'day' and 'hour'
+            columns. With a grid, it is a .npy file of gridded emissions
+            indexed by [hour, species, row, column], with metadata in a
+            .json file alongside it, as written by grid_emissions().
+        grid (LatLonGrid or ProjectedGrid) - optional grid to total the
+            hourly emissions on
+        species, profiles, by, utc, lat, lon, day - see hourly_emissions()
+        float_dtype (str) - optional dtype for the emissions. Gridded
+            emissions are float32 by default.
+        cache_dir (str) - optional directory to save fire-to-cell mappings
+            in, see cell_index()
+
+    Returns:
+        A list of the (day of year, hour) tuples written.
+    """
+    species = species_columns(fire, species)
+    if grid is None:
+        hours = hourly_emissions(
+            fire, species, profiles=profiles, by=by, utc=utc, lat=lat,
+            lon=lon, day=day,
+        )
+        written = []
+        with TableWriter(outfile, float_dtype=float_dtype,
+                         index=False) as writer:
+            for day_of_year, hour, hour_df in hours:
+                hour_df.insert(0, "hour", hour)
+                hour_df.insert(0, "day", day_of_year)
+                writer.write(hour_df)
+                written.append((day_of_year, hour))
+        return written
+
+    # the number of hours is known before any are computed
+    start = _start_hours(fire, utc, lon, day)
+    first = int(start.min()) if len(start) else 0
+    nhours = int(start.max()) + 24 - first if len(start) else 0
+    gridded = np.lib.format.open_memmap(
+        outfile,
+        mode="w+",
+        dtype=float_dtype or "float32",
+        shape=(nhours, len(species)) + tuple(grid.shape),
+    )
+    flat = gridded.reshape(nhours, len(species), grid.size)
+    cells = cell_index(grid, fire[lat].values, fire[lon].values, cache_dir)
+    written = []
+    hours = _hourly_values(fire, species, profiles, by, utc, lon, day)
+    for hour, rows, values in hours:
+        inside = cells[rows] >= 0
+        bin_cells(cells[rows][inside], values[inside].T, flat[hour - first])
+        written.append((hour // 24 + 1, hour % 24))
+    gridded.flush()
+
+    metadata = {
+        "hours": [
+            [int(h // 24 + 1), int(h % 24)]
+            for h in range(first, first + nhours)
+        ],
+        "species": species,
+        "grid": grid.to_dict(),
+        "utc": utc,
+    }
+    with open(derived_path(outfile, "", ".json"), "w") as f:
+        json.dump(metadata, f, indent=1)
+    return written
+
+
+def _start_hours(fire, utc, lon, day):
+    """Get the hour each fire's day starts, counted from the start of day 1.
+
+    In UTC, this is shifted by the local solar time offset of the fire's
+    longitude, to the nearest hour.
+    """
+    start = (fire[day].to_numpy(dtype=int) - 1) * 24
+    if utc:
+        start -= np.round(fire[lon].to_numpy(dtype=float) / 15.0).astype(int)
+    return start
+
+
+def _hourly_values(fire, species, profiles, by, utc, lon, day):
+    """Yield the emissions of the fires burning in each hour.
+
+    Yields:
+        A tuple of (hour counted from the start of day 1, positions of the
+        burning fires in fire, emissions indexed by [fire, species]).
+    """
+    profile_table, profile_index = _profiles(fire, profiles, by)
+    start = _start_hours(fire, utc, lon, day)
+    # with fires sorted by start hour, those burning in any hour are the
+    # contiguous block that started in the last 24 hours
+    order = np.argsort(start, kind="mergesort")
+    start = start[order]
+    profile_index = profile_index[order]
+    values = fire[species].to_numpy(dtype=float)[order]
+    if len(start) == 0:
+        return
+    for hour in range(start[0], start[-1] + 24):
+        first = np.searchsorted(start, hour - 23, side="left")
+        last = np.searchsorted(start, hour, side="right")
+        rows = np.arange(first, last)
+        weights = profile_table[profile_index[rows], hour - start[rows]]
+        # fires whose profile is zero in this hour are left out
+        rows = rows[weights > 0]
+        if len(rows) == 0:
+            continue
+        weights = weights[weights > 0]
+        yield hour, order[rows], values[rows] * weights[:, None]
+
+
+def _profiles(fire, profiles, by):
+    """Build a table of normalized profiles, and each fire's row in it."""
+    if profiles is None:
+        profiles = DIURNAL_PROFILE
+    if not isinstance(profiles, dict):
+        table = _normalize(profiles)[None, :]
+        return table, np.zeros(len(fire), dtype=int)
+
+    if by is None:
+        raise ValueError("by must name a column when profiles is a dict")
+    keys = list(profiles)
+    table = np.array([_normalize(profiles[key]) for key in keys])
+    index = pd.Index(keys).get_indexer(fire[by].values)
+    if (index < 0).any():
+        missing = sorted(set(fire[by].values[index < 0]))
+        raise ValueError(
+            "no diurnal profile for {} values {}".format(by, missing)
+        )
+    return table, index
+
+
+def _normalize(profile):
+    """Check a diurnal profile, and scale it to sum to 1."""
+    profile = np.asarray(profile, dtype=float)
+    if profile.shape != (24,) or (profile < 0).any() or profile.sum() <= 0:
+        raise ValueError("a diurnal profile needs 24 non-negative shares")
+    return profile / profile.sum()
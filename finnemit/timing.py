@@ -0,0 +1,115 @@
+""" Wall time and row counts of the stages of a run.
+
+Each stage is logged at INFO level to the 'finnemit.timing' logger when it
+ends, and passed to any metrics hooks added with add_metrics_hook().
+"""
+
+import contextlib
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Stages timed by get_emissions(), in order. Stages repeated over chunks of
+# fires are added up.
+STAGES = [
+    "table_load",
+    "ingest",
+    "qa",
+    "classify",
+    "emissions",
+    "sort",
+    "write",
+]
+
+_metrics_hooks = []
+
+
+def add_metrics_hook(hook):
+    """Call a function at the end of every timed stage.
+
+    Args:
+        hook (callable) - called as hook(stage, seconds, rows), where rows
+            is the number of fires or rows the stage handled, or None. It
+            should return quickly, e.g. by sending the values to a metrics
+            system.
+    """
+    _metrics_hooks.append(hook)
+
+
+def remove_metrics_hook(hook):
+    """Stop calling a function added with add_metrics_hook()."""
+    _metrics_hooks.remove(hook)
+
+
+def _clear_metrics_hooks():
+    """Stop calling every metrics hook, in a worker process that inherited
+    the hooks of its parent. Stages timed in workers are reported by the
+    parent, if at all."""
+    del _metrics_hooks[:]
+
+
+def remove_timings(summary):
+    """Copy a summary dictionary without its stage timings and row counts,
+    e.g. to compare the results of two runs."""
+    return dict(
+        (key, value)
+        for key, value in summary.items()
+        if not key.endswith(("_seconds", "_rows"))
+    )
+
+
+class StageTimer(object):
+    """Record the wall time and row count of each stage of a run.
+
+    Attributes:
+        seconds (dict) - total wall time of each stage, in the order the
+            stages first ran
+        rows (dict) - total number of rows handled by each stage, for the
+            stages that count them
+    """
+
+    def __init__(self):
+        self.seconds = {}
+        self.rows = {}
+
+    @contextlib.contextmanager
+    def stage(self, name, rows=None):
+        """Time a stage, as a context manager.
+
+        The object returned has a 'rows' attribute, which can be set in the
+        body of the with statement once the number of rows is known.
+
+        Args:
+            name (str) - name of the stage, e.g. 'ingest'
+            rows (int) - optional number of rows handled by the stage
+        """
+        record = _Stage(rows)
+        start = time.perf_counter()
+        yield record
+        self.add(name, time.perf_counter() - start, record.rows)
+
+    def add(self, name, seconds, rows=None):
+        """Record a stage timed elsewhere."""
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+        if rows is not None:
+            self.rows[name] = self.rows.get(name, 0) + int(rows)
+            logger.info("%s: %.3f s, %d rows", name, seconds, rows)
+        else:
+            logger.info("%s: %.3f s", name, seconds)
+        for hook in _metrics_hooks:
+            hook(name, seconds, rows)
+
+    def summary(self):
+        """Get summary entries, '<stage>_seconds' and '<stage>_rows'."""
+        summary = {}
+        for name, seconds in self.seconds.items():
+            summary[name + "_seconds"] = seconds
+            if name in self.rows:
+                summary[name + "_rows"] = self.rows[name]
+        return summary
+
+
+class _Stage(object):
+    def __init__(self, rows):
+        self.rows = rows
@@ -0,0 +1,88 @@
+""" Totals of per-fire emissions by day, global region and land cover. """
+
+import numpy as np
+import pandas as pd
+
+from .archive import read_output
+from .grid import species_columns
+
+
+# Columns that get_emissions() output is grouped by: day of year, global
+# region and generic land cover
+GROUP_COLUMNS = ["jd", "globreg", "genLC"]
+
+
+def group_totals(fire, by=None, columns=None):
+    """Total the burned area, biomass and emissions of fires in groups.
+
+    Fires are sorted by group, and each column is summed over the runs of
+    fires in a group with numpy's pairwise summation, whose rounding error
+    grows with the logarithm of the number of fires rather than the number
+    itself, so totals over 10^8 fires stay accurate.
+
+    Args:
+        fire (DataFrame or str) - per-fire emissions as returned by
+            get_emissions(), or a path to a file it wrote
+        by (list) - optional names of the columns to group by. If None,
+            GROUP_COLUMNS.
+        columns (list) - optional names of the species columns to total. If
+            None, every emitted species column is totalled.
+
+    Returns:
+        A tidy DataFrame with one row for each group, sorted by the by
+        columns, and columns of the group, 'num_fires', burned 'area' (m2),
+        'biomass' burned (kg) and each species (kg).
+    """
+    if isinstance(fire, str):
+        fire = read_output(fire)
+    if by is None:
+        by = GROUP_COLUMNS
+    by = list(by)
+    if columns is None:
+        columns = [
+            column for column in species_columns(fire) if column not in by
+        ]
+    missing = [
+        column for column in by + ["area", "bmass"] + list(columns)
+        if column not in fire
+    ]
+    if missing:
+        raise ValueError(
+            "cannot total fires without the columns {}".format(missing)
+        )
+
+    # number the groups, in sorted order of the by columns
+    key = np.zeros(len(fire), dtype="int64")
+    for column in by:
+        codes, values = pd.factorize(fire[column], sort=True)
+        key = key * len(values) + codes
+    # a stable sort of small integers is a radix sort, in linear time
+    key = key.astype(np.min_scalar_type(key.max() if len(key) else 0))
+    order = np.argsort(key, kind="stable")
+    key = key[order]
+    starts = np.flatnonzero(np.r_[len(key) > 0, key[1:] != key[:-1]])
+
+    first = order[starts]
+    totals = pd.DataFrame(
+        dict((column, fire[column].values[first]) for column in by),
+        columns=by,
+    )
+    totals["num_fires"] = np.diff(np.r_[starts, len(key)])
+    area = fire["area"].to_numpy(dtype="float64")[order]
+    totals["area"] = _sum_runs(area, starts)
+    totals["biomass"] = _sum_runs(
+        area * fire["bmass"].to_numpy(dtype="float64")[order], starts
+    )
+    for column in columns:
+        totals[column] = _sum_runs(
+            fire[column].to_numpy(dtype="float64")[order], starts
+        )
+    return totals
+
+
+def _sum_runs(values, starts):
+    """Sum each run of a contiguous array that begins at one of starts."""
+    if len(starts) == 0:
+        return np.zeros(0)
+    # reduceat sums each contiguous run pairwise, as np.sum does
+    return np.add.reduceat(values, starts)
@@ -13,6 +13,8 @@ with open("HISTORY.rst") as history_file:
 
 requirements = ["pandas", "numpy"]
 
+extra_requirements = {"parquet": ["pyarrow"]}
+
 setup_requirements = ["pytest-runner"]
 
 test_requirements = ["pytest"]
@@ -35,6 +37,7 @@ setup(
     ],
     description="Emissions estimates for the FINN fire model",
     install_requires=requirements,
+    extras_require=extra_requirements,
     license="BSD license",
     long_description=readme + "\n\n" + history,
     include_package_data=True,
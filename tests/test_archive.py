@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""Tests for archive module."""
+
+import pkg_resources
+import os
+import shutil
+import numpy as np
+import pandas as pd
+import pytest
+from finnemit import get_emissions
+from finnemit.archive import EmissionArchive, write_archive
+
+
+def test_archive_round_trip(tmpdir):
+    example = pkg_resources.resource_filename("finnemit",
+                                              "data/example-input.csv")
+    outfile = os.path.join(str(tmpdir), "emissions.csv")
+    path = os.path.join(str(tmpdir), "emissions.bin")
+    _, fire = get_emissions(example, outfile, return_df=True)
+    fire = fire.reset_index(drop=True)
+    next_year = fire.copy()
+    next_year["date"] = (
+        pd.to_datetime(fire["date"]) + pd.Timedelta(days=365)
+    ).dt.strftime("%Y-%m-%d")
+
+    write_archive(outfile, path)
+    archive = write_archive(next_year, path, append=True)
+    assert len(archive) == 2 * len(fire)
+    assert archive.days[0] == np.datetime64("2016-05-31")
+    assert archive.days[-1] == np.datetime64("2017-07-31")
+    pd.testing.assert_frame_equal(
+        EmissionArchive(path).to_frame(archive.between("2016-01-01",
+                                                       "2016-12-31")),
+        fire,
+        check_dtype=False,
+    )
+
+    day = archive.day("2016-06-01")
+    assert np.shares_memory(day, archive.records)
+    assert (day["date"] == np.datetime64("2016-06-01")).all()
+    assert len(day) == (fire["date"] == "2016-06-01").sum()
+    assert len(archive.day("2016-01-01")) == 0
+
+    fireid = fire["fireid"].iloc[100]
+    records = archive.fire(fireid)
+    assert len(records) == 2 * (fire["fireid"] == fireid).sum()
+    assert (records["fireid"] == fireid).all()
+    assert (np.diff(records["date"].astype(int)) >= 0).all()
+
+    with pytest.raises(ValueError):
+        write_archive(fire, path, append=True)
+    assert len(EmissionArchive(path)) == 2 * len(fire)
+
+
+def test_interrupted_append(tmpdir):
+    example = pkg_resources.resource_filename("finnemit",
+                                              "data/example-input.csv")
+    outfile = os.path.join(str(tmpdir), "emissions.csv")
+    _, fire = get_emissions(example, outfile, return_df=True)
+    path = os.path.join(str(tmpdir), "emissions.bin")
+    index = os.path.join(str(tmpdir), "emissions.json")
+    first = fire[fire["date"] < "2016-07-01"]
+    write_archive(first, path)
+    shutil.copy(index, index + ".old")
+    write_archive(fire[fire["date"] >= "2016-07-01"], path, append=True)
+    # the append stopped after the fire index, before the day index
+    os.replace(index + ".old", index)
+
+    archive = EmissionArchive(path)
+    assert len(archive) == len(first)
+    assert archive.fire_index.shape[1] == len(first)
+    fireid = fire["fireid"].iloc[-1]
+    assert len(archive.fire(fireid)) == (first["fireid"] == fireid).sum()
+    archive = write_archive(fire[fire["date"] >= "2016-07-01"], path,
+                            append=True)
+    assert len(archive) == len(fire)
+    assert len(archive.fire(fireid)) == (fire["fireid"] == fireid).sum()
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""Tests for batch processing."""
+
+import pkg_resources
+import multiprocessing
+import os
+import shutil
+import pytest
+from finnemit import batch, get_emissions, run_batch
+from finnemit.batch import main
+from finnemit.pipeline import run_pipeline
+
+
+def _copy_inputs(tmpdir, n):
+    infile = pkg_resources.resource_filename(
+        "finnemit", "data/example-input.csv"
+    )
+    indir = os.path.join(str(tmpdir), "in")
+    os.makedirs(indir)
+    for i in range(n):
+        shutil.copy(infile, os.path.join(indir, "day{}.csv".format(i)))
+    return infile, indir
+
+
+def test_batch_merges_summaries(tmpdir):
+    infile, indir = _copy_inputs(tmpdir, 2)
+    with open(os.path.join(indir, "day9.csv"), "w") as f:
+        f.write("not,a,fire,file\n")
+    outdir = os.path.join(str(tmpdir), "out")
+
+    summary = run_batch(os.path.join(indir, "*.csv"), outdir, processes=2)
+
+    single = get_emissions(infile, os.path.join(str(tmpdir), "single.csv"))
+    assert summary["num_files"] == 3
+    assert summary["num_files_failed"] == 1
+    assert list(summary["failed_files"]) == [os.path.join(indir, "day9.csv")]
+    assert summary["num_fires_total"] == 2 * single["num_fires_total"]
+    assert summary["CO"] == pytest.approx(2 * single["CO"])
+    assert sorted(os.listdir(outdir)) == [
+        "day0_out.csv",
+        "day0_out_species.csv",
+        "day0_out_species_log.txt",
+        "day1_out.csv",
+        "day1_out_species.csv",
+        "day1_out_species_log.txt",
+    ]
+
+
+def _crash_pipeline(infile, **kwargs):
+    if "crash" in infile:
+        os._exit(1)
+    return run_pipeline(infile, **kwargs)
+
+
+@pytest.mark.skipif(
+    multiprocessing.get_context().get_start_method() != "fork",
+    reason="workers only see the patched function when forked",
+)
+def test_batch_survives_worker_crash(tmpdir, monkeypatch):
+    infile, indir = _copy_inputs(tmpdir, 3)
+    crash_file = os.path.join(indir, "crash.csv")
+    shutil.copy(infile, crash_file)
+    monkeypatch.setattr(batch, "run_pipeline", _crash_pipeline)
+
+    summary = run_batch(os.path.join(indir, "*.csv"), processes=2)
+
+    single = get_emissions(infile, os.path.join(str(tmpdir), "single.csv"))
+    assert summary["num_files"] == 4
+    assert list(summary["failed_files"]) == [crash_file]
+    assert "BrokenProcessPool" in summary["failed_files"][crash_file]
+    assert summary["num_fires_total"] == 3 * single["num_fires_total"]
+
+
+def test_batch_command_line(tmpdir):
+    _, indir = _copy_inputs(tmpdir, 2)
+    outdir = os.path.join(str(tmpdir), "out")
+    summary_file = os.path.join(str(tmpdir), "summary.json")
+    status = main([
+        os.path.join(indir, "day0.csv"),
+        os.path.join(indir, "day1.csv"),
+        "--outdir", outdir,
+        "--processes", "1",
+        "--no-speciate",
+        "--summary", summary_file,
+    ])
+    assert status == 0
+    assert os.path.isfile(summary_file)
+    assert sorted(os.listdir(outdir)) == ["day0_out.csv", "day1_out.csv"]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+"""Tests for benchmark module."""
+
+import json
+import os
+from finnemit.benchmark import STAGES, compare_benchmarks, main
+
+
+def test_benchmark_command_line(tmpdir):
+    outfile = os.path.join(str(tmpdir), "bench.json")
+    main(["--sizes", "100", "200", "--repeat", "1", "--output", outfile,
+          "--workdir", str(tmpdir)])
+    with open(outfile) as f:
+        results = json.load(f)
+    assert len(results["results"]) == 2 * len(STAGES)
+    assert results["environment"]["repeat"] == 1
+    table = compare_benchmarks(results, results)
+    assert (table["speedup"] == 1.0).all()
+    assert os.listdir(str(tmpdir)) == ["bench.json"]
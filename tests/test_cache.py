@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""Tests for cache module."""
+
+import pkg_resources
+import os
+import shutil
+import pandas as pd
+import pytest
+import finnemit.finnemit
+from finnemit import get_emissions, speciate
+from finnemit.cache import ResultCache, main
+from finnemit.timing import remove_timings
+
+
+def test_cached_emissions_match(tmpdir, monkeypatch):
+    example = pkg_resources.resource_filename("finnemit",
+                                              "data/example-input.csv")
+    cache_dir = os.path.join(str(tmpdir), "cache")
+    first_out = os.path.join(str(tmpdir), "first.csv")
+    second_out = os.path.join(str(tmpdir), "second.csv")
+    summary, out_df = get_emissions(example, first_out, return_df=True,
+                                    cache=cache_dir)
+
+    def no_model(*args, **kwargs):
+        raise AssertionError("cached results were recomputed")
+
+    monkeypatch.setattr(finnemit.finnemit, "EmissionModel", no_model)
+    cached_summary, cached_df = get_emissions(
+        example, second_out, return_df=True, cache=cache_dir
+    )
+    cached_summary["output_file"] = first_out
+    assert "cache_seconds" in cached_summary
+    assert remove_timings(cached_summary) == remove_timings(summary)
+    pd.testing.assert_frame_equal(cached_df, out_df)
+    with open(first_out) as a, open(second_out) as b:
+        assert a.read() == b.read()
+
+    # other tables or options miss the cache
+    emisin = os.path.join(str(tmpdir), "ef.csv")
+    shutil.copyfile(pkg_resources.resource_filename(
+        "finnemit", "data/emission-factors.csv"), emisin)
+    with open(emisin, "a") as f:
+        f.write("\n")
+    with pytest.raises(AssertionError):
+        get_emissions(example, second_out, emisin=emisin, cache=cache_dir)
+    with pytest.raises(AssertionError):
+        get_emissions(example, second_out, float_dtype="float32",
+                      cache=cache_dir)
+
+
+def test_cached_speciation_match(tmpdir):
+    example = pkg_resources.resource_filename("finnemit",
+                                              "data/example-input.csv")
+    emissions = os.path.join(str(tmpdir), "emissions.csv")
+    get_emissions(example, emissions)
+    cache = ResultCache(os.path.join(str(tmpdir), "cache"))
+    first = speciate(emissions, return_df=True, cache=cache)
+    log = os.path.join(str(tmpdir), "emissions_species_log.txt")
+    with open(log) as f:
+        first_log = f.read()
+    os.remove(log)
+    second = speciate(emissions, return_df=True, cache=cache)
+    pd.testing.assert_frame_equal(first, second)
+    with open(log) as f:
+        assert f.read() == first_log
+    assert len(cache.entries()) == 1
+
+
+def test_least_recently_used_evicted(tmpdir):
+    cache = ResultCache(str(tmpdir.join("cache")), max_bytes=10 ** 6)
+    keys = [cache.key("result", i) for i in range(3)]
+    for key in keys:
+        cache.store(key, {}, {"value": key})
+        entry = os.path.join(cache.directory, key, "data.pkl")
+        os.utime(entry, (len(cache.entries()), len(cache.entries())))
+    cache.lookup(keys[0])
+    size = cache.entries()["bytes"][0]
+    cache.max_bytes = 2 * size
+    assert cache.evict() == [keys[1]]
+    assert cache.lookup(keys[1]) is None
+    assert cache.lookup(keys[2])[1] == {"value": keys[2]}
+
+    main([cache.directory, "--clear"])
+    assert len(cache.entries()) == 0
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""Tests for saved classified fires."""
+
+import pkg_resources
+import os
+import pandas as pd
+import pytest
+from finnemit import get_emissions, write_classified, emit_classified
+from finnemit.timing import remove_timings
+
+
+@pytest.mark.parametrize("ext", [".parquet", ".feather"])
+def test_emit_classified_matches_get_emissions(tmpdir, ext):
+    infile = pkg_resources.resource_filename(
+        "finnemit", "data/example-input.csv"
+    )
+    emisin = os.path.join(str(tmpdir), "ef.csv")
+    ef = pd.read_csv(
+        pkg_resources.resource_filename(
+            "finnemit", "data/emission-factors.csv"
+        )
+    )
+    ef["CO"] = ef["CO"] * 1.5
+    ef.to_csv(emisin, index=False)
+    path = os.path.join(str(tmpdir), "classified" + ext)
+
+    written = write_classified(infile, path)
+    assert written["num_fires_classified"] <= written["num_fires_total"]
+
+    for table in [None, emisin]:
+        expected_file = os.path.join(str(tmpdir), "expected.csv")
+        outfile = os.path.join(str(tmpdir), "out.csv")
+        expected = get_emissions(infile, expected_file, emisin=table)
+        summary = emit_classified(path, outfile, emisin=table)
+        assert remove_timings(summary) == dict(
+            remove_timings(expected), output_file=outfile
+        )
+        assert "qa_seconds" not in summary
+        with open(outfile) as f, open(expected_file) as g:
+            assert f.read() == g.read()
+
+
+def test_classified_needs_columnar_file(tmpdir):
+    infile = pkg_resources.resource_filename(
+        "finnemit", "data/example-input.csv"
+    )
+    with pytest.raises(ValueError):
+        write_classified(infile, os.path.join(str(tmpdir), "classified.csv"))
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""Tests for Monte Carlo ensembles."""
+
+import pkg_resources
+import os
+import numpy as np
+import pytest
+from finnemit import get_emissions, run_ensemble, EmissionModel
+from finnemit.ensemble import _burned_by_row
+
+
+def _input():
+    return pkg_resources.resource_filename(
+        "finnemit", "data/example-input.csv"
+    )
+
+
+def test_unperturbed_ensemble_matches_get_emissions(tmpdir):
+    summary = get_emissions(_input(), os.path.join(str(tmpdir), "out.csv"))
+    totals, percentiles = run_ensemble(
+        _input(), members=3, ef_sigma=0, fuel_sigma=0, cf_sigma=0
+    )
+    assert len(totals) == 3
+    assert totals["bmass"].values == pytest.approx(
+        summary["GLOBAL TOTAL (Tg) biomass burned (Tg)"], rel=1e-12
+    )
+    for species in ["CO", "NMOC", "NOx", "BC", "PM10"]:
+        assert totals[species].values == pytest.approx(
+            summary[species], rel=1e-12
+        )
+    assert list(percentiles.index) == [2.5, 50.0, 97.5]
+
+
+def test_ensemble_is_reproducible_in_chunks_and_processes():
+    model = EmissionModel()
+    totals, percentiles = run_ensemble(_input(), members=20, seed=1,
+                                       model=model)
+    chunked, _ = run_ensemble(
+        _input(), members=20, seed=1, model=model, memory_bytes=10000,
+        processes=2,
+    )
+    np.testing.assert_allclose(chunked.values, totals.values, rtol=1e-12)
+    assert totals["CO"].std() > 0
+    lower, median, upper = percentiles["CO"]
+    assert lower < median < upper
+
+
+def test_herb_fuel_scaled_by_grassland_factor():
+    fires = {
+        "area": np.array([1.0]),
+        "herb_fuel": np.array([1.0]),
+        "coarse_fuel": np.array([2.0]),
+        "cf3": np.array([0.5]),
+        "genLC": np.array([4]),
+        "ef_index": np.array([0]),
+    }
+    fuel_factors = np.ones((10, 1))
+    fuel_factors[1] = 2.0
+    fuel_factors[4] = 3.0
+    by_row = _burned_by_row(
+        (fires, fuel_factors, np.array([0.3]), np.array([1.0]), 2)
+    )
+    assert by_row[:, 0] == pytest.approx([1.0 * 0.5 * 2.0 + 2.0 * 0.3 * 3.0,
+                                          0.0])
@@ -3,7 +3,16 @@
 
 import pkg_resources
 import os
-from finnemit import get_emissions
+import pandas as pd
+import pytest
+from finnemit import get_emissions, EmissionModel
+from finnemit.timing import remove_timings
+from finnemit.finnemit import (
+    INPUT_COLUMNS,
+    INPUT_DTYPES,
+    read_fires,
+    _day_of_year,
+)
 
 
 def test_csv_output(tmpdir):
@@ -21,3 +30,211 @@ def test_dict_returned(tmpdir):
     )
     outfile = os.path.join(str(tmpdir), "out.csv")
     assert isinstance(get_emissions(infile, outfile), dict)
+
+
+def test_loop_and_vectorized_agree(tmpdir):
+    infile = pkg_resources.resource_filename(
+        "finnemit", "data/example-input.csv"
+    )
+    loop_out = os.path.join(str(tmpdir), "loop.csv")
+    vec_out = os.path.join(str(tmpdir), "vec.csv")
+    loop_summary = get_emissions(infile, loop_out, method="loop")
+    vec_summary = get_emissions(infile, vec_out, method="vectorized")
+    pd.testing.assert_frame_equal(pd.read_csv(loop_out),
+                                  pd.read_csv(vec_out))
+    for key, value in remove_timings(loop_summary).items():
+        if key == "output_file":
+            continue
+        if isinstance(value, float):
+            assert vec_summary[key] == pytest.approx(value, rel=1e-10)
+        else:
+            assert vec_summary[key] == value
+
+
+def test_unknown_method(tmpdir):
+    infile = pkg_resources.resource_filename(
+        "finnemit", "data/example-input.csv"
+    )
+    outfile = os.path.join(str(tmpdir), "out.csv")
+    with pytest.raises(ValueError):
+        get_emissions(infile, outfile, method="fortran")
+
+
+def test_model_run_matches_get_emissions(tmpdir):
+    infile = pkg_resources.resource_filename(
+        "finnemit", "data/example-input.csv"
+    )
+    outfile = os.path.join(str(tmpdir), "out.csv")
+    summary = get_emissions(infile, outfile)
+    model = EmissionModel()
+    out_df, model_summary = model.run(pd.read_csv(infile))
+    assert out_df.shape[0] == pd.read_csv(outfile).shape[0]
+    assert model_summary["CO"] == pytest.approx(summary["CO"])
+    # the model can be reused
+    _, rerun_summary = model.run(infile)
+    assert remove_timings(rerun_summary) == remove_timings(model_summary)
+
+
+def test_model_rejects_bad_emission_factors(tmpdir):
+    emisin = os.path.join(str(tmpdir), "emis.csv")
+    pd.DataFrame({"LCT": [1], "CO": [100.0]}).to_csv(emisin, index=False)
+    with pytest.raises(ValueError):
+        EmissionModel(emisin=emisin)
+
+
+def test_chunked_output_matches(tmpdir):
+    infile = pkg_resources.resource_filename(
+        "finnemit", "data/example-input.csv"
+    )
+    outfile = os.path.join(str(tmpdir), "out.csv")
+    chunked_outfile = os.path.join(str(tmpdir), "chunked.csv")
+    summary = get_emissions(infile, outfile)
+    chunked_summary = get_emissions(infile, chunked_outfile, chunksize=1000)
+    with open(outfile) as f, open(chunked_outfile) as chunked:
+        assert f.read() == chunked.read()
+    assert chunked_summary["num_fires_total"] == summary["num_fires_total"]
+    assert chunked_summary["num_bare_cover"] == summary["num_bare_cover"]
+    assert chunked_summary["CO"] == pytest.approx(summary["CO"])
+    # temporary day files are cleaned up
+    assert sorted(os.listdir(str(tmpdir))) == ["chunked.csv", "out.csv"]
+
+
+def test_read_fires_uses_input_dtypes():
+    infile = pkg_resources.resource_filename(
+        "finnemit", "data/example-input.csv"
+    )
+    fires = read_fires(infile)
+    assert list(fires.columns) == INPUT_COLUMNS
+    for column, dtype in INPUT_DTYPES.items():
+        if dtype is not str:
+            assert fires[column].dtype == dtype
+    pd.testing.assert_frame_equal(read_fires(pd.read_csv(infile)), fires)
+    fires = read_fires(infile, precision="float32")
+    assert (fires[["v_tree", "v_herb", "v_bare"]].dtypes == "float32").all()
+
+
+def test_area_read_in_double_precision(tmpdir):
+    infile = pkg_resources.resource_filename(
+        "finnemit", "data/example-input.csv"
+    )
+    outfile = os.path.join(str(tmpdir), "out.csv")
+    _, out_df = get_emissions(infile, outfile, return_df=True)
+
+    # fires whose VCF cover needs no correction, with one row per key
+    raw = pd.read_csv(infile)
+    totcov = raw["v_tree"] + raw["v_herb"] + raw["v_bare"]
+    raw = raw[(totcov >= 99) & (totcov <= 101) & (raw["v_bare"] < 100)]
+    key = ["polyid", "fireid", "acq_date_lst"]
+    raw = raw.drop_duplicates(subset=key, keep=False)
+    area = raw["area_sqkm"] * 1.0e6
+    raw = raw.assign(expected=area - area * (raw["v_bare"] / 100.0))
+    merged = out_df.merge(
+        raw, left_on=["polyid", "fireid", "date"], right_on=key
+    )
+    assert len(merged) > 1000
+    assert (merged["area"] == merged["expected"]).all()
+
+
+def test_day_of_year():
+    jd, mo = _day_of_year(
+        ["2016-01-01", "2016-02-29", "2016-12-31", "2015-12-31"]
+    )
+    assert list(jd) == [1, 60, 366, 365]
+    assert list(mo) == [1, 2, 12, 12]
+
+
+def test_pyarrow_engine_matches(tmpdir):
+    pytest.importorskip("pyarrow")
+    infile = pkg_resources.resource_filename(
+        "finnemit", "data/example-input.csv"
+    )
+    c_out = os.path.join(str(tmpdir), "c.csv")
+    arrow_out = os.path.join(str(tmpdir), "arrow.csv")
+    get_emissions(infile, c_out)
+    get_emissions(infile, arrow_out, engine="pyarrow")
+    with open(c_out) as c_file, open(arrow_out) as arrow_file:
+        assert c_file.read() == arrow_file.read()
+    with pytest.raises(ValueError):
+        get_emissions(infile, arrow_out, engine="pyarrow", chunksize=100)
+
+
+def test_float32_precision(tmpdir):
+    infile = pkg_resources.resource_filename(
+        "finnemit", "data/example-input.csv"
+    )
+    summary, out_df = get_emissions(
+        infile, os.path.join(str(tmpdir), "out64.csv"), return_df=True
+    )
+    summary32, out32 = get_emissions(
+        infile,
+        os.path.join(str(tmpdir), "out32.csv"),
+        return_df=True,
+        precision="float32",
+    )
+    floats = out_df.select_dtypes(include="floating").columns
+    assert (out32[floats].dtypes == "float32").all()
+    # the same fires are kept, with values rounded to single precision.
+    # VCF cover is read in single precision, and its rounding is amplified
+    # in the burned area of fires with nearly all bare cover.
+    pd.testing.assert_frame_equal(
+        out32[floats].astype(float), out_df[floats], check_exact=False,
+        rtol=1e-5,
+    )
+    for key, value in remove_timings(summary).items():
+        if isinstance(value, float):
+            assert summary32[key] == pytest.approx(value, rel=1e-6)
+            assert isinstance(summary32[key], float)
+    assert os.path.getsize(os.path.join(str(tmpdir), "out32.csv")) < (
+        0.7 * os.path.getsize(os.path.join(str(tmpdir), "out64.csv"))
+    )
+    with pytest.raises(ValueError):
+        EmissionModel(precision="float16")
+
+
+def test_species_follow_list(tmpdir):
+    infile = pkg_resources.resource_filename(
+        "finnemit", "data/example-input.csv"
+    )
+    default = os.path.join(str(tmpdir), "default.csv")
+    every = os.path.join(str(tmpdir), "all.csv")
+    subset = os.path.join(str(tmpdir), "subset.csv")
+    summary = get_emissions(infile, default)
+    all_summary = get_emissions(infile, every, species="all")
+    subset_summary = get_emissions(infile, subset, species=["CO2", "NOx"])
+
+    default_df = pd.read_csv(default)
+    all_df = pd.read_csv(every)
+    for column in ["CO2", "CH4", "H2", "TPM", "TPC", "NMHC"]:
+        assert column in all_df
+        assert column in all_summary
+    pd.testing.assert_frame_equal(all_df[default_df.columns], default_df)
+    assert all_summary["PM2.5"] == pytest.approx(summary["PM2.5"])
+
+    subset_df = pd.read_csv(subset)
+    assert list(subset_df.columns[-2:]) == ["CO2", "NOx"]
+    assert subset_summary["NOx"] == pytest.approx(summary["NOx"])
+    assert "CO" not in subset_summary
+    assert "TOTAL CROPLANDS CO (kg)" not in subset_summary
+    with pytest.raises(ValueError):
+        get_emissions(infile, subset, species=["CO2"], method="loop")
+
+
+def test_parallel_output_matches(tmpdir):
+    infile = pkg_resources.resource_filename(
+        "finnemit", "data/example-input.csv"
+    )
+    outfile = os.path.join(str(tmpdir), "out.csv")
+    serial_outfile = os.path.join(str(tmpdir), "serial.csv")
+    parallel_outfile = os.path.join(str(tmpdir), "parallel.csv")
+    get_emissions(infile, outfile)
+    serial = get_emissions(infile, serial_outfile, chunksize=700)
+    parallel = get_emissions(
+        infile, parallel_outfile, chunksize=700, processes=3
+    )
+    for path in [serial_outfile, parallel_outfile]:
+        with open(outfile) as f, open(path) as g:
+            assert f.read() == g.read()
+    assert dict(
+        remove_timings(parallel), output_file=serial_outfile
+    ) == remove_timings(serial)
+    assert parallel["emissions_rows"] == serial["emissions_rows"]
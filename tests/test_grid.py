@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""Tests for grid module."""
+
+import pkg_resources
+import collections
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from finnemit import speciate
+from finnemit.grid import (
+    LatLonGrid,
+    LambertConformalGrid,
+    PolarStereographicGrid,
+    cell_index,
+    grid_emissions,
+    grid_from_dict,
+    read_gridded,
+)
+
+
+def test_grid_totals():
+    fire = pd.DataFrame({
+        "lat": [0.5, 0.7, 1.5, 0.5, 10.0, 2.0],
+        "longi": [0.5, 0.2, 0.5, 1.5, 0.5, 2.0],
+        "jd": [1, 1, 1, 2, 1, 2],
+        "CO": [1.0, 2.0, 4.0, 8.0, 16.0, 32.0],
+        "NO": [0.1, 0.2, 0.4, 0.8, 1.6, 3.2],
+    })
+    grid = LatLonGrid(1.0, south=0, north=2, west=0, east=2)
+    gridded, metadata = grid_emissions(fire, grid, dtype="float64")
+    assert metadata["days"] == [1, 2]
+    assert metadata["species"] == ["CO", "NO"]
+    assert gridded.shape == (2, 2, 2, 2)
+    assert gridded[0, 0].tolist() == [[3.0, 0.0], [4.0, 0.0]]
+    # fires on the north and east edges fall in the last row and column
+    assert gridded[1, 0].tolist() == [[0.0, 8.0], [0.0, 32.0]]
+    assert gridded[:, 1].sum() == pytest.approx(fire["NO"].sum() - 1.6)
+
+
+def test_row_index_not_gridded(tmpdir):
+    infile = pkg_resources.resource_filename("finnemit",
+                                             "data/example-output.csv")
+    outfile = os.path.join(str(tmpdir), "out.csv")
+    pd.read_csv(infile).to_csv(outfile)
+    fire = pd.read_csv(outfile)
+    assert "Unnamed: 0" in fire
+    _, metadata = grid_emissions(fire, LatLonGrid(1.0))
+    assert "Unnamed: 0" not in metadata["species"]
+    assert "CO" in metadata["species"]
+
+
+def test_gridded_file(tmpdir):
+    infile = pkg_resources.resource_filename("finnemit",
+                                             "data/example-output.csv")
+    species_df = speciate(pd.read_csv(infile), return_df=True)
+    outfile = os.path.join(str(tmpdir), "grid.npy")
+    gridded, metadata = grid_emissions(
+        species_df, LatLonGrid(0.5), lat="lati", day="day", outfile=outfile
+    )
+    assert len(metadata["species"]) > 40
+    on_disk, on_disk_metadata = read_gridded(outfile)
+    assert isinstance(on_disk, np.memmap)
+    assert on_disk_metadata == metadata
+    assert np.array_equal(on_disk, gridded)
+    isop = metadata["species"].index("ISOP")
+    assert on_disk[:, isop].sum(dtype=float) == pytest.approx(
+        species_df["ISOP"].sum(), rel=1e-6
+    )
+
+
+def test_cell_areas_cover_sphere():
+    areas = LatLonGrid(2.5).cell_areas()
+    assert areas.shape == (72, 144)
+    assert areas.sum() == pytest.approx(4 * np.pi * 6371000.0 ** 2)
+
+
+@pytest.mark.parametrize("grid", [
+    LambertConformalGrid(nx=300, ny=200, dx=12000, dy=12000, ref_lat=38.5,
+                         ref_lon=-97.5, stand_lon=-97.5, truelat1=33,
+                         truelat2=45),
+    LambertConformalGrid(nx=100, ny=80, dx=20000, dy=20000, ref_lat=-30,
+                         ref_lon=135, stand_lon=135, truelat1=-20,
+                         truelat2=-40),
+    PolarStereographicGrid(nx=200, ny=200, dx=25000, dy=25000, ref_lat=70,
+                           ref_lon=-100, stand_lon=-100, truelat1=60),
+    PolarStereographicGrid(nx=150, ny=100, dx=25000, dy=25000, ref_lat=-75,
+                           ref_lon=0, stand_lon=0, truelat1=-71),
+])
+def test_projected_cell_centers(grid):
+    lat, lon = grid.centers()
+    cells = grid.cell_index(lat.ravel(), lon.ravel())
+    assert np.array_equal(cells, np.arange(grid.size))
+    center = grid.cell_index([grid.ref_lat], [grid.ref_lon])[0]
+    assert center == (grid.ny // 2) * grid.nx + grid.nx // 2
+    assert grid_from_dict(grid.to_dict()).to_dict() == grid.to_dict()
+
+
+def test_lambert_matches_proj():
+    # x, y from PROJ for +proj=lcc +lat_1=33 +lat_2=45 +lat_0=38.5
+    # +lon_0=-97.5 +R=6370000
+    grid = LambertConformalGrid(nx=10, ny=10, dx=1000, dy=1000,
+                                ref_lat=38.5, ref_lon=-97.5,
+                                stand_lon=-97.5, truelat1=33, truelat2=45)
+    x, y = grid.project([30.0, 50.0], [-100.0, -120.0])
+    x0, y0 = grid.project(38.5, -97.5)
+    assert x - x0 == pytest.approx([-242276.566, -1613732.484], abs=0.01)
+    assert y - y0 == pytest.approx([-940602.058, 1480015.568], abs=0.01)
+
+
+def test_cell_index_cache(tmpdir, monkeypatch):
+    grid = PolarStereographicGrid(nx=50, ny=50, dx=50000, dy=50000,
+                                  ref_lat=80, ref_lon=0, stand_lon=0,
+                                  truelat1=60)
+    lat = np.linspace(60, 90, 1000)
+    lon = np.linspace(-180, 180, 1000)
+    cache_dir = os.path.join(str(tmpdir), "cells")
+    cells = cell_index(grid, lat, lon, cache_dir)
+    assert len(os.listdir(cache_dir)) == 1
+
+    def fail(*args):
+        raise AssertionError("fires were projected again")
+
+    monkeypatch.setattr(grid, "project", fail)
+    assert np.array_equal(cell_index(grid, lat, lon), cells)
+    monkeypatch.setattr("finnemit.grid._cell_cache",
+                        collections.OrderedDict())
+    assert np.array_equal(cell_index(grid, lat, lon, cache_dir), cells)
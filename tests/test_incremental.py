@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""Tests for incremental module."""
+
+import pkg_resources
+import os
+import pickle
+import pandas as pd
+import pytest
+from finnemit import get_emissions
+from finnemit.incremental import update_emissions
+from finnemit.timing import remove_timings
+
+
+def check_matches_full_run(infile, state_file, tmpdir):
+    incremental_out = os.path.join(str(tmpdir), "incremental.csv")
+    full_out = os.path.join(str(tmpdir), "full.csv")
+    summary = update_emissions(infile, state_file, incremental_out)
+    full_summary = get_emissions(infile, full_out)
+    with open(incremental_out) as a, open(full_out) as b:
+        assert a.read() == b.read()
+    for key, value in remove_timings(full_summary).items():
+        if isinstance(value, str):
+            continue
+        assert summary[key] == pytest.approx(value, rel=1e-12)
+    return summary
+
+
+def test_incremental_runs_match_full_runs(tmpdir):
+    example = pkg_resources.resource_filename("finnemit",
+                                              "data/example-input.csv")
+    fires = pd.read_csv(example)
+    infile = os.path.join(str(tmpdir), "nrt.csv")
+    state_file = os.path.join(str(tmpdir), "state.pkl")
+
+    fires.iloc[:4000].to_csv(infile, index=False)
+    summary = check_matches_full_run(infile, state_file, tmpdir)
+    assert summary["num_fires_reused"] == 0
+
+    fires.to_csv(infile, index=False)
+    summary = check_matches_full_run(infile, state_file, tmpdir)
+    assert summary["num_fires_changed"] == 0
+    assert summary["num_fires_new"] > 0
+    assert summary["num_fires_reused"] > 3900
+
+    fires.loc[100, "area_sqkm"] *= 2
+    fires.drop(index=[200, 201]).to_csv(infile, index=False)
+    summary = check_matches_full_run(infile, state_file, tmpdir)
+    assert summary["num_fires_new"] == 0
+    assert summary["num_fires_changed"] == 1
+    assert summary["num_fires_removed"] == 2
+
+
+def test_rows_of_a_key_apart_keep_input_order(tmpdir):
+    example = pkg_resources.resource_filename("finnemit",
+                                              "data/example-input.csv")
+    fires = pd.read_csv(example)
+    key = ["polyid", "fireid", "acq_date_lst"]
+    fires.loc[10, key] = fires.loc[0, key]
+    infile = os.path.join(str(tmpdir), "nrt.csv")
+    state_file = os.path.join(str(tmpdir), "state.pkl")
+
+    fires.iloc[:4000].to_csv(infile, index=False)
+    check_matches_full_run(infile, state_file, tmpdir)
+    fires.to_csv(infile, index=False)
+    summary = check_matches_full_run(infile, state_file, tmpdir)
+    assert summary["num_fires_reused"] > 3900
+
+    with open(state_file, "rb") as f:
+        state = pickle.load(f)
+    assert sorted(state) == ["keys", "outputs", "signature"]
+
+
+def test_state_ignored_for_other_tables(tmpdir):
+    example = pkg_resources.resource_filename("finnemit",
+                                              "data/example-input.csv")
+    state_file = os.path.join(str(tmpdir), "state.pkl")
+    outfile = os.path.join(str(tmpdir), "out.csv")
+    update_emissions(example, state_file, outfile)
+    summary = update_emissions(example, state_file, outfile, method="loop")
+    assert summary["num_fires_reused"] == 0
+    summary = update_emissions(example, state_file, outfile, method="loop")
+    assert summary["num_fires_new"] == 0
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""Tests for reading and writing columnar formats."""
+
+import pkg_resources
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from finnemit import get_emissions, speciate
+from finnemit.io import read_table, write_table
+
+pytest.importorskip("pyarrow")
+
+
+@pytest.mark.parametrize("ext", [".parquet", ".feather"])
+def test_columnar_round_trip(tmpdir, ext):
+    csv_infile = pkg_resources.resource_filename(
+        "finnemit", "data/example-input.csv"
+    )
+    infile = os.path.join(str(tmpdir), "in" + ext)
+    write_table(pd.read_csv(csv_infile), infile)
+    summary = get_emissions(infile)
+    assert summary["output_file"] == os.path.join(str(tmpdir), "in_out" + ext)
+
+    csv_summary = get_emissions(
+        csv_infile, os.path.join(str(tmpdir), "out.csv")
+    )
+    assert summary["CO"] == pytest.approx(csv_summary["CO"])
+
+    speciate(summary["output_file"])
+    species = read_table(
+        os.path.join(str(tmpdir), "in_out_species" + ext), columns=["CO"]
+    )
+    assert list(species.columns) == ["CO"]
+    assert os.path.isfile(os.path.join(str(tmpdir), "in_out_species_log.txt"))
+
+
+def test_float32_output(tmpdir):
+    infile = pkg_resources.resource_filename(
+        "finnemit", "data/example-input.csv"
+    )
+    outfile = os.path.join(str(tmpdir), "out.parquet")
+    get_emissions(infile, outfile, float_dtype="float32",
+                  columns=["jd", "genLC", "CO", "PM25"])
+    out = read_table(outfile)
+    assert list(out.columns) == ["jd", "genLC", "CO", "PM25"]
+    assert out["CO"].dtype == np.float32
+    assert out["jd"].dtype == np.int64
+
+
+def test_chunked_columnar(tmpdir):
+    csv_infile = pkg_resources.resource_filename(
+        "finnemit", "data/example-input.csv"
+    )
+    infile = os.path.join(str(tmpdir), "in.parquet")
+    write_table(pd.read_csv(csv_infile), infile)
+    outfile = os.path.join(str(tmpdir), "out.feather")
+    chunked_outfile = os.path.join(str(tmpdir), "chunked.feather")
+    get_emissions(infile, outfile)
+    get_emissions(infile, chunked_outfile, chunksize=1000)
+    pd.testing.assert_frame_equal(read_table(outfile),
+                                  read_table(chunked_outfile))
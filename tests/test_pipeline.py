@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""Tests for the in-memory emissions and speciation pipeline."""
+
+import pkg_resources
+import os
+import pandas as pd
+import pytest
+from finnemit import get_emissions, speciate, run_pipeline
+
+
+def test_pipeline_matches_files(tmpdir):
+    infile = pkg_resources.resource_filename(
+        "finnemit", "data/example-input.csv"
+    )
+    emissions_outfile = os.path.join(str(tmpdir), "emissions.csv")
+    species_outfile = os.path.join(str(tmpdir), "species.csv")
+    get_emissions(infile, emissions_outfile)
+    speciate(emissions_outfile, species_outfile)
+
+    summary, species_df = run_pipeline(infile)
+    expected = pd.read_csv(species_outfile, index_col=0)
+    pd.testing.assert_frame_equal(species_df, expected, check_exact=False)
+    assert summary["output_file"] is None
+
+
+def test_pipeline_writes_only_requested_outputs(tmpdir):
+    infile = pkg_resources.resource_filename(
+        "finnemit", "data/example-input.csv"
+    )
+    species_outfile = os.path.join(str(tmpdir), "species.csv")
+    run_pipeline(infile, species_outfile=species_outfile)
+    assert sorted(os.listdir(str(tmpdir))) == [
+        "species.csv",
+        "species_log.txt",
+    ]
+
+
+def test_functions_return_frames(tmpdir):
+    infile = pkg_resources.resource_filename(
+        "finnemit", "data/example-input.csv"
+    )
+    outfile = os.path.join(str(tmpdir), "out.csv")
+    summary, out_df = get_emissions(infile, outfile, return_df=True)
+    assert out_df.shape[0] == pd.read_csv(outfile).shape[0]
+    species_df = speciate(out_df, return_df=True)
+    assert species_df.shape[0] == out_df.shape[0]
+    assert sorted(os.listdir(str(tmpdir))) == ["out.csv"]
+    with pytest.raises(ValueError):
+        get_emissions(infile, outfile, return_df=True, chunksize=100)
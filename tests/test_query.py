@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""Tests for query module."""
+
+import pkg_resources
+import os
+import numpy as np
+import pandas as pd
+from finnemit import get_emissions, speciate
+from finnemit.query import EmissionIndex, build_index
+
+
+def test_queries_match_full_scan(tmpdir):
+    example = pkg_resources.resource_filename("finnemit",
+                                              "data/example-input.csv")
+    outfile = os.path.join(str(tmpdir), "emissions.csv")
+    path = os.path.join(str(tmpdir), "emissions.idx")
+    get_emissions(example, outfile)
+    fire = pd.read_csv(outfile, index_col=0).reset_index(drop=True)
+    build_index(outfile, path, cell_size=0.5)
+    index = EmissionIndex(path)
+
+    box = (30.0, 35.0, -112.0, -105.0)
+    scan = fire[
+        fire["lat"].between(30.0, 35.0)
+        & fire["longi"].between(-112.0, -105.0)
+        & fire["date"].between("2016-06-01", "2016-06-10")
+    ]
+    selected = index.fires(box, "2016-06-01", "2016-06-10")
+    assert len(selected) == len(scan) > 0
+    assert (selected["date"].values[:-1] <= selected["date"].values[1:]).all()
+    assert sorted(selected["polyid"]) == sorted(scan["polyid"])
+
+    totals = index.totals(box, "2016-06-01", "2016-06-10")
+    assert totals["num_fires"] == len(scan)
+    assert np.isclose(totals["PM25"], scan["PM25"].sum(), rtol=1e-12)
+    assert "bmass" not in totals
+
+    everything = index.totals(columns=["CO"])
+    assert everything["num_fires"] == len(fire)
+    assert np.isclose(everything["CO"], fire["CO"].sum(), rtol=1e-12)
+    assert len(index.fires(start="2017-01-01")) == 0
+
+
+def test_index_speciated_emissions(tmpdir):
+    example = pkg_resources.resource_filename("finnemit",
+                                              "data/example-output.csv")
+    fire = speciate(example, os.path.join(str(tmpdir), "species.csv"),
+                    return_df=True)
+    index = build_index(fire, os.path.join(str(tmpdir), "species.idx"))
+    totals = index.totals(start=160, end=170, columns=["CO"])
+    in_days = fire["day"].between(160, 170)
+    assert totals["num_fires"] == in_days.sum()
+    assert np.isclose(totals["CO"], fire["CO"][in_days].sum(), rtol=1e-12)
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""Tests for regions module."""
+
+import pkg_resources
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from finnemit import speciate
+from finnemit.regions import DEFAULT_REGIONS, region_totals
+
+
+def test_region_totals_match_masked_sums():
+    infile = pkg_resources.resource_filename("finnemit",
+                                             "data/example-output.csv")
+    fire = pd.read_csv(infile)
+    totals = region_totals(fire, ["CO", "PM25"])
+    assert list(totals.index) == list(DEFAULT_REGIONS)
+    south, north, west, east = DEFAULT_REGIONS["Western US"]
+    inside = fire["lat"].between(south, north) & \
+        fire["longi"].between(west, east)
+    assert totals.loc["Western US", "CO"] == pytest.approx(
+        fire.loc[inside, "CO"].sum()
+    )
+
+
+def test_overlapping_regions_and_missing_values():
+    fire = pd.DataFrame({
+        "lat": [0.0, 5.0, 10.0, 50.0],
+        "longi": [0.0, 5.0, 10.0, 50.0],
+        "CO": [1.0, 2.0, np.nan, 8.0],
+    })
+    regions = {"a": (0, 5, 0, 5), "b": (5, 20, 5, 20), "c": (40, 60, 40, 60)}
+    totals = region_totals(fire, ["CO"], regions)
+    assert totals.loc["a", "CO"] == 3.0
+    assert np.isnan(totals.loc["b", "CO"])
+    assert totals.loc["c", "CO"] == 8.0
+    with pytest.raises(ValueError):
+        region_totals(fire, ["CO"], {"bad": (10, 0, 0, 10)})
+
+
+def test_custom_regions_in_log(tmpdir):
+    infile = pkg_resources.resource_filename("finnemit",
+                                             "data/example-output.csv")
+    outfile = os.path.join(str(tmpdir), "out.csv")
+    speciate(infile, outfile, regions={"Arizona": (31, 37, -115, -109)})
+    with open(os.path.join(str(tmpdir), "out_log.txt")) as log:
+        text = log.read()
+    assert "Arizona (Gg Species)" in text
+    assert "Western US" not in text
@@ -3,6 +3,8 @@
 
 import pkg_resources
 import os
+import pandas as pd
+import pytest
 from finnemit import speciate
 
 
@@ -21,3 +23,63 @@ def test_logfile_output(tmpdir):
     logfile = os.path.join(str(tmpdir), "out_log.txt")
     speciate(infile, outfile)
     assert os.path.isfile(logfile)
+
+
+def test_logfile_missing_values(tmpdir):
+    infile = pkg_resources.resource_filename("finnemit",
+                                             "data/example-output.csv")
+    fires = pd.read_csv(infile, index_col=0).head(50)
+    fires.loc[fires.index[0], "CO"] = float("nan")
+    fires.loc[:, "lat"] = 40.0
+    fires.loc[:, "longi"] = -110.0
+    outfile = os.path.join(str(tmpdir), "out.csv")
+    speciate(fires, outfile,
+             regions={"West": (24, 49, -125, -100),
+                      "East": (24, 49, -100, -60)})
+    with open(os.path.join(str(tmpdir), "out_log.txt")) as f:
+        lines = f.read().splitlines()
+    co = [line for line in lines if line.startswith("CO, ")]
+    assert co == ["CO, nan", "CO, nan", "CO, 0.0"]
+
+
+def test_invalid_genveg(tmpdir):
+    infile = pkg_resources.resource_filename("finnemit",
+                                             "data/example-output.csv")
+    fires = pd.read_csv(infile).head(10)
+    fires.loc[3, "genLC"] = 7
+    bad_infile = os.path.join(str(tmpdir), "bad.csv")
+    fires.to_csv(bad_infile, index=False)
+    with pytest.raises(ValueError):
+        speciate(bad_infile, os.path.join(str(tmpdir), "out.csv"))
+
+
+def test_voc_profiles(tmpdir):
+    infile = pkg_resources.resource_filename("finnemit",
+                                             "data/example-output.csv")
+    sfile = pkg_resources.resource_filename("finnemit",
+                                            "data/speciation.csv")
+    outfile = os.path.join(str(tmpdir), "out.csv")
+    speciate(infile, outfile)
+    out = pd.read_csv(outfile)
+    profiles = pd.read_csv(sfile, index_col="MOZSPEC")
+    savanna = out[out["genveg"] == 1].iloc[0]
+    assert savanna["ISOP"] == pytest.approx(
+        savanna["NMOC"] * profiles.loc["ISOP", "Savanna"]
+    )
+    crop = out[out["genveg"] == 9].iloc[0]
+    assert crop["HCN"] == pytest.approx(
+        crop["NMOC"] * profiles.loc["HCN", "Crop"]
+    )
+
+
+def test_float32_speciation(tmpdir):
+    infile = pkg_resources.resource_filename("finnemit",
+                                             "data/example-output.csv")
+    out64 = speciate(infile, os.path.join(str(tmpdir), "out64.csv"),
+                     return_df=True)
+    out32 = speciate(infile, os.path.join(str(tmpdir), "out32.csv"),
+                     return_df=True, precision="float32")
+    floats = out64.select_dtypes(include="floating").columns
+    assert (out32[floats].dtypes == "float32").all()
+    pd.testing.assert_frame_equal(out32[floats].astype(float), out64[floats],
+                                  check_exact=False, rtol=1e-6)
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""Tests for sweeps over fuel loading and emission factor tables."""
+
+import pkg_resources
+import os
+import pandas as pd
+import pytest
+from finnemit import get_emissions, run_sweep
+from finnemit.timing import remove_timings
+
+
+def _scaled_table(tmpdir, name, columns, factor):
+    path = pkg_resources.resource_filename("finnemit", "data/" + name)
+    table = pd.read_csv(path)
+    table[columns] = table[columns] * factor
+    outfile = os.path.join(str(tmpdir), "{}-{}".format(factor, name))
+    table.to_csv(outfile, index=False)
+    return outfile
+
+
+def test_sweep_matches_get_emissions(tmpdir):
+    infile = pkg_resources.resource_filename(
+        "finnemit", "data/example-input.csv"
+    )
+    fuelin = _scaled_table(
+        tmpdir, "fuel-loads.csv", ["Woody Savanna", "Savanna and Grasslands"],
+        0.5,
+    )
+    emisin = _scaled_table(
+        tmpdir, "emission-factors.csv", ["CO", "BC"], 2.0
+    )
+    variants = [(None, None), (fuelin, None), (fuelin, emisin)]
+    outfiles = [None] + [
+        os.path.join(str(tmpdir), "sweep{}.csv".format(i)) for i in [1, 2]
+    ]
+
+    summaries = run_sweep(infile, variants, outfiles=outfiles)
+
+    assert len(summaries) == 3
+    for (fuel, emis), outfile, summary in zip(variants, outfiles, summaries):
+        expected_file = os.path.join(str(tmpdir), "expected.csv")
+        expected = remove_timings(
+            get_emissions(infile, expected_file, fuelin=fuel, emisin=emis)
+        )
+        assert summary["output_file"] == outfile
+        assert set(remove_timings(summary)) == set(expected)
+        assert summary["qa_rows"] == expected["num_fires_total"]
+        assert ("write_seconds" in summary) == (outfile is not None)
+        for key, value in expected.items():
+            if key in ["input_file", "output_file"]:
+                continue
+            assert summary[key] == pytest.approx(value, rel=1e-12)
+        if outfile is not None:
+            with open(outfile) as f, open(expected_file) as g:
+                assert f.read() == g.read()
+    assert summaries[1]["CO"] < summaries[0]["CO"]
+    assert summaries[2]["BC"] == pytest.approx(2 * summaries[1]["BC"])
+
+    chunked = run_sweep(infile, variants, memory_bytes=10000)
+    for summary, expected in zip(chunked, summaries):
+        assert summary["CO"] == pytest.approx(expected["CO"], rel=1e-12)
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+"""Tests for synthetic module."""
+
+import os
+import pandas as pd
+from finnemit import get_emissions
+from finnemit.finnemit import INPUT_COLUMNS
+from finnemit.synthetic import synthetic_fires, write_synthetic_fires
+
+
+def test_synthetic_fires_match_preprocessor_schema():
+    fires = synthetic_fires(1000, seed=1)
+    assert len(fires) == 1000
+    assert set(INPUT_COLUMNS) <= set(fires.columns)
+    assert fires["v_lct"].between(1, 17).all()
+    assert fires["acq_date_lst"].str.startswith("2016-").all()
+    pd.testing.assert_frame_equal(fires, synthetic_fires(1000, seed=1))
+
+
+def test_synthetic_file_runs(tmpdir):
+    infile = os.path.join(str(tmpdir), "fires.csv")
+    write_synthetic_fires(infile, 2500, seed=2, chunksize=1000)
+    fires = pd.read_csv(infile)
+    assert len(fires) == 2500
+    assert fires["polyid"].is_unique
+    summary = get_emissions(infile)
+    assert summary["num_fires_total"] == fires["v_regnum"].notnull().sum()
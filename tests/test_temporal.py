@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""Tests for temporal module."""
+
+import pkg_resources
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from finnemit.grid import LatLonGrid, read_gridded
+from finnemit.temporal import (
+    DIURNAL_PROFILE,
+    hourly_emissions,
+    write_hourly_emissions,
+)
+
+
+def example_emissions():
+    infile = pkg_resources.resource_filename("finnemit",
+                                             "data/example-output.csv")
+    return pd.read_csv(infile)
+
+
+def test_hours_add_up_to_daily_totals():
+    fire = example_emissions()
+    hours = hourly_emissions(fire, species=["CO", "PM25"])
+    total = pd.concat([hour_df for _, _, hour_df in hours])
+    assert total["CO"].sum() == pytest.approx(fire["CO"].sum())
+    by_fire = total.groupby("polyid")["PM25"].sum()
+    assert np.allclose(by_fire, fire.groupby("polyid")["PM25"].sum())
+
+
+def test_local_and_utc_hours():
+    fire = pd.DataFrame({"polyid": [1], "lat": [0.0], "longi": [-90.0],
+                         "jd": [10], "CO": [24.0]})
+    local = list(hourly_emissions(fire, utc=False))
+    assert [(day, hour) for day, hour, _ in local][:2] == [(10, 0), (10, 1)]
+    peak = max(local, key=lambda h: h[2]["CO"].iloc[0])
+    assert peak[1] == int(np.argmax(DIURNAL_PROFILE))
+    utc = list(hourly_emissions(fire))
+    # local midnight at 90W is 06 UTC
+    assert (utc[0][0], utc[0][1]) == (10, 6)
+    assert (utc[-1][0], utc[-1][1]) == (11, 5)
+
+
+def test_profiles_by_land_cover():
+    fire = example_emissions()
+    flat = np.ones(24)
+    night = np.r_[np.ones(6), np.zeros(18)]
+    profiles = {1: flat, 2: flat, 4: flat, 5: flat, 6: flat, 9: night}
+    hours = hourly_emissions(fire, species=["CO"], profiles=profiles,
+                             by="genLC", utc=False)
+    for _, hour, hour_df in hours:
+        if hour >= 6:
+            assert (hour_df["genLC"] != 9).all()
+    with pytest.raises(ValueError):
+        next(hourly_emissions(fire, profiles={1: flat}, by="genLC"))
+
+
+def test_write_hourly(tmpdir):
+    fire = example_emissions()
+    table = os.path.join(str(tmpdir), "hourly.csv")
+    written = write_hourly_emissions(fire, table, species=["CO"])
+    hourly = pd.read_csv(table)
+    assert hourly.groupby(["day", "hour"]).ngroups == len(written)
+    assert hourly["CO"].sum() == pytest.approx(fire["CO"].sum())
+
+    gridfile = os.path.join(str(tmpdir), "hourly.npy")
+    write_hourly_emissions(fire, gridfile, grid=LatLonGrid(1.0),
+                           species=["CO", "NO"])
+    gridded, metadata = read_gridded(gridfile)
+    assert gridded.shape[:2] == (len(metadata["hours"]), 2)
+    assert gridded[:, 0].sum(dtype=float) == pytest.approx(
+        fire["CO"].sum(), rel=1e-5
+    )
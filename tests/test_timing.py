@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""Tests for timing module."""
+
+import pkg_resources
+import logging
+import os
+import pandas as pd
+import pytest
+from finnemit import get_emissions
+from finnemit.timing import STAGES, add_metrics_hook, remove_metrics_hook
+
+
+@pytest.mark.parametrize("chunksize", [None, 3000])
+def test_stage_timings(tmpdir, capsys, chunksize):
+    infile = pkg_resources.resource_filename(
+        "finnemit", "data/example-input.csv"
+    )
+    outfile = os.path.join(str(tmpdir), "out.csv")
+    calls = []
+
+    def hook(stage, seconds, rows):
+        calls.append(stage)
+
+    add_metrics_hook(hook)
+    try:
+        summary = get_emissions(infile, outfile, chunksize=chunksize)
+    finally:
+        remove_metrics_hook(hook)
+    assert set(calls) == set(STAGES)
+    for stage in STAGES:
+        assert summary[stage + "_seconds"] >= 0
+    assert summary["ingest_rows"] == summary["num_fires_total"]
+    assert summary["write_rows"] == len(pd.read_csv(outfile))
+    assert capsys.readouterr().out == ""
+
+
+def test_hooks_called_once_with_processes(tmpdir):
+    infile = pkg_resources.resource_filename(
+        "finnemit", "data/example-input.csv"
+    )
+    outfile = os.path.join(str(tmpdir), "out.csv")
+    calls_file = os.path.join(str(tmpdir), "calls.txt")
+
+    def hook(stage, seconds, rows):
+        # forked workers inherit the hook, and would append here too
+        with open(calls_file, "a") as f:
+            f.write("{} {}\n".format(stage, rows or 0))
+
+    rows = []
+    add_metrics_hook(hook)
+    try:
+        for processes in [1, 2]:
+            get_emissions(infile, outfile, chunksize=3000,
+                          processes=processes)
+            calls = pd.read_csv(calls_file, sep=" ", names=["stage", "rows"])
+            rows.append(calls.groupby("stage")["rows"].sum().to_dict())
+            os.remove(calls_file)
+    finally:
+        remove_metrics_hook(hook)
+    assert rows[0]["qa"] == rows[0]["ingest"]
+    assert rows[1] == rows[0]
+
+
+def test_removed_fires_logged_once(tmpdir, caplog):
+    infile = pkg_resources.resource_filename(
+        "finnemit", "data/example-input.csv"
+    )
+    fires = pd.read_csv(infile)
+    fires.loc[:9, "v_regnum"] = 120
+    badfile = os.path.join(str(tmpdir), "bad.csv")
+    fires.to_csv(badfile, index=False)
+    for method in ["loop", "vectorized"]:
+        caplog.clear()
+        with caplog.at_level(logging.WARNING, logger="finnemit"):
+            get_emissions(badfile, os.path.join(str(tmpdir), "out.csv"),
+                          method=method)
+        assert [record.getMessage() for record in caplog.records] == [
+            "Removed 10 fires. Something is WRONG with global regions and "
+            "fuel loads"
+        ]
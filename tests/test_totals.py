@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""Tests for grouped emission totals."""
+
+import math
+import pkg_resources
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from finnemit import get_emissions, group_totals
+
+
+def test_group_totals_add_up_to_summary(tmpdir):
+    infile = pkg_resources.resource_filename(
+        "finnemit", "data/example-input.csv"
+    )
+    outfile = os.path.join(str(tmpdir), "out.csv")
+    summary, fire = get_emissions(infile, outfile, return_df=True)
+
+    totals = group_totals(outfile)
+
+    assert list(totals.columns[:6]) == [
+        "jd", "globreg", "genLC", "num_fires", "area", "biomass"
+    ]
+    assert totals["num_fires"].sum() == len(fire)
+    assert totals["biomass"].sum() / 1e9 == pytest.approx(
+        summary["GLOBAL TOTAL (Tg) biomass burned (Tg)"]
+    )
+    assert totals["CO"].sum() / 1e9 == pytest.approx(summary["CO"])
+    expected = fire.groupby(["jd", "globreg", "genLC"])[["area", "CO"]].sum()
+    np.testing.assert_allclose(totals[["area", "CO"]].values, expected.values)
+    np.testing.assert_array_equal(
+        totals["jd"].values, expected.index.get_level_values("jd")
+    )
+
+
+def test_group_totals_are_accurate():
+    n = 1000000
+    values = np.random.RandomState(0).lognormal(0.0, 2.0, n)
+    fire = pd.DataFrame({
+        "jd": np.tile([1, 2], n // 2),
+        "area": values,
+        "bmass": np.ones(n),
+    })
+    totals = group_totals(fire, by=["jd"])
+    for jd, total in zip(totals["jd"], totals["area"]):
+        exact = math.fsum(values[fire["jd"].values == jd])
+        assert abs(total - exact) <= 4 * np.spacing(exact)